@@ -0,0 +1,215 @@
+"""
+Animate a figure drawn by the `draw_figure` function of a script: the
+curves of the areas grow by one date per frame.
+
+The figure is drawn once without the curves and kept as a background. Each
+frame restores the background and draws only the curves, whose data are
+updated in place (blitting), then the pixels are handed to the writer:
+
+    ".mp4": a video encoded by ffmpeg,
+    ".gif": an animated GIF, with Pillow,
+    ".png": one PNG file per frame in a folder named after the figure.
+
+The PNG frames are written instead of the video when ffmpeg is missing.
+"""
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from instrumentation import instrumented
+
+animation_formats = (".mp4", ".gif", ".png")
+
+
+@instrumented("animation")
+def animate_figure(fig, file_name, animation=".mp4", fps=10, dpi=100,
+                   labels=None):
+    """
+    Animate the curves of the legends of `fig`. The other curves, markers and
+    annotations of the data (extrapolations, confinement dates...) are
+    hidden, the lines and decorations in axes coordinates are kept. All the
+    curves end on the last frame: a curve of n points appears n frames
+    before the end.
+
+    :param fig: a figure drawn by a `draw_figure`, with an Agg canvas
+    :param file_name: the file name given by `draw_figure`, its extension is
+                      replaced by `animation`
+    :param animation: one of `animation_formats`
+    :param fps: the number of frames per second
+    :param dpi: the resolution of the frames
+    :param labels: the text shown in the corner of each frame, e.g. the
+                   dates, aligned on the last frame, or None
+    :return: the names of the written files
+    """
+    if animation not in animation_formats:
+        raise ValueError(animation)
+    curves = _grown_curves(fig)
+    n_frames = max((len(x) for _, x, _, _ in curves), default=0)
+    if labels is not None:
+        labels = list(labels)[-n_frames:]
+
+    fig.set_dpi(dpi)
+    label_text = fig.text(0.99, 0.01, "", ha='right', va='bottom',
+                          animated=True)
+    for line, _, _, head in curves:
+        line.set_data([], [])
+        head.set_data([], [])
+    canvas = fig.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+
+    size = canvas.get_width_height()
+    with _writer(file_name, animation, size, fps) as writer:
+        for frame in range(n_frames):
+            canvas.restore_region(background)
+            for line, x, y, head in curves:
+                end = len(x) - (n_frames - 1 - frame)
+                if end <= 0:
+                    continue
+                line.set_data(x[:end], y[:end])
+                head.set_data(x[end - 1:end], y[end - 1:end])
+                line.axes.draw_artist(line)
+                line.axes.draw_artist(head)
+            if labels is not None:
+                label_text.set_text(labels[frame - n_frames + len(labels)]
+                                    if frame >= n_frames - len(labels)
+                                    else "")
+                fig.draw_artist(label_text)
+            writer.write(canvas.buffer_rgba())
+    return writer.file_names
+
+
+def _grown_curves(fig):
+    """
+    Hide the artists of the data except the curves of the legends.
+
+    :return: a list of (curve, x, y, head marker), the curves and markers
+             are only drawn by `fig.draw_artist`
+    """
+    curves = []
+    for ax in fig.axes:
+        handles, _ = ax.get_legend_handles_labels()
+        for line in ax.lines:
+            if line in handles:
+                x = np.asarray(line.get_xdata(orig=False), dtype=float)
+                y = np.ma.filled(np.ma.asarray(line.get_ydata(orig=False),
+                                               dtype=float), np.nan)
+                head, = ax.plot([], [], ls='', marker='s', ms=10,
+                                color=line.get_color(), animated=True)
+                line.set_animated(True)
+                curves.append((line, x, y, head))
+            elif line.get_transform() == ax.transData:
+                line.set_visible(False)
+        for artist in [*ax.collections, *ax.texts]:
+            artist.set_visible(False)
+    return curves
+
+
+def _writer(file_name, animation, size, fps):
+    stem = Path(file_name).with_suffix("")
+    if animation == ".mp4":
+        ffmpeg = _ffmpeg()
+        if ffmpeg is not None:
+            return _FfmpegWriter(ffmpeg, stem.with_suffix(".mp4"), size, fps)
+        print("ffmpeg not found, writing PNG frames in", stem,
+              file=sys.stderr)
+    elif animation == ".gif":
+        return _GifWriter(stem.with_suffix(".gif"), size, fps)
+    return _PngWriter(stem, size)
+
+
+def _ffmpeg():
+    """
+    :return: the path of ffmpeg, as configured for matplotlib, or None
+    """
+    import matplotlib
+
+    return shutil.which(matplotlib.rcParams['animation.ffmpeg_path'])
+
+
+class _FfmpegWriter:
+    """
+    Pipe the RGBA frames to ffmpeg, encoded as H.264.
+    """
+
+    def __init__(self, ffmpeg, path, size, fps):
+        self.command = [
+            ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo",
+            "-pix_fmt", "rgba", "-s", "{}x{}".format(*size), "-r", str(fps),
+            "-i", "-", "-vcodec", "libx264", "-pix_fmt", "yuv420p",
+            # H.264 needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", str(path)]
+        self.file_names = [str(path)]
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+        return self
+
+    def write(self, rgba):
+        self.process.stdin.write(rgba)
+
+    def __exit__(self, *exc_info):
+        self.process.stdin.close()
+        if self.process.wait() != 0 and exc_info[0] is None:
+            raise OSError("ffmpeg failed: " + " ".join(self.command))
+
+
+class _GifWriter:
+    """
+    Collect the frames, reduced to 256 colors, and save them as a GIF.
+    """
+
+    def __init__(self, path, size, fps):
+        self.path = path
+        self.size = size
+        self.duration = round(1000 / fps)
+        self.frames = []
+        self.file_names = [str(path)]
+
+    def __enter__(self):
+        return self
+
+    def write(self, rgba):
+        from PIL import Image
+
+        image = Image.frombuffer("RGBA", self.size, rgba, "raw", "RGBA", 0, 1)
+        # several times faster than the default median cut
+        self.frames.append(image.convert("RGB").quantize(
+            method=Image.Quantize.FASTOCTREE))
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None and self.frames:
+            self.frames[0].save(self.path, save_all=True,
+                                append_images=self.frames[1:],
+                                duration=self.duration, loop=0)
+
+
+class _PngWriter:
+    """
+    Save each frame as `folder/frame_0000.png`...
+    """
+
+    def __init__(self, folder, size):
+        self.folder = Path(folder)
+        self.size = size
+        self.file_names = []
+
+    def __enter__(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def write(self, rgba):
+        from PIL import Image
+
+        name = str(self.folder / "frame_{:04d}.png".format(
+            len(self.file_names)))
+        # fast compression, the frames are intermediate files
+        image = Image.frombuffer("RGBA", self.size, rgba, "raw", "RGBA", 0, 1)
+        image.convert("RGB").save(name, compress_level=1)
+        self.file_names.append(name)
+
+    def __exit__(self, *exc_info):
+        pass
@@ -0,0 +1,149 @@
+# Render all the figures listed in a manifest, with a single load of the data.
+#
+# usage: python batch_render.py manifest.(json|yaml|toml)
+#
+# Example of manifest, in JSON:
+#     {"figures_path": "../FIGURES",
+#      "figures": [
+#          {"script": "versus-time", "field": "Deaths",
+#           "evolution_type": "daily", "zone": "countries",
+#           "yscale": "log", "start_date": "2020-03-01"},
+#          {"script": "phase-portrait", "field": "Confirmed",
+#           "smoothing": [9, 3]}]}
+#
+# "script" is one of `scripts`, the other keys of a figure override the
+# defaults of the script. "data_path", "cache_path", "max_workers" and
+# "profiles" (see `render.render_profiles`) are optional.
+
+import datetime as dt
+import inspect
+import json
+import sys
+from pathlib import Path
+
+import plot_phase_portrait
+import plot_versus_time
+import plot_versus_time_compare_smoothing
+import scatter_all_countries_curvature
+from data_cache import CsvCache
+from render import FigureJob, render_figures
+
+data_path = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
+
+# script -> (draw function, default parameters), as in the main() of the
+# scripts
+scripts = {
+    "versus-time": (plot_versus_time.draw_figure, dict(
+        field="Active", evolution_type="cumulative", smoothing=(7, 3),
+        days_interval=7, fitting_period=8, extrapol=0, yscale='linear',
+        zone="continents", start_date=dt.date(2020, 3, 1))),
+    "phase-portrait": (plot_phase_portrait.draw_figure, dict(
+        field="Confirmed", smoothing=(9, 3), yscale='linear',
+        zone="countries", start_date=dt.date(2020, 1, 1))),
+    "curvature-scatter": (scatter_all_countries_curvature.draw_figure, dict(
+        field="Confirmed", evolution_type="cumulative", smoothing=(7, 3),
+        xaxis_type="Number of days since > 100 confirmed cases [day]",
+        yscale='log', start_date=dt.date(2020, 2, 22))),
+    "smoothing-comparison": (plot_versus_time_compare_smoothing.draw_figure,
+                             dict(field="Deaths", evolution_type="daily",
+                                  smoothing=(5, 3), days_interval=7,
+                                  extrapol=0, fitting_period=8, yscale='log',
+                                  start_date=dt.date(2020, 3, 1))),
+}
+
+
+def read_manifest(path):
+    """
+    :param path: a .json, .yaml/.yml or .toml file
+    :return: the manifest as a dict
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        with path.open() as f:
+            return json.load(f)
+    elif path.suffix in (".yaml", ".yml"):
+        import yaml
+        with path.open() as f:
+            return yaml.safe_load(f)
+    elif path.suffix == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            # before Python 3.11
+            import tomli as tomllib
+        with path.open("rb") as f:
+            return tomllib.load(f)
+    else:
+        raise ValueError("Unknown manifest format: {}".format(path))
+
+
+def jobs_from_manifest(manifest):
+    """
+    :param manifest: see the head of this file
+    :return: a list of `render.FigureJob`
+    """
+    figures_path = manifest.get("figures_path", "../FIGURES")
+    jobs = []
+    for spec in manifest["figures"]:
+        spec = dict(spec)
+        try:
+            draw, defaults = scripts[spec.pop("script")]
+        except KeyError as e:
+            raise ValueError("Unknown script: {}".format(e))
+        kwargs = dict(defaults, **spec, figures_path=figures_path)
+        start_date = _to_date(kwargs.pop("start_date"))
+        kwargs["smoothing"] = tuple(kwargs["smoothing"])
+
+        unknown = set(kwargs) - set(inspect.signature(draw).parameters)
+        if unknown:
+            raise ValueError("Unknown parameters: {}".format(
+                ", ".join(sorted(unknown))))
+        jobs.append(FigureJob(draw, kwargs, start_date))
+    return jobs
+
+
+def _to_date(date):
+    if isinstance(date, dt.datetime):
+        return date.date()
+    elif isinstance(date, dt.date):
+        return date
+    return dt.date.fromisoformat(date)
+
+
+def main(manifest_path):
+    manifest = read_manifest(manifest_path)
+    jobs = jobs_from_manifest(manifest)
+    if not jobs:
+        print("No figures in", manifest_path, file=sys.stderr)
+        return 0
+    cache = None
+    if "cache_path" in manifest:
+        cache = CsvCache(manifest["cache_path"])
+        snapshot = Path(manifest["cache_path"], "snapshot")
+    else:
+        snapshot = None
+
+    try:
+        results = render_figures(manifest.get("data_path", data_path), jobs,
+                                 min(job.start_date for job in jobs),
+                                 max_workers=manifest.get("max_workers", 1),
+                                 profiles=manifest.get("profiles",
+                                                       ["publication"]),
+                                 cache=cache, snapshot=snapshot)
+    finally:
+        if cache is not None:
+            cache.close()
+    failed = 0
+    for result in results:
+        if result.error is None:
+            print("Saved", ", ".join(result.file_names))
+        else:
+            failed += 1
+            print("Failed", result.job.draw.__module__, result.job.kwargs,
+                  file=sys.stderr)
+            print(result.error, file=sys.stderr)
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(sys.argv[1]) else 0)
@@ -0,0 +1,340 @@
+# Benchmark the numeric paths and the rendering on synthetic time series
+# shaped like the ones of the J. Hopkins University, and check them against
+# straightforward reference implementations.
+#
+# usage: python benchmark.py [--sizes realistic,large] [--repeat 3]
+#                            [--baseline benchmark_baseline.json] [--save]
+#
+# The synthetic CSV files are written once in --data (../BENCHMARK by
+# default). With --save, the timings are stored in the baseline file,
+# otherwise they are compared to it and the stages slower than --tolerance
+# times their baseline are reported. The exit status is 1 on a regression or
+# a difference with the reference implementations.
+
+import argparse
+import datetime as dt
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import plot_versus_time
+from covid_utils import (Derivations, cumulative_evolution_single,
+                         evolution_all, evolution_country, load_data,
+                         time_series_files)
+from render import FigureJob, render_job
+
+# name -> (CSV rows, days)
+sizes = {
+    'realistic': (280, 300),
+    'large': (3000, 1000),
+    'stress': (10000, 2000),
+}
+
+evolution_types = ["cumulative", "daily", "curvature", "smoothedCurvature",
+                   "R0", "growthRate", "doublingTime"]
+
+first_date = dt.date(2020, 1, 22)
+
+smoothing = (7, 3)
+
+
+def synthetic_countries(n_countries):
+    """
+    :return: the countries of regions.dat and of the scripts, then
+             "Country 1", "Country 2"... up to `n_countries`
+    """
+    from regions import parse_regions
+
+    with open("regions.dat") as f:
+        members_by_region = parse_regions(f)
+    countries = ["China", "Korea, South"]
+    for members in members_by_region.values():
+        countries.extend(member for member in members
+                         if member not in members_by_region
+                         and member not in countries)
+    countries.extend("Country {}".format(i)
+                     for i in range(1, n_countries - len(countries) + 1))
+    return countries[:n_countries]
+
+
+def write_synthetic_csvs(path, n_rows, n_days, seed=0):
+    """
+    Write confirmed/deaths/recovered time series in `path`, with
+    `n_rows` rows (a country and its provinces) and `n_days` dates. The
+    values are cumulative with some missing values.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    countries = synthetic_countries(min(n_rows, 190))
+    row_countries = np.array(countries)[
+        np.r_[np.arange(len(countries)),
+              rng.integers(0, len(countries), n_rows - len(countries))]]
+    provinces = np.where(np.arange(n_rows) < len(countries), "",
+                         ["Province {}".format(i) for i in range(n_rows)])
+    dates = [first_date + dt.timedelta(days=i) for i in range(n_days)]
+    dates_str = ["{}/{}/{}".format(d.month, d.day, d.strftime('%y'))
+                 for d in dates]
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for field, name in time_series_files.items():
+        rates = rng.uniform(0, 0.05, size=(n_rows, 1))
+        daily = rng.poisson(50 * np.exp(rates * np.arange(n_days) / 10))
+        frame = pd.DataFrame(daily.cumsum(axis=1).astype(float),
+                             columns=dates_str)
+        frame.iloc[rng.integers(0, n_rows, 5), rng.integers(0, n_days, 5)] = (
+            np.nan)
+        frame.insert(0, "Long", 0.0)
+        frame.insert(0, "Lat", 0.0)
+        frame.insert(0, "Country/Region", row_countries)
+        frame.insert(0, "Province/State", provinces)
+        frame.to_csv(path / name, index=False, float_format="%.0f")
+
+
+def synthetic_path(directory, size):
+    """
+    :return: the path of the CSV files of `size`, written if missing
+    """
+    n_rows, n_days = sizes[size]
+    path = Path(directory, "{}x{}".format(n_rows, n_days))
+    if not all((path / name).exists() for name in time_series_files.values()):
+        write_synthetic_csvs(path, n_rows, n_days)
+    return str(path) + "/"
+
+
+def timed(function, repeat):
+    """
+    :return: the shortest wall time of `repeat` calls, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(path, repeat=3):
+    """
+    :param path: the folder of the time series
+    :param repeat: the number of runs of each stage
+    :return: a mapping stage -> seconds
+    """
+    timings = {}
+    timings['load_data'] = timed(
+        lambda: load_data(path, start_date=first_date), repeat)
+    data = load_data(path, start_date=first_date)
+    areas = [*data['CountryIndex'], *data['RegionIndex'], "World"]
+
+    def all_areas(function):
+        return lambda: [function(area) for area in areas]
+
+    timings['cumulative_evolution_single'] = timed(all_areas(
+        lambda area: cumulative_evolution_single(area, data, "Confirmed")),
+        repeat)
+    for evolution_type in evolution_types:
+        timings['evolution_country/' + evolution_type] = timed(all_areas(
+            lambda area: evolution_country(area, data, "Active",
+                                           evolution_type, data['FilterDate'],
+                                           smoothing)), repeat)
+        timings['evolution_all/' + evolution_type] = timed(
+            lambda: evolution_all(data, "Active", evolution_type, smoothing),
+            repeat)
+
+    # the evolutions of a phase portrait, one by one or from a new graph
+    phase_portrait = ("smoothedCurvature", "daily", "cumulative")
+    timings['phase-portrait/evolution_country'] = timed(all_areas(
+        lambda area: [evolution_country(area, data, "Active", evolution_type,
+                                        data['FilterDate'], smoothing)
+                      for evolution_type in phase_portrait]), repeat)
+
+    def from_graph():
+        graph = Derivations(data)
+        for area in areas:
+            for evolution_type in phase_portrait:
+                graph.series(area, "Active", evolution_type,
+                             data['FilterDate'], smoothing)
+
+    timings['phase-portrait/derivations'] = timed(from_graph, repeat)
+
+    with tempfile.TemporaryDirectory() as figures_path:
+        job = FigureJob(plot_versus_time.draw_figure, dict(
+            figures_path=figures_path + "/", field="Active",
+            evolution_type="daily", smoothing=smoothing, days_interval=7,
+            fitting_period=8, extrapol=0, yscale='linear',
+            zone="countries"))
+
+        def render():
+            result = render_job(job, data, ('preview',))
+            if result.error is not None:
+                raise RuntimeError(result.error)
+
+        timings['render/versus-time'] = timed(render, repeat)
+    return timings
+
+
+def check_reference(path, n_areas=5):
+    """
+    Compare the outputs of `load_data` and `evolution_country` to reference
+    implementations: pandas with all the columns, np.diff, scipy's
+    Savitzky-Golay filter and one fit or sum per date and area. Integer
+    outputs must be equal, float outputs equal up to rounding (1e-9).
+
+    :param path: the folder of the time series
+    :param n_areas: the number of countries checked with the per-date loops
+    :return: the list of the differences, empty if none
+    """
+    import pandas as pd
+    from scipy.signal import savgol_filter
+    from smoothing import smooth
+
+    differences = []
+
+    def check(name, actual, expected, exact):
+        if exact:
+            same = np.array_equal(actual, expected)
+        else:
+            same = np.allclose(actual, expected, rtol=1e-9, atol=1e-9,
+                               equal_nan=True)
+        if not same:
+            differences.append(name)
+
+    data = load_data(path, start_date=first_date)
+    cumulative = {}
+    for field, name in time_series_files.items():
+        frame = pd.read_csv(path + name)
+        values = frame.iloc[:, 4:].fillna(0).astype(int)
+        by_country = values.groupby(frame['Country/Region']).sum()
+        for country, row in zip(by_country.index, by_country.values):
+            cumulative[field, country] = row
+        check("load_data/" + field, data[field],
+              by_country.reindex(sorted(data['CountryIndex'])).values,
+              exact=True)
+
+    countries = sorted(data['CountryIndex'])
+    for country in countries:
+        check("cumulative_evolution_single/" + country,
+              cumulative_evolution_single(country, data, "Confirmed"),
+              cumulative["Confirmed", country], exact=True)
+
+    for country in countries[:n_areas]:
+        active = (cumulative["Confirmed", country]
+                  - cumulative["Deaths", country]
+                  - cumulative["Recovered", country])
+        daily = np.diff(active, prepend=0)
+        daily[0] = 0
+        expected = {
+            'cumulative': active,
+            'daily': daily,
+            'curvature': np.r_[0, 0, np.diff(active, 2)],
+            'smoothedCurvature': np.r_[0, 0, np.diff(savgol_filter(
+                np.diff(active), *smoothing))],
+            'R0': _reference_reproduction_number(daily),
+            'growthRate': np.exp(_reference_log_slopes(daily, 7)) - 1,
+            # compared as slopes: a zero slope gives an infinite doubling
+            # time, a slope rounded to 1e-17 a huge one
+            'doublingTime': _reference_log_slopes(daily, 7),
+        }
+        for evolution_type, values in expected.items():
+            actual = evolution_country(country, data, "Active",
+                                       evolution_type, data['FilterDate'],
+                                       smoothing)
+            if evolution_type == 'doublingTime':
+                actual = np.log(2) / actual
+            check("evolution_country/{}/{}".format(evolution_type, country),
+                  actual, values, exact=evolution_type in ('cumulative',
+                                                           'daily',
+                                                           'curvature'))
+        check("smooth/" + country, smooth(daily, smoothing),
+              savgol_filter(daily, *smoothing), exact=False)
+    return differences
+
+
+def _reference_log_slopes(daily, window):
+    slopes = np.full(len(daily), np.nan)
+    for end in range(window, len(daily) + 1):
+        t = np.arange(end - window, end)
+        y = daily[t]
+        if np.sum(y > 0) >= 2:
+            slopes[end - 1] = np.polyfit(t[y > 0], np.log(y[y > 0]), 1)[0]
+    return slopes
+
+
+def _reference_reproduction_number(daily, window=7, prior=(1, 5)):
+    from covid_utils import serial_interval_distribution
+
+    w = serial_interval_distribution()
+    incidence = np.maximum(daily, 0)
+    infectiousness = np.array([
+        sum(incidence[t - s] * w[s] for s in range(1, min(t, len(w) - 1) + 1))
+        for t in range(len(incidence))])
+    mean = np.full(len(incidence), np.nan)
+    for t in range(window - 1, len(incidence)):
+        total = infectiousness[t - window + 1:t + 1].sum()
+        if total >= 1e-9:
+            mean[t] = ((prior[0] + incidence[t - window + 1:t + 1].sum())
+                       / (1 / prior[1] + total))
+    return mean
+
+
+def regressions(timings, baseline, tolerance=1.5):
+    """
+    :param timings: see `run_benchmarks`
+    :param baseline: timings of a previous run
+    :param tolerance: the accepted ratio to the baseline
+    :return: a list of (stage, seconds, baseline seconds) for the stages
+             slower than `tolerance` times their baseline
+    """
+    return [(stage, seconds, baseline[stage])
+            for stage, seconds in timings.items()
+            if stage in baseline and seconds > tolerance * baseline[stage]]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark covid_utils")
+    parser.add_argument("--sizes", default="realistic",
+                        help="comma separated keys of `sizes`")
+    parser.add_argument("--data", default="../BENCHMARK")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    baseline_path = Path(args.baseline)
+    baselines = {}
+    if baseline_path.exists():
+        baselines = json.loads(baseline_path.read_text())
+
+    failed = False
+    for size in args.sizes.split(","):
+        path = synthetic_path(args.data, size)
+        differences = check_reference(path)
+        for name in differences:
+            print("Differs from the reference:", name, file=sys.stderr)
+        failed |= bool(differences)
+
+        timings = run_benchmarks(path, args.repeat)
+        for stage, seconds in timings.items():
+            print("{:10} {:40} {:9.4f} s".format(size, stage, seconds))
+        if args.save:
+            baselines[size] = timings
+        else:
+            for stage, seconds, reference in regressions(
+                    timings, baselines.get(size, {}), args.tolerance):
+                print("Regression: {} {} {:.4f} s instead of {:.4f} s".format(
+                    size, stage, seconds, reference), file=sys.stderr)
+                failed = True
+
+    if args.save:
+        baseline_path.write_text(json.dumps(baselines, indent=1))
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(sys.argv[1:]) else 0)
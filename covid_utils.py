@@ -1,169 +1,1236 @@
+import io
+import re
 import sys
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
 import datetime as dt
-from scipy.signal import savgol_filter
 
-# the beginning of values in the csv file
-start_of_values = 4
+import data_snapshot
+from data_cache import HttpSession, fetch_all
+from instrumentation import instrumented, span
+from regions import parse_regions, resolve_regions, membership_matrix
+from smoothing import reach, smooth, update_smoothed
 
+# the columns read from the csv files besides the values
+key_columns = ['Province/State', 'Country/Region']
 
-def load_data(path, start_date=dt.date(2020, 1, 1)):
-    confirmed = pd.read_csv(path + "time_series_covid19_confirmed_global.csv")
-    deaths = pd.read_csv(path + "time_series_covid19_deaths_global.csv")
-    recovered = pd.read_csv(path + "time_series_covid19_recovered_global.csv")
-    data = {'Confirmed': confirmed, 'Deaths': deaths, 'Recovered': recovered,
-            'Countries': set(confirmed['Country/Region'])}
-    with Path("confinement.dat").open() as f:
-        data['Confinement'] = extract_confinement(parse_confinement(f))
+# the columns of the values
+date_column = re.compile(r"\d+/\d+/\d+$")
 
-    dates_str = deaths.columns[start_of_values:].values.astype(str)
-    # Convert date axis to date vector
-    dates = np.array([dt.datetime.strptime(date_str, '%m/%d/%y').date()
-                      for date_str in dates_str])
+# the minimum number of days read before the start date, for the derived
+# evolutions (daily, curvature, R0...) of the first dates. It covers the R0
+# window with its serial interval and smoothing windows up to 57 days, see
+# `history_days_for`.
+history_days = 30
 
+# the number of last dates of a snapshot read again with the new dates, the
+# snapshot is rebuilt if the sources revised them
+revision_days = 7
+
+
+# the time series of the J. Hopkins University, by field
+time_series_files = {
+    'Confirmed': "time_series_covid19_confirmed_global.csv",
+    'Deaths': "time_series_covid19_deaths_global.csv",
+    'Recovered': "time_series_covid19_recovered_global.csv",
+}
+
+# the time series of the US counties, without recovered cases
+us_time_series_files = {
+    'Confirmed': "time_series_covid19_confirmed_US.csv",
+    'Deaths': "time_series_covid19_deaths_US.csv",
+}
+
+us_key_columns = ['Admin2', 'Province_State']
+
+# the levels of the areas below the countries: the provinces/states of the
+# global time series, the US states and the US counties
+subarea_levels = ['Provinces', 'States', 'Counties']
+
+confinement_path = "confinement.dat"
+
+# the states of `data['ConfinementStates']`: 0 without confinement, then
+# partial ('P') and total ('T') confinement
+confinement_states = {'P': 1, 'T': 2}
+
+regions_path = "regions.dat"
+
+# the serial interval of COVID-19 in days, (mean, standard deviation), from
+# Nishiura et al. 2020
+serial_interval_moments = (4.7, 2.9)
+
+# the number of days of the windows of the reproduction number estimates
+reproduction_window = 7
+
+
+@instrumented("load_data")
+def load_data(path, start_date=dt.date(2020, 1, 1), cache=None,
+              snapshot=None, regions=None, counties=False, rebuild=False,
+              previous=None, smoothings=()):
+    """
+    :param path: the folder or URL containing the time series
+    :param start_date: the first date of the date axis. Only the values from
+                       `history_days_for(smoothings)` before it are read.
+    :param cache: a `data_cache.CsvCache` for remote files, or None to read
+                  them from memory. They are downloaded concurrently.
+    :param snapshot: a directory where the parsed data is compiled to and
+                     memory-mapped from, or None. When the source files
+                     change, only their new date columns are parsed and
+                     appended to the snapshot, see `_append_new_dates`.
+    :param rebuild: True to parse all the dates again, e.g. after the
+                    sources revised older values than `revision_days`
+    :param regions: a mapping region -> members (countries or regions), or
+                    None to read `regions_path`
+    :param counties: True to read the time series of the US counties too
+    :param previous: the data of a previous load, or None. If the new data
+                     only appends dates to it, its derived evolutions are
+                     extended instead of computed again.
+    :param smoothings: the smoothings the evolutions will be computed with,
+                       see `smoothing.smooth`. The evolutions at the start
+                       date are the same as with all the dates read.
+    :return: the data. The provinces are areas named "Hubei, China", the US
+             states and counties "Alabama, US" and "Autauga, Alabama, US",
+             `data['Subareas']` maps an area to the areas of the level below
+             and `data['SubareaParents']` a subarea to the area above.
+    """
+    sources = {field: path + name
+               for field, name in time_series_files.items()}
+    if counties:
+        sources.update(("US/" + field, path + name)
+                       for field, name in us_time_series_files.items())
+    if _is_url(path):
+        urls = list(sources.values())
+        if cache is not None:
+            downloaded = cache.get_all(urls)
+        else:
+            with HttpSession() as session:
+                downloaded = fetch_all(urls,
+                                       lambda url: _download(session, url))
+        sources = dict(zip(sources, downloaded))
+
+    history = history_days_for(smoothings)
+    first_date = (start_date - dt.timedelta(days=history)
+                  if history is not None else None)
+    compiled = None
+    signature = None
+    if snapshot is not None and not any(isinstance(source, bytes)
+                                        for source in sources.values()):
+        signature = data_snapshot.source_signature(
+            [*sources.values(), confinement_path])
+        if not rebuild:
+            compiled = _covering(data_snapshot.load(snapshot, signature),
+                                 first_date)
+    if compiled is None:
+        older = None
+        if signature is not None and not rebuild:
+            older = _covering(data_snapshot.load(snapshot), first_date)
+        compiled = _compile_data(sources, older, first_date)
+        if signature is not None:
+            data_snapshot.save(snapshot, signature, *compiled)
+    arrays, meta = compiled
+
+    data = {field: arrays[field] for field in time_series_files}
+    countries = meta['Countries']
+    data['Countries'] = set(countries)
+    data['CountryIndex'] = {country: i for i, country in enumerate(countries)}
+    confinement = {country: {t: [dateIn(d) for d in dates]
+                             for t, dates in dates_by_type.items()}
+                   for country, dates_by_type in meta['Confinement'].items()}
+    data['Confinement'] = extract_confinement(confinement)
+    subareas = meta['Subareas']
+    data['SubareaIndex'] = {subarea: i for i, subarea in enumerate(subareas)}
+    data['SubareaCounts'] = {field: arrays['Subarea' + field]
+                             for field in time_series_files}
+    data['SubareaParents'] = dict(zip(subareas, meta['SubareaParents']))
+    data['Subareas'] = {}
+    for subarea, parent in data['SubareaParents'].items():
+        data['Subareas'].setdefault(parent, []).append(subarea)
+    if regions is None:
+        with Path(regions_path).open() as f:
+            regions = parse_regions(f)
+    add_regions(data, regions)
+
+    data['AllDateAxis'] = np.array(meta['DateAxis'])
+    data['AllDates'] = np.asarray(arrays['Dates']).astype(object)
+    add_confinement(data, confinement)
+    if previous is not None and _appends_dates(data, previous):
+        data['Derivations'] = Derivations(data, previous['Derivations'])
+    else:
+        data['Derivations'] = Derivations(data)
+
+    return with_start_date(data, start_date)
+
+
+def history_days_for(smoothings=(), growth_window=7):
+    """
+    :param smoothings: the smoothings of the evolutions, see
+                       `smoothing.smooth`
+    :param growth_window: see `evolution_country`
+    :return: the number of days before a date its derived evolutions depend
+             on, at least `history_days`, or None if they depend on all the
+             previous dates (EWMA smoothing)
+    """
+    days = [history_days, growth_window + 1]
+    for smoothing in smoothings:
+        half_window = reach(smoothing)
+        if half_window is None:
+            return None
+        # the smoothed daily values of the date and of the day before
+        days.append(half_window + 2)
+    return max(days)
+
+
+def _appends_dates(data, previous):
+    """
+    :return: True if `data` has the areas and the dates of `previous` with
+             the same values, and possibly more dates
+    """
+    n_old = len(previous['AllDates'])
+    if (data['AllDateAxis'][:n_old].tolist()
+            != previous['AllDateAxis'].tolist()
+            or data['CountryIndex'] != previous['CountryIndex']
+            or data['SubareaIndex'] != previous['SubareaIndex']
+            or data['RegionIndex'] != previous['RegionIndex']
+            or (data['Membership'] != previous['Membership']).nnz):
+        return False
+    return all(
+        np.array_equal(data[field][:, :n_old], previous[field])
+        and np.array_equal(data['SubareaCounts'][field][:, :n_old],
+                           previous['SubareaCounts'][field])
+        for field in time_series_files)
+
+
+def with_start_date(data, start_date):
+    """
+    :param data: the data from J. Hopkins University
+    :param start_date: the first date of the date axis
+    :return: a shallow copy of the data with the date axis starting at
+             `start_date`
+    """
     # Filter axe of dates
-    filter_date = dates >= start_date
+    filter_date = data['AllDates'] >= start_date
+    data = dict(data)
     data['FilterDate'] = filter_date
-    data['DateAxis'] = dates_str[filter_date]
-    data['Dates'] = dates[filter_date]
-
+    data['DateAxis'] = data['AllDateAxis'][filter_date]
+    data['Dates'] = data['AllDates'][filter_date]
     return data
 
 
-def cumulative_evolution_single(area, data):
+@instrumented("regions")
+def add_regions(data, regions):
     """
-    :param area: a country or the name set of countries
+    Compile the regions to a region x country membership matrix and compute
+    the cumulative evolution of every region with one product per field.
+
     :param data: the data from J. Hopkins University
-    :return: the cumulative evolution of the area
+    :param regions: a mapping region -> members (countries or regions)
     """
-    size = len(data.iloc[0].values[start_of_values:])
-    evolution = np.zeros(size, dtype=int)
-    countries = _get_countries(area)
+    region_index, membership, unknown = membership_matrix(
+        resolve_regions(regions), data['CountryIndex'])
+    for region, countries in unknown.items():
+        print("Unknown countries in {}: {}".format(region,
+                                                   ", ".join(countries)),
+              file=sys.stderr)
 
-    for i, country in enumerate(data['Country/Region']):
-        if area == "World" or country in countries:
-            country_values = data.iloc[i].values[start_of_values:]
-            # replace missing values by zeroes
-            country_values[np.isnan(country_values.tolist())] = 0
-            evolution[:] += country_values.astype(int)
+    data['RegionIndex'] = region_index
+    data['Membership'] = membership
+    data['RegionCounts'] = {field: membership @ data[field]
+                            for field in time_series_files}
 
-    if sum(evolution) == 0: 
-        print("Warning, ", country, "has zero case. Probably wrong name")
 
-    return evolution
+@instrumented("confinement")
+def add_confinement(data, quar_dates_by_type_by_country):
+    """
+    Compile the confinements to an areas x dates matrix of the states of
+    `confinement_states`, on the axis of `data['AllDates']`. The later
+    confinements of a country replace the earlier ones. A region or the
+    World is in a state when at least half of its countries are, a province,
+    state or county is in the state of its country.
 
+    The start of the confinement of each area is compiled too, as in
+    `extract_confinement`: the first total confinement of a country, or its
+    last partial one, and the first day of the strictest state of a region
+    or the World.
 
-def _get_countries(area):
-    """
-    :param area: a country or the name set of countries
-    :return: countries that belong to the area
-    """
-    if area == "EU":
-        countries = {"France", "Germany", "Spain", "Italy", "Netherlands",
-                     "Portugal", "Belgium", "Sweden", "Finland", "Greece",
-                     "Ireland", "Poland", "Luxembourg", "Malta", "Slovenia",
-                     "Austria", "Croatia", "Hungary", "Czechia", "Slovakia",
-                     "Hungary", "Romania", "Bulgaria", "Cyprus", "Lithuania",
-                     "Latvia", "Estonia"}
-    elif area == "European continent":
-        countries = {"France", "Germany", "Spain", "Italy", "Netherlands",
-                     "Portugal", "Belgium", "Sweden", "Finland", "Greece",
-                     "Ireland", "United Kingdom", "Norway", "Switzerland",
-                     "Poland", "Andorra", "Luxembourg", "Liechtenstein",
-                     "Malta", "San Marino", "Holy See", "Monaco", "Hungary",
-                     "Czechia", "Slovakia", "Slovenia", "Croatia",
-                     "Bosnia and Herzegovina", "Serbia", "Albania", "Romania",
-                     "Bulgaria", "Ukraine", "Belarus", "Latvia", "Estonia",
-                     "Lithuania", "Moldova", "North Macedonia", "Kosovo",
-                     "Montenegro", "Iceland", "Cyprus"}
-    elif area == "European continent+Russia":
-        countries = {"France", "Germany", "Spain", "Italy", "Netherlands",
-                     "Portugal", "Belgium", "Sweden", "Finland", "Greece",
-                     "Ireland", "United Kingdom", "Norway", "Switzerland",
-                     "Poland", "Andorra", "Luxembourg", "Liechtenstein",
-                     "Malta", "San Marino", "Holy See", "Monaco", "Hungary",
-                     "Czechia", "Slovakia", "Slovenia", "Croatia",
-                     "Bosnia and Herzegovina", "Serbia", "Albania", "Romania",
-                     "Bulgaria", "Ukraine", "Belarus", "Latvia", "Estonia",
-                     "Lithuania", "Moldova", "North Macedonia", "Kosovo",
-                     "Montenegro", "Iceland", "Cyprus", "Russia"}
-    elif area == "Africa":
-        countries = {"Morocco", "Tunisia", "Algeria", "Lybia", "Egypt", "Mali",
-                     "Niger", "Chad", "Sudan", "Ethiopia", "Mauritania",
-                     "Senegal", "Guinea", "Liberia", "Ghana", "Benin", "Togo",
-                     "Nigeria", "Sierra Leone", "Cameroon",
-                     "Central African Republic", "Gabon",
-                     "Congo (Brazzaville)", "Congo (Kinshasa)", "Angola",
-                     "Namibia", "Botswana", "Lesotho", "South Africa",
-                     "Eswatini", "Zimbabwe", "Mozambique", "Zambia",
-                     "Madagascar", "Burundi", "Kenya", "Uganda", "Somalia",
-                     "South Sudan", "Cote d'Ivoire", "Rwanda", "Djibouti"}
-    elif area == "North-America":
-        countries = {"US", "Canada"}
-    elif area == "South-America":
-        countries = {"Brazil", "Peru", "Colombia", "Uruguay", "Paraguay",
-                      "Argentina", "Bolivia", "Ecuador", "Venezuela",
-                      "Guyana", "Suriname"}
+    :param data: the data from J. Hopkins University, with its regions
+    :param quar_dates_by_type_by_country: see `parse_confinement`
+    """
+    dates = np.array(data['AllDates'], dtype='datetime64[D]')
+    country_index = data['CountryIndex']
+    country_states = np.zeros((len(country_index), len(dates)), dtype=np.int8)
+    country_starts = np.full(len(country_index), -1)
+    for country, dates_by_type in quar_dates_by_type_by_country.items():
+        if country not in country_index:
+            continue
+        events = sorted((d, t) for t, ds in dates_by_type.items()
+                        for d in ds if t in confinement_states)
+        for d, t in events:
+            start = np.searchsorted(dates, np.datetime64(d))
+            country_states[country_index[country], start:] = (
+                confinement_states[t])
+        totals = [d for d, t in events if t == 'T']
+        partials = [d for d, t in events if t == 'P']
+        if totals or partials:
+            start = np.searchsorted(dates, np.datetime64(
+                min(totals) if totals else max(partials)))
+            if start < len(dates):
+                country_starts[country_index[country]] = start
+
+    membership = data['Membership']
+    n_members = np.maximum(np.asarray(membership.sum(axis=1)).ravel(), 1)
+    region_states = np.zeros((membership.shape[0], len(dates)), dtype=np.int8)
+    world_states = np.zeros((1, len(dates)), dtype=np.int8)
+    for state in confinement_states.values():
+        reached = country_states >= state
+        region_states += (membership @ reached) / n_members[:, None] >= 0.5
+        world_states += reached.mean(axis=0) >= 0.5
+
+    subareas = data.get('SubareaIndex', {})
+    parents = data.get('SubareaParents', {})
+    subarea_states = np.zeros((len(subareas), len(dates)), dtype=np.int8)
+    subarea_starts = np.full(len(subareas), -1)
+    for row, subarea in enumerate(subareas):
+        country = subarea
+        while country in parents:
+            country = parents[country]
+        if country in country_index:
+            subarea_states[row] = country_states[country_index[country]]
+            subarea_starts[row] = country_starts[country_index[country]]
+
+    areas = [*country_index, *data['RegionIndex'], *subareas, "World"]
+    data['ConfinementRows'] = {area: row for row, area in enumerate(areas)}
+    data['ConfinementStates'] = np.vstack([country_states, region_states,
+                                           subarea_states, world_states])
+    data['ConfinementStarts'] = np.concatenate([
+        country_starts, _first_reached(region_states), subarea_starts,
+        _first_reached(world_states)])
+
+
+def confinement_starts(data, areas, state=None):
+    """
+    :param data: the data from J. Hopkins University
+    :param areas: a list of areas
+    :param state: a state of `confinement_states`, or None for the start of
+                  the confinement of each area, see `add_confinement`
+    :return: the array of the indices in `data['AllDates']` of the first day
+             of the areas in the state, -1 for the areas never in it
+    """
+    rows = data['ConfinementRows']
+    unknown = [area for area in areas if area not in rows]
+    if unknown:
+        raise ValueError(", ".join(unknown))
+    selected = [rows[area] for area in areas]
+    if state is None:
+        return data['ConfinementStarts'][selected]
+    return _first_reached(data['ConfinementStates'][selected], state)
+
+
+def _first_reached(states, state=None):
+    """
+    :param states: an areas x dates matrix of `confinement_states`
+    :param state: a state, or None for the strictest state of each area
+    :return: the index of the first date of each area in the state, or -1
+    """
+    if state is None:
+        target = states.max(axis=1, initial=0)
     else:
-        countries = {area}
-    return countries
+        target = np.full(len(states), state)
+    reached = (states >= target[:, None]) & (target[:, None] > 0)
+    return np.where(reached.any(axis=1), reached.argmax(axis=1), -1)
+
+
+def confinement_start(area, data):
+    """
+    :param area: see `cumulative_evolution_single`
+    :param data: the data from J. Hopkins University
+    :return: (date, index) of the start of the confinement of the area, see
+             `add_confinement`. The index is the one in `data['Dates']`, 0 if
+             the confinement started before. (None, -1) without confinement.
+    """
+    start = confinement_starts(data, [area])[0]
+    if start < 0:
+        return None, -1
+    first = len(data['AllDates']) - len(data['Dates'])
+    return data['AllDates'][start], max(int(start) - first, 0)
+
+
+def _is_url(source):
+    return isinstance(source, str) and source.startswith(("http://",
+                                                          "https://"))
+
+
+def _download(session, url):
+    """
+    :return: the body of `url`, fetched with a `data_cache.HttpSession`
+    """
+    status, _, body = session.fetch(url, {})
+    if status != 200:
+        raise OSError("Unexpected status {} for {}".format(status, url))
+    return body
+
+
+def _open(source):
+    """
+    :param source: a path or the content of a file
+    :return: something `pd.read_csv` can read
+    """
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _covering(compiled, first_date):
+    """
+    :param first_date: the first date needed, None for all the dates
+    :return: `compiled` if it starts at or before `first_date`, else None
+    """
+    if compiled is None:
+        return None
+    start_date = compiled[1].get('StartDate')
+    if start_date is not None and (first_date is None
+                                   or start_date > str(first_date)):
+        return None
+    return compiled
+
+
+@instrumented("parse")
+def _compile_data(sources, previous=None, first_date=None):
+    """
+    :param sources: a mapping field -> path or content of the time series,
+                    "US/" + field for the time series of the US counties
+    :param previous: (arrays, meta) compiled from older sources, or None
+    :param first_date: the first date to read, or None to read all the dates
+    :return: (arrays, meta), as stored by `data_snapshot.save`
+    """
+    import pandas as pd
+
+    if previous is not None:
+        compiled = _append_new_dates(sources, *previous)
+        if compiled is not None:
+            return compiled
+
+    headers = {key: pd.read_csv(_open(source), nrows=0).columns
+               for key, source in sources.items()}
+    dates_str = _date_columns(headers['Deaths'])
+    dates = _parse_dates(dates_str)
+    if first_date is not None:
+        kept = dates >= np.datetime64(first_date)
+        dates_str, dates = dates_str[kept], dates[kept]
+
+    frames = {key: _read_values(source, headers[key], dates_str)
+              for key, source in sources.items()}
+    arrays, countries, subareas, parents = _aggregate_frames(frames)
+
+    arrays['Dates'] = dates
+    meta = {'Countries': countries, 'Subareas': subareas,
+            'SubareaParents': parents,
+            'DateAxis': dates_str.tolist(),
+            'Confinement': _read_confinement()}
+    if first_date is not None:
+        meta['StartDate'] = str(first_date)
+    return arrays, meta
+
+
+def _append_new_dates(sources, arrays, meta):
+    """
+    Parse only the date columns that are not in `meta` yet and append them to
+    the arrays. Of the previous dates, only the last `revision_days` are read
+    again, to check that the sources did not revise them.
+
+    :param sources: a mapping field -> path of the time series
+    :param arrays: the arrays compiled from older sources
+    :param meta: the metadata compiled from older sources
+    :return: (arrays, meta) or None if the sources have no new date or if
+             their areas, previous dates or last values differ.
+    """
+    import pandas as pd
+
+    old_dates = meta['DateAxis']
+    headers = {key: pd.read_csv(_open(source), nrows=0).columns
+               for key, source in sources.items()}
+    dates_str = _date_columns(headers['Deaths'])
+    # the snapshot may start after the first date of the sources
+    if old_dates and old_dates[0] in dates_str:
+        dates_str = dates_str[dates_str.tolist().index(old_dates[0]):]
+    if (len(dates_str) <= len(old_dates)
+            or dates_str[:len(old_dates)].tolist() != old_dates):
+        return None
+
+    new_dates = dates_str[len(old_dates):]
+    checked = dates_str[max(len(old_dates) - revision_days, 0):
+                        len(old_dates)]
+    frames = {key: _read_values(source, headers[key],
+                                np.concatenate([checked, new_dates]))
+              for key, source in sources.items()}
+    new_arrays, countries, subareas, parents = _aggregate_frames(frames)
+    if (countries != meta['Countries'] or subareas != meta['Subareas']
+            or parents != meta['SubareaParents']):
+        return None
+
+    n_checked = len(checked)
+    for name, array in new_arrays.items():
+        old = arrays[name]
+        if not np.array_equal(array[:, :n_checked],
+                              old[:, old.shape[1] - n_checked:]):
+            return None
+        new_arrays[name] = np.hstack([old, array[:, n_checked:]])
+    new_arrays['Dates'] = np.concatenate([arrays['Dates'],
+                                          _parse_dates(new_dates)])
+    new_meta = dict(meta, DateAxis=dates_str.tolist(),
+                    Confinement=_read_confinement())
+    return new_arrays, new_meta
+
+
+def _date_columns(header):
+    """
+    :param header: the columns of a time series
+    :return: the array of the columns of the dates
+    """
+    return np.array([column for column in header
+                     if date_column.match(column)], dtype=str)
+
+
+def _read_values(source, header, dates_str):
+    """
+    :param source: the path or content of a time series
+    :param header: the columns of the time series
+    :param dates_str: the date columns to read, the dates missing in the
+                      time series are read as zeros
+    :return: a DataFrame of the key columns and the values of the dates
+    """
+    import pandas as pd
+
+    columns = key_columns if 'Country/Region' in header else us_key_columns
+    # the C parser is several times faster with its own numeric types than
+    # with nullable Int32 columns, `aggregate_by` narrows them
+    frame = pd.read_csv(_open(source), usecols=[
+        *columns, *(date for date in dates_str if date in header)])
+    if len(frame.columns) < len(columns) + len(dates_str):
+        frame = frame.reindex(columns=[*columns, *dates_str], fill_value=0)
+    return frame
+
+
+def _aggregate_frames(frames):
+    """
+    Aggregate the time series at each level with one grouped sum.
+
+    :param frames: a mapping field -> DataFrame of `_read_values`, "US/" +
+                   field for the time series of the US counties
+    :return: (arrays, countries, subareas, parents). The arrays map the
+             fields to countries x dates matrices and "Subarea" + field to
+             subareas x dates matrices. The subareas are sorted by level of
+             `subarea_levels`, then by name. `parents` gives the area above
+             each subarea, the names of the areas may contain ", ".
+    """
+    import pandas as pd
+
+    global_frames = {field: frames[field] for field in time_series_files}
+    countries = sorted(set().union(*(frame['Country/Region']
+                                     for frame in global_frames.values())))
+    arrays = {field: aggregate_by_country(frame, countries)
+              for field, frame in global_frames.items()}
+
+    # level -> field -> (frame, key of each row, parent of each row)
+    levels = {level: {} for level in subarea_levels}
+    for field, frame in global_frames.items():
+        levels['Provinces'][field] = frame, _join_keys(
+            frame['Province/State'], frame['Country/Region']), \
+            frame['Country/Region']
+    for field in us_time_series_files:
+        frame = frames.get("US/" + field)
+        if frame is not None:
+            states = _join_keys(frame['Province_State'], "US")
+            levels['States'][field] = frame, states, "US"
+            levels['Counties'][field] = frame, _join_keys(frame['Admin2'],
+                                                          states), states
+
+    n_dates = arrays['Deaths'].shape[1]
+    subareas = []
+    parents = []
+    blocks = {field: [] for field in time_series_files}
+    for by_field in levels.values():
+        parent_of = {}
+        for _, keys, key_parents in by_field.values():
+            rows = pd.DataFrame({'key': keys, 'parent': key_parents})
+            rows = rows.dropna(subset=['key'])
+            parent_of.update(zip(rows['key'], rows['parent']))
+        names = sorted(parent_of)
+        subareas.extend(names)
+        parents.extend(str(parent_of[name]) for name in names)
+        for field in time_series_files:
+            if field in by_field:
+                frame, keys, _ = by_field[field]
+                blocks[field].append(aggregate_by(frame, keys, names))
+            else:
+                blocks[field].append(np.zeros((len(names), n_dates),
+                                              dtype=np.int32))
+    for field in time_series_files:
+        arrays['Subarea' + field] = np.vstack(blocks[field])
+    return arrays, countries, subareas, parents
+
+
+def _parse_dates(dates_str):
+    """
+    :param dates_str: dates as M/D/YY
+    :return: an array of datetime64[D]
+    """
+    import pandas as pd
+
+    dates = pd.to_datetime(pd.Index(dates_str, dtype=object),
+                           format='%m/%d/%y')
+    return dates.values.astype('datetime64[D]')
+
+
+def _read_confinement():
+    """
+    :return: the confinements of `confinement_path` as
+             country -> type -> [M/D/YY]
+    """
+    with Path(confinement_path).open() as f:
+        return {country: {t: [dateOut(d) for d in dates]
+                          for t, dates in dates_by_type.items()}
+                for country, dates_by_type in parse_confinement(f).items()}
+
+
+def _join_keys(first, second):
+    """
+    :return: the Series "first, second", missing where `first` is missing
+    """
+    return first.astype("string") + ", " + second
+
+
+def aggregate_by_country(frame, countries):
+    """
+    Sum the rows of a J. Hopkins University time series by country.
+
+    :param frame: the DataFrame read from a time series CSV
+    :param countries: the sorted countries, one per row of the result
+    :return: a countries x dates matrix of 32 bits int, missing values count
+             as zero
+    """
+    return aggregate_by(frame, frame['Country/Region'], countries)
+
+
+def aggregate_by(frame, keys, names):
+    """
+    :param frame: the DataFrame read from a time series CSV
+    :param keys: the key of each row, the rows with a missing key are ignored
+    :param names: the keys, one per row of the result
+    :return: a names x dates matrix of the sums of the values of the dates by
+             key, as 32 bits int
+    """
+    values = date_values(frame).fillna(0).astype(np.int32)
+    by_key = values.groupby(np.asarray(keys, dtype=object)).sum()
+    return by_key.reindex(names, fill_value=0).values
+
+
+def date_values(frame):
+    """
+    :return: the columns of the dates of a time series
+    """
+    return frame[[column for column in frame.columns
+                  if date_column.match(str(column))]]
+
+
+def cumulative_evolution_single(area, data, field):
+    """
+    :param area: a country, a region, a province, a US state or county (see
+                 `load_data`) or "World"
+    :param data: the data from J. Hopkins University
+    :param field: "Confirmed", "Deaths" or "Recovered"
+    :return: the cumulative evolution of the area
+    """
+    with span("cumulative_evolution_single", area):
+        if area == "World":
+            return data[field].sum(axis=0)
+        elif area in data['RegionIndex']:
+            region_counts = data['RegionCounts'][field]
+            return np.array(region_counts[data['RegionIndex'][area]])
+        elif area in data['CountryIndex']:
+            return np.array(data[field][data['CountryIndex'][area]])
+        elif area in data.get('SubareaIndex', ()):
+            subarea_counts = data['SubareaCounts'][field]
+            return np.array(subarea_counts[data['SubareaIndex'][area]])
+        else:
+            raise ValueError(area)
 
 
 def evolution_country(area, data, field, evolution_type, filter_date,
-                      smoothing):
+                      smoothing, growth_window=7):
+    """
+    :param area: a country, a region or "World"
+    :param data: the data from J. Hopkins University
+    :param field: see `cumulative_evolution_field`
+    :param evolution_type: "cumulative", "daily", "curvature",
+                           "smoothedCurvature", "R0", "growthRate" or
+                           "doublingTime"
+    :param filter_date: the dates to keep
+    :param smoothing: see `smoothing.smooth`
+    :param growth_window: the number of days of the rolling fits of
+                          "growthRate" and "doublingTime"
+    :return: the evolution of the area
+    """
+    with span("evolution_country", area):
+        cumulative_evolution = cumulative_evolution_field(area, data, field)
+        evolution = evolution_of(cumulative_evolution, evolution_type,
+                                 smoothing, growth_window)
+        return evolution[filter_date]
+
+
+def evolution_all(data, field, evolution_type, smoothing, areas=None,
+                  growth_window=7):
+    """
+    :param data: the data from J. Hopkins University
+    :param field: see `evolution_country`
+    :param evolution_type: see `evolution_country`
+    :param smoothing: see `smoothing.smooth`
+    :param areas: the areas, the countries of `data['CountryIndex']` if None
+    :param growth_window: see `evolution_country`
+    :return: an areas x dates array, filtered by `data['FilterDate']`
+    """
+    if areas is None:
+        cumulative_evolution = combine_fields(field, lambda name: data[name])
+    else:
+        cumulative_evolution = np.array(
+            [cumulative_evolution_field(area, data, field) for area in areas])
+    evolution = evolution_of(cumulative_evolution, evolution_type, smoothing,
+                             growth_window)
+    return evolution[:, data['FilterDate']]
+
+
+def cumulative_evolution_field(area, data, field):
+    """
+    :param area: a country, a region or "World"
+    :param data: the data from J. Hopkins University
+    :param field: "Confirmed", "Deaths", "Active", "DeathRate" or "Recovered"
+    :return: the cumulative evolution of the field for the area
+    """
+    return combine_fields(
+        field, lambda name: cumulative_evolution_single(area, data, name))
+
+
+def combine_fields(field, cumulative):
+    """
+    :param field: see `cumulative_evolution_field`
+    :param cumulative: a function "Confirmed"/"Deaths"/"Recovered" -> array
+    :return: the cumulative evolution of the field
+    """
     if field == "Confirmed":
-        cumulative_evolution = cumulative_evolution_single(area, data['Confirmed'])
+        cumulative_evolution = cumulative('Confirmed')
     elif field == "Deaths":
-        cumulative_evolution = cumulative_evolution_single(area, data['Deaths'])
+        cumulative_evolution = cumulative('Deaths')
     elif field == "Active":
-        evol_c = cumulative_evolution_single(area, data['Confirmed'])
-        evol_d = cumulative_evolution_single(area, data['Deaths'])
-        evol_r = cumulative_evolution_single(area, data['Recovered'])
+        evol_c = cumulative('Confirmed')
+        evol_d = cumulative('Deaths')
+        evol_r = cumulative('Recovered')
         cumulative_evolution = evol_c - evol_r - evol_d
     elif field == "DeathRate":
-        evol_c = cumulative_evolution_single(area, data['Confirmed'])
-        evol_d = cumulative_evolution_single(area, data['Deaths'])
+        evol_c = cumulative('Confirmed')
+        evol_d = cumulative('Deaths')
         cumulative_evolution = evol_d/evol_c*100
-    elif field=="Recovered":
-        cumulative_evolution = evolution_single(area, dataParam['Recovered'])
+    elif field == "Recovered":
+        cumulative_evolution = cumulative('Recovered')
     else:
         raise ValueError(field)
+    return cumulative_evolution
+
 
+def evolution_of(cumulative_evolution, evolution_type, smoothing,
+                 growth_window=7):
+    """
+    :param cumulative_evolution: a cumulative evolution, or an areas x dates
+                                 array of them
+    :param evolution_type: see `evolution_country`
+    :param smoothing: see `smoothing.smooth`
+    :param growth_window: see `evolution_country`
+    :return: the evolution, computed along the last axis
+    """
+    shape = np.shape(cumulative_evolution)
     if evolution_type == "cumulative":
         evolution = cumulative_evolution
     elif evolution_type == "daily":
-        evolution = np.zeros(len(cumulative_evolution))
-        evolution[1:] = np.diff(cumulative_evolution)
+        evolution = np.zeros(shape)
+        evolution[..., 1:] = np.diff(cumulative_evolution, axis=-1)
     elif evolution_type == "curvature":
-        evolution = np.zeros(len(cumulative_evolution))
-        evolution[2:] = np.diff(cumulative_evolution, 2)
+        evolution = np.zeros(shape)
+        evolution[..., 2:] = np.diff(cumulative_evolution, 2, axis=-1)
     elif evolution_type == "smoothedCurvature":
         # np.diff #1
-        window_length, polyorder = smoothing
-        evolution = np.diff(cumulative_evolution)
-        smoothed_evolution = savgol_filter(evolution, window_length, polyorder)
+        evolution = np.diff(cumulative_evolution, axis=-1)
+        smoothed_evolution = smooth(evolution, smoothing)
         # np.diff #2
-        evolution = np.zeros(len(cumulative_evolution))
-        evolution[2:] = np.diff(smoothed_evolution)
+        evolution = np.zeros(shape)
+        evolution[..., 2:] = np.diff(smoothed_evolution, axis=-1)
     elif evolution_type == "R0":
-        window_length, polyorder = smoothing
-        evolution = np.zeros(len(cumulative_evolution))
-        delta = np.diff(cumulative_evolution)
-        smoothed_delta = savgol_filter(delta, window_length, polyorder)
-        evolution[1:] = smoothed_delta/np.roll(smoothed_delta, 5)
+        daily = np.zeros(shape)
+        daily[..., 1:] = np.diff(cumulative_evolution, axis=-1)
+        evolution, _, _ = reproduction_number(daily)
+    elif evolution_type in ("growthRate", "doublingTime"):
+        daily = np.zeros(shape)
+        daily[..., 1:] = np.diff(cumulative_evolution, axis=-1)
+        slope = rolling_log_slope(daily, growth_window)
+        if evolution_type == "growthRate":
+            evolution = np.exp(slope) - 1
+        else:
+            # negative for a halving time
+            with np.errstate(divide='ignore'):
+                evolution = np.log(2) / slope
     else:
         raise ValueError(evolution_type)
 
-    return evolution[filter_date]
+    return evolution
+
+
+class Derivations:
+    """
+    A lazy graph of the evolutions of the areas. Each evolution is computed
+    on first use from the ones it derives from, and kept: the cumulative
+    evolution of a field from the ones of Confirmed, Deaths and Recovered,
+    the daily values from the cumulative ones, the smoothed daily values from
+    the daily ones, the curvatures, R0 and growth rates from them. The
+    evolutions are on the whole date axis and read only.
+    """
+
+    def __init__(self, data, previous=None):
+        """
+        :param data: the data from J. Hopkins University
+        :param previous: the `Derivations` of data with the first dates of
+                         `data` and the same values, or None. Its
+                         evolutions are extended to the new dates.
+        """
+        self.data = data
+        # (evolution type, field, area, parameters) -> evolution
+        self.evolutions = {}
+        self.previous = previous.evolutions if previous is not None else {}
+
+    def series(self, area, field, evolution_type, filter_date, smoothing,
+               growth_window=7):
+        """
+        Same as `evolution_country`, computed from the graph.
+
+        :return: the evolution of the area at the dates of `filter_date`
+        """
+        return self.evolution(area, field, evolution_type, smoothing,
+                              growth_window)[filter_date]
+
+    def evolution(self, area, field, evolution_type, smoothing=(0, 0),
+                  growth_window=7):
+        """
+        :param area: see `cumulative_evolution_single`
+        :param field: see `cumulative_evolution_field`
+        :param evolution_type: see `evolution_country`, or "smoothedDaily"
+                               for the smoothed daily values from the second
+                               date, or "logSlope" for the slopes of
+                               `rolling_log_slope`
+        :param smoothing: see `smoothing.smooth`
+        :param growth_window: see `evolution_country`
+        :return: the evolution of the area
+        """
+        if evolution_type in ("smoothedDaily", "smoothedCurvature"):
+            parameters = tuple(smoothing)
+        elif evolution_type in ("logSlope", "growthRate", "doublingTime"):
+            parameters = growth_window
+        else:
+            parameters = None
+        key = (evolution_type, field, area, parameters)
+        evolution = self.evolutions.get(key)
+        if evolution is None:
+            with span("derivation", area):
+                evolution = self._extend(key, area, field, smoothing,
+                                         growth_window)
+                if evolution is None:
+                    evolution = self._derive(area, field, evolution_type,
+                                             smoothing, growth_window)
+                evolution = np.asarray(evolution)
+            evolution.flags.writeable = False
+            self.evolutions[key] = evolution
+        return evolution
+
+    def _extend(self, key, area, field, smoothing, growth_window):
+        """
+        :return: the evolution of `key` updated from the previous
+                 derivations, or None if it has to be derived
+        """
+        previous = self.previous.get(key)
+        if previous is None:
+            return None
+        if len(previous) == len(self.data['AllDates']):
+            return previous
+        evolution_type = key[0]
+        if evolution_type == "smoothedDaily":
+            daily = self.evolution(area, field, "daily")
+            return update_smoothed(previous, daily[1:], smoothing)
+        if evolution_type == "R0":
+            return update_evolution(
+                previous, self.evolution(area, field, "cumulative"), "R0",
+                smoothing, growth_window)
+        # the other evolutions are diffs and prefix sums of these ones
+        return None
+
+    def _derive(self, area, field, evolution_type, smoothing, growth_window):
+        def node(evolution_type):
+            return self.evolution(area, field, evolution_type, smoothing,
+                                  growth_window)
+
+        if evolution_type == "cumulative":
+            if field in time_series_files:
+                return cumulative_evolution_single(area, self.data, field)
+            return combine_fields(field, lambda name: self.evolution(
+                area, name, "cumulative"))
+
+        if evolution_type == "daily":
+            cumulative_evolution = node("cumulative")
+            evolution = np.zeros(cumulative_evolution.shape)
+            evolution[1:] = np.diff(cumulative_evolution)
+        elif evolution_type == "smoothedDaily":
+            evolution = smooth(node("daily")[1:], smoothing)
+        elif evolution_type == "curvature":
+            daily = node("daily")
+            evolution = np.zeros(daily.shape)
+            evolution[2:] = np.diff(daily[1:])
+        elif evolution_type == "smoothedCurvature":
+            evolution = np.zeros(node("daily").shape)
+            evolution[2:] = np.diff(node("smoothedDaily"))
+        elif evolution_type == "R0":
+            evolution, _, _ = reproduction_number(node("daily"))
+        elif evolution_type == "logSlope":
+            evolution = rolling_log_slope(node("daily"), growth_window)
+        elif evolution_type == "growthRate":
+            evolution = np.exp(node("logSlope")) - 1
+        elif evolution_type == "doublingTime":
+            with np.errstate(divide='ignore'):
+                evolution = np.log(2) / node("logSlope")
+        else:
+            raise ValueError(evolution_type)
+        return evolution
+
+
+def derivations(data):
+    """
+    :return: the `Derivations` of the data, created on first use for the data
+             not returned by `load_data`
+    """
+    if 'Derivations' not in data:
+        data['Derivations'] = Derivations(data)
+    return data['Derivations']
+
+
+def rolling_log_slope(evolutions, window):
+    """
+    Slopes of the log-linear fits over the trailing windows of each date,
+    from one pass of prefix sums.
+
+    :param evolutions: an evolution or an areas x dates array of them
+    :param window: the number of dates of the windows
+    :return: the slopes, NaN for the first `window - 1` dates
+    """
+    shape = np.shape(evolutions)
+    evolutions = np.reshape(evolutions, (-1, shape[-1]))
+    end = np.broadcast_to(np.arange(1, shape[-1] + 1), evolutions.shape)
+    start = np.maximum(end - window, 0)
+    slope, _ = fit_log_linear(log_linear_sums(evolutions), start, end)
+    slope[:, :window - 1] = np.nan
+    return slope.reshape(shape)
+
+
+def serial_interval_distribution(mean=serial_interval_moments[0],
+                                 std=serial_interval_moments[1],
+                                 max_days=None):
+    """
+    Discretize a gamma distributed serial interval.
+
+    :param mean: the mean of the serial interval, in days
+    :param std: its standard deviation, in days
+    :param max_days: the longest interval, mean + 4 std if None
+    :return: w, the probabilities of an interval of s days for s in
+             [0, max_days], w[0] = 0 and w.sum() = 1
+    """
+    if max_days is None:
+        max_days = int(np.ceil(mean + 4 * std))
+    shape = (mean / std) ** 2
+    scale = std ** 2 / mean
+    days = np.arange(1, max_days + 1)
+    log_density = (shape - 1) * np.log(days) - days / scale
+    weights = np.exp(log_density - log_density.max())
+    return np.concatenate([[0], weights / weights.sum()])
+
+
+def reproduction_number(daily, serial_interval=None,
+                        window=reproduction_window, prior=(1, 5),
+                        credibility=0.95):
+    """
+    Estimate the time-varying reproduction number with the renewal equation,
+    as in Cori et al. 2013: the new cases I(t) are Poisson distributed with
+    mean R * sum_s I(t - s) w(s), and R is constant over the last `window`
+    days. The infectiousness sum_s I(t - s) w(s) of all the areas is one FFT
+    convolution.
+
+    :param daily: the daily new cases of an area or an areas x dates array,
+                  negative corrections count as 0
+    :param serial_interval: see `serial_interval_distribution`, the default
+                            distribution if None
+    :param window: the number of days of the windows
+    :param prior: (shape, scale) of the gamma prior of R
+    :param credibility: the probability of the credible interval
+    :return: (mean, lower, upper) of the posterior of R, NaN for the first
+             `window - 1` dates and when there was no infectious case
+    """
+    from scipy.signal import fftconvolve
+    from scipy.stats import gamma
+
+    if serial_interval is None:
+        serial_interval = serial_interval_distribution()
+    incidence = np.maximum(daily, 0)
+    n = np.shape(incidence)[-1]
+    infectiousness = fftconvolve(
+        incidence, np.reshape(serial_interval, (1,) * (incidence.ndim - 1)
+                              + (-1,)), axes=-1)[..., :n]
+    infectiousness = np.maximum(infectiousness, 0)
+
+    def window_sums(values):
+        sums = np.cumsum(values, axis=-1)
+        sums[..., window:] -= sums[..., :-window].copy()
+        return sums
+
+    prior_shape, prior_scale = prior
+    shape = prior_shape + window_sums(incidence)
+    with np.errstate(divide='ignore'):
+        scale = 1 / (1 / prior_scale + window_sums(infectiousness))
+    undefined = np.zeros(np.shape(incidence), dtype=bool)
+    undefined[..., :window - 1] = True
+    undefined |= window_sums(infectiousness) < 1e-9
+
+    mean = shape * scale
+    lower = gamma.ppf((1 - credibility) / 2, shape, scale=scale)
+    upper = gamma.ppf((1 + credibility) / 2, shape, scale=scale)
+    for estimate in (mean, lower, upper):
+        estimate[undefined] = np.nan
+    return mean, lower, upper
+
+
+def update_evolution(evolution, cumulative_evolution, evolution_type,
+                     smoothing, growth_window=7):
+    """
+    Extend an evolution computed by `evolution_of` after dates were appended
+    to the cumulative evolution. Only the trailing samples that depend on the
+    new dates are computed again: the last two diffs, the last window of
+    the Savitzky-Golay filter for "smoothedCurvature", and the last rolling
+    windows for "growthRate", "doublingTime" and "R0".
+
+    :param evolution: the evolution before the new dates, unfiltered
+    :param cumulative_evolution: the cumulative evolution with the new dates
+    :param evolution_type: see `evolution_country`
+    :param smoothing: see `smoothing.smooth`
+    :param growth_window: see `evolution_country`
+    :return: the evolution for all the dates
+    """
+    n_old = np.shape(evolution)[-1]
+    if evolution_type == "daily":
+        first_changed = n_old
+        first_needed = n_old - 1
+    elif evolution_type == "curvature":
+        first_changed = n_old
+        first_needed = n_old - 2
+    elif (evolution_type == "smoothedCurvature"
+          and reach(smoothing) is not None):
+        # the smoothing of a date depends on the next half window
+        half_window = reach(smoothing)
+        first_changed = n_old - 1 - half_window
+        first_needed = first_changed - 2 - half_window
+    elif evolution_type in ("growthRate", "doublingTime"):
+        first_changed = n_old
+        first_needed = n_old - growth_window
+    elif evolution_type == "R0":
+        # the window of the first changed date, and the serial interval of
+        # its first day
+        first_changed = n_old
+        first_needed = (n_old - reproduction_window
+                        - len(serial_interval_distribution()) + 1)
+    else:
+        # "cumulative" is not derived, an "ewma" smoothing depends on all
+        # the previous dates: the smoothed daily values are needed to extend
+        # it, see `smoothing.update_smoothed` and `Derivations`
+        first_changed = first_needed = 0
+
+    if first_needed <= 0:
+        return evolution_of(cumulative_evolution, evolution_type, smoothing,
+                            growth_window)
+
+    tail = evolution_of(cumulative_evolution[..., first_needed:],
+                        evolution_type, smoothing, growth_window)
+    return np.concatenate([evolution[..., :first_changed],
+                           tail[..., first_changed - first_needed:]],
+                          axis=-1)
+
+
+def log_linear_sums(evolutions):
+    """
+    Prefix sums for the least-squares fits of log(y) = intercept + slope * t,
+    t being the index of the date. Non-positive values are masked.
+
+    :param evolutions: an areas x dates array
+    :return: a 5 x areas x (dates + 1) array: the number of points and the
+             sums of t, log(y), t^2 and t*log(y) over the dates [0, i)
+    """
+    evolutions = np.asarray(evolutions, dtype=float)
+    positive = evolutions > 0
+    t = np.broadcast_to(np.arange(evolutions.shape[-1]), evolutions.shape)
+    log_y = np.log(np.where(positive, evolutions, 1.0))
+    terms = np.stack([positive, t * positive, log_y, t * t * positive,
+                      t * log_y])
+    sums = np.zeros(terms.shape[:-1] + (terms.shape[-1] + 1,))
+    np.cumsum(terms, axis=-1, out=sums[..., 1:])
+    return sums
+
+
+def fit_log_linear(sums, start, end):
+    """
+    Closed-form least-squares fits of log(y) = intercept + slope * t over the
+    windows of dates [start, end), on the positive values only.
+
+    :param sums: see `log_linear_sums`
+    :param start: the first date of the windows, an int or an array of
+                  areas x windows (or areas) indices
+    :param end: the date after the windows, like `start`
+    :return: (slope, intercept), shaped like the windows. NaN where a window
+             has less than two positive values.
+    """
+    start, end = np.broadcast_arrays(start, end)
+    if start.ndim == 0:
+        start, end = (np.full(sums.shape[1], index) for index in (start, end))
+    rows = np.arange(sums.shape[1]).reshape((-1,) + (1,) * (start.ndim - 1))
+    n, s_t, s_y, s_tt, s_ty = sums[:, rows, end] - sums[:, rows, start]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = n * s_tt - s_t * s_t
+        slope = (n * s_ty - s_t * s_y) / denominator
+        intercept = (s_y - slope * s_t) / n
+    slope[n < 2] = np.nan
+    intercept[n < 2] = np.nan
+    return slope, intercept
+
+
+def exponential_trend(dates, evolutions, fit_window, extrapolation_window):
+    """
+    Fit an exponential on the fit window and extrapolate it, for all the
+    areas at once. An area without positive value in its window is fitted
+    on its negative values, giving a negative exponential.
+
+    :param dates: the consecutive dates of the evolutions
+    :param evolutions: an areas x dates array, or the evolution of one area
+    :param fit_window: (first date, last date) of the fits, each bound is a
+                       date or an array of dates, one per area
+    :param extrapolation_window: (first date, last date) of the
+                                 extrapolations, like `fit_window`. All the
+                                 extrapolations have the same length.
+    :return: (labels, values, rates): the M/D/YY dates and the values of the
+             extrapolations, and the daily growth rates
+    """
+    evolutions = np.ma.getdata(evolutions)
+    one_area = np.ndim(evolutions) == 1
+    evolutions = np.atleast_2d(evolutions)
+    first_date = np.datetime64(dates[0], 'D')
+
+    def index(date):
+        return (np.asarray(date, dtype='datetime64[D]')
+                - first_date).astype(int)
+
+    n_dates = evolutions.shape[-1]
+    start = np.clip(index(fit_window[0]), 0, n_dates)
+    end = np.clip(index(fit_window[1]) + 1, 0, n_dates)
+    slope, intercept = fit_log_linear(log_linear_sums(evolutions), start, end)
+    negative, negative_intercept = fit_log_linear(
+        log_linear_sums(-evolutions), start, end)
+    sign = np.where(np.isnan(slope), -1.0, 1.0)
+    slope = np.where(np.isnan(slope), negative, slope)
+    intercept = np.where(np.isnan(intercept), negative_intercept, intercept)
+
+    first = np.broadcast_to(index(extrapolation_window[0]),
+                            slope.shape)[..., None]
+    length = int(np.max(index(extrapolation_window[1])
+                        - index(extrapolation_window[0]))) + 1
+    t = first + np.arange(length)
+    values = sign[..., None] * np.exp(intercept[..., None]
+                                      + slope[..., None] * t)
+    labels = dates_out(first_date + t)
+    rates = np.exp(slope) - 1
+
+    if one_area:
+        return labels[0], values[0], rates[0]
+    return labels, values, rates
+
+
+def format_rate(rate):
+    """
+    >>> format_rate(0.1234)
+    '+12.3%'
+    >>> format_rate(-0.05)
+    '-5.0%'
+    """
+    if rate > 0:
+        return '+%.1f%%' % (rate * 100)
+    return '%.1f%%' % (rate * 100)
+
+
+def curvature_statistics(evolutions, smoothed, threshold=100):
+    """
+    The mean gradient and curvature of the smoothed evolutions, on the dates
+    where the evolution is above `threshold`, for all the areas at once.
+
+    :param evolutions: an areas x dates array
+    :param smoothed: the smoothed `evolutions`
+    :param threshold: the value above which the dates are used
+    :return: (periods, gradients, curvatures): the number of dates used, and
+             the means of the first and second differences of `smoothed` on
+             these dates, NaN for the areas with less than 3 dates
+    """
+    check = np.ma.getdata(evolutions) > threshold
+    smoothed = np.ma.getdata(smoothed)
+    periods = check.sum(axis=1)
+    rank = np.cumsum(check, axis=1)
+
+    def value(k):
+        # the smoothed value on the k-th date used, per area
+        column = np.argmax(check & (rank == k[:, None]), axis=1)
+        return np.take_along_axis(smoothed, column[:, None], axis=1)[:, 0]
+
+    # the means of the differences telescope
+    ones = np.ones_like(periods)
+    first, second = value(ones), value(2 * ones)
+    before_last, last = value(periods - 1), value(periods)
+    found = periods > 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gradients = np.where(found, (last - first) / (periods - 1), np.nan)
+        curvatures = np.where(
+            found, (last - before_last - second + first) / (periods - 2),
+            np.nan)
+    return periods, gradients, curvatures
 
 
 def dateOut(date):
     return date.strftime('%m/%d/%y').lstrip("0").replace("/0", "/")
 
 
+def dates_out(dates):
+    """
+    Vectorized `dateOut`.
+
+    >>> dates_out(np.array(['2020-03-07', '2021-12-25'],
+    ...                    dtype='datetime64[D]')).tolist()
+    ['3/7/20', '12/25/21']
+
+    :param dates: an array of datetime64[D]
+    :return: an array of M/D/YY strings
+    """
+    months = dates.astype('datetime64[M]')
+    month = months.astype(int) % 12 + 1
+    day = (dates - months).astype(int) + 1
+    year = (dates.astype('datetime64[Y]').astype(int) + 1970) % 100
+    strings = np.char.add(month.astype(str), "/")
+    strings = np.char.add(strings, day.astype(str))
+    strings = np.char.add(strings, "/")
+    return np.char.add(strings, np.char.zfill(year.astype(str), 2))
+
+
 def dateIn(str_date):
     """
     >>> dateIn("3/7/20")
@@ -215,6 +1282,10 @@ def txt_evol(evolutionType):
         txtEvol = 'Derivative of smoothed daily'
     elif evolutionType == 'R0':
         txtEvol = 'R0 from'
+    elif evolutionType == 'growthRate':
+        txtEvol = 'Growth rate of daily'
+    elif evolutionType == 'doublingTime':
+        txtEvol = 'Doubling time of daily'
     return txtEvol
 
 
@@ -302,16 +1373,3 @@ def extract_confinement(quar_dates_by_type_by_country,
     return {c: first_confinement(q_by_t)
             for c, q_by_t in quar_dates_by_type_by_country.items()}
 
-
-# temporary data
-quar_date_by_area = {"World": '3/22/21', "EU": '3/22/21', "China": '1/22/22',
-                     "US": '3/22/20', "European continent": '3/22/21',
-                     "Italy": '3/9/20', "Spain": '3/14/20',
-                     "Germany": '3/19/20', "France": '3/17/20',
-                     "Iran": '8/17/20', "Korea, South": '5/22/20',
-                     "Japan": '5/22/20', "Switzerland": '5/22/20',
-                     "United Kingdom": '3/22/20', "Denmark": '3/13/20',
-                     "Norway": '3/12/20', "Sweden": '3/28/20',
-                     "Finland": '3/19/20', "Canada": '5/22/20',
-                     "Belgium": '3/18/20', "Ireland": '3/28/20',
-                     }
@@ -0,0 +1,251 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from instrumentation import instrumented
+
+
+def urllib_fetch(url, headers, timeout=30):
+    """
+    Fetch `url` with the standard library.
+
+    :param url: the URL to get
+    :param headers: a mapping of request headers
+    :param timeout: the timeout in seconds
+    :return: (status, response headers, body). A 304 has an empty body.
+    """
+    import urllib.error
+    import urllib.request
+
+    request = urllib.request.Request(url, headers=dict(headers))
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, dict(e.headers), b""
+        raise
+
+
+class HttpSession:
+    """
+    HTTP(S) connections kept alive and shared by threads, with gzip
+    compression, retries and a time budget per request. The connections are
+    closed by `close`, or on leaving a `with` block.
+    """
+
+    def __init__(self, timeout=30, retries=3, backoff=0.5, budget=120):
+        """
+        :param timeout: the timeout of a connection or read, in seconds
+        :param retries: the number of attempts after a failure or a 5xx
+        :param backoff: the pause before the first retry, doubled at each
+                        retry, in seconds
+        :param budget: the maximum time of a request with its retries, in
+                       seconds
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = budget
+        # (scheme, host:port) -> idle connections
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def fetch(self, url, headers):
+        """
+        :param url: the URL to get
+        :param headers: a mapping of request headers
+        :return: (status, response headers, body), the body is decompressed.
+                 A 304 has an empty body.
+        """
+        import http.client
+
+        deadline = time.monotonic() + self.budget
+        split = urlsplit(url)
+        target = split.path + ("?" + split.query if split.query else "")
+        headers = dict(headers, **{'Accept-Encoding': "gzip"})
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Time budget exceeded for " + url)
+            connection = self._connection(split.scheme, split.netloc)
+            connection.timeout = min(self.timeout, remaining)
+            try:
+                if connection.sock is not None:
+                    connection.sock.settimeout(connection.timeout)
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if attempt == self.retries:
+                    raise OSError("Failed to get {}: {}".format(url, e))
+            else:
+                if not response.will_close:
+                    self._release(split.scheme, split.netloc, connection)
+                else:
+                    connection.close()
+                if response.status < 500 or attempt == self.retries:
+                    if response.getheader('Content-Encoding') == "gzip":
+                        body = gzip.decompress(body)
+                    return response.status, dict(response.getheaders()), body
+            time.sleep(min(self.backoff * 2 ** attempt,
+                           max(deadline - time.monotonic(), 0)))
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connection(self, scheme, netloc):
+        import http.client
+
+        with self.lock:
+            connections = self.idle.get((scheme, netloc))
+            if connections:
+                return connections.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _release(self, scheme, netloc, connection):
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(connection)
+
+
+def fetch_all(urls, fetch):
+    """
+    Get URLs concurrently.
+
+    :param urls: the URLs to get
+    :param fetch: a function `url -> result`
+    :return: the list of the results, in the order of `urls`
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max(len(urls), 1)) as executor:
+        return list(executor.map(fetch, urls))
+
+
+class CsvCache:
+    """
+    A local copy of remote CSV files.
+
+    A cached file is revalidated with its ETag/Last-Modified on each access
+    and served from disk if the server answers 304. When the server can't be
+    reached, the cached file is served if it is younger than `ttl` seconds.
+    The connections of its own `HttpSession` are closed by `close`, or on
+    leaving a `with` block.
+    """
+
+    def __init__(self, directory, fetcher=None, ttl=24 * 3600):
+        """
+        :param directory: where to store the files
+        :param fetcher: a function `(url, headers) -> (status, headers, body)`,
+                        the `fetch` of a new `HttpSession` if None
+        :param ttl: the maximum age of a file served without the network,
+                    in seconds
+        """
+        self.directory = Path(directory)
+        self.session = HttpSession() if fetcher is None else None
+        self.fetcher = self.session.fetch if fetcher is None else fetcher
+        self.ttl = ttl
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_all(self, urls):
+        """
+        :param urls: the URLs of files
+        :return: the paths of up to date local copies, the files are
+                 revalidated concurrently
+        """
+        return fetch_all(urls, self.get)
+
+    @instrumented("download")
+    def get(self, url):
+        """
+        :param url: the URL of a file
+        :return: the path of an up to date local copy
+        """
+        path, meta_path = self._paths(url)
+        meta = {}
+        if path.exists():
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                # missing, or written by another process, as a cache miss
+                meta = {}
+
+        headers = {}
+        if 'etag' in meta:
+            headers['If-None-Match'] = meta['etag']
+        if 'last_modified' in meta:
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            status, response_headers, body = self.fetcher(url, headers)
+        except OSError:
+            if meta and time.time() - meta['fetched_at'] < self.ttl:
+                return path
+            raise
+
+        if status == 304 and meta:
+            meta['fetched_at'] = time.time()
+        elif status == 200:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._write(path, body)
+            response_headers = {k.lower(): v
+                                for k, v in response_headers.items()}
+            meta = {'url': url, 'fetched_at': time.time()}
+            if 'etag' in response_headers:
+                meta['etag'] = response_headers['etag']
+            if 'last-modified' in response_headers:
+                meta['last_modified'] = response_headers['last-modified']
+        else:
+            raise OSError("Unexpected status {} for {}".format(status, url))
+
+        self._write(meta_path, json.dumps(meta).encode())
+        return path
+
+    def _write(self, path, content):
+        """
+        Write a file under a unique temporary name then rename it, hence the
+        processes sharing the cache never read or replace a partial file.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix=path.name + ".",
+                                        suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _paths(self, url):
+        digest = hashlib.sha1(url.encode()).hexdigest()[:16]
+        name = "{}_{}".format(digest, url.rsplit("/", 1)[-1])
+        path = self.directory / name
+        return path, path.with_name(name + ".json")
@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# bump when the layout of the snapshot changes
+version = 5
+
+# the age in seconds above which an unused generation of arrays is removed,
+# much longer than the writing of a snapshot
+stale_seconds = 3600
+
+
+def source_signature(paths):
+    """
+    :param paths: the local files a snapshot is compiled from
+    :return: a JSON-able fingerprint that changes when one of the files does
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append([str(path), stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+def save(directory, signature, arrays, meta):
+    """
+    Write a snapshot: the `.npy` arrays in a new generation subdirectory,
+    then a `meta.json` file naming it.
+
+    Every file is written under a unique name and `meta.json` is switched
+    last, hence concurrent writers do not clobber each other and a reader
+    sees either the old or the new snapshot, never a mix of both. The
+    generation replaced by this one is kept for the readers that have just
+    read the old `meta.json`, the older ones are removed.
+
+    :param directory: the directory of the snapshot
+    :param signature: see `source_signature`
+    :param arrays: a mapping name -> numpy array
+    :param meta: a JSON-able mapping
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    meta_path = directory / "meta.json"
+    generation = Path(tempfile.mkdtemp(prefix="arrays-", dir=directory))
+    for name, array in arrays.items():
+        np.save(generation / (name + ".npy"), np.ascontiguousarray(array))
+
+    replaced = _generation(meta_path)
+    fd, tmp_path = tempfile.mkstemp(prefix="meta-", suffix=".tmp",
+                                    dir=directory)
+    with os.fdopen(fd, "w") as f:
+        json.dump({'version': version, 'signature': signature,
+                   'generation': generation.name, 'arrays': sorted(arrays),
+                   'meta': meta}, f)
+    os.replace(tmp_path, meta_path)
+    _remove_stale(directory, {generation.name, replaced})
+
+
+def _generation(meta_path):
+    try:
+        return json.loads(meta_path.read_text()).get('generation')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _remove_stale(directory, kept):
+    """
+    Remove the generations other than `kept` that are older than
+    `stale_seconds`, younger ones may be still written by another process,
+    and the arrays of the snapshots of version < 5.
+    """
+    now = time.time()
+    for path in directory.iterdir():
+        try:
+            if path.name.startswith("arrays-") and path.is_dir():
+                if (path.name not in kept
+                        and now - path.stat().st_mtime > stale_seconds):
+                    shutil.rmtree(path, ignore_errors=True)
+            elif path.suffix == ".npy":
+                path.unlink()
+        except OSError:
+            pass
+
+
+def load(directory, signature=None):
+    """
+    :param directory: the directory of the snapshot
+    :param signature: see `source_signature`, or None to accept a snapshot
+                      compiled from any sources
+    :return: (arrays, meta), the arrays are read-only memory maps, or None if
+             the snapshot is missing or was compiled from other sources.
+    """
+    directory = Path(directory)
+    try:
+        header = json.loads((directory / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+    if (header.get('version') != version
+            or signature is not None and header.get('signature') != signature):
+        return None
+
+    try:
+        generation = directory / header['generation']
+        arrays = {name: np.load(generation / (name + ".npy"), mmap_mode='r')
+                  for name in header['arrays']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return arrays, header['meta']
@@ -0,0 +1,173 @@
+# Export the numbers behind the figures, without matplotlib: the evolutions
+# of the areas and their summary statistics, as Parquet or Arrow files, or as
+# CSV files when pyarrow is not installed.
+#
+# usage: python export.py [folder] [.parquet|.arrow|.csv]
+#
+# For each field and evolution type, two tables are written in the folder:
+#
+#     Confirmed_daily.parquet: a Date column, then one column per area
+#         (countries, regions and World) with its smoothed evolution, as
+#         plotted by plot_versus_time.py
+#     Confirmed_daily_summary.parquet: one row per area with
+#         Last: the last value of the smoothed evolution,
+#         Rate: the daily growth rate of the exponential trend fitted on the
+#               last days, as annotated by plot_versus_time.py,
+#         Period, Gradient, Curvature: the number of dates where the
+#               evolution is above 100, and the mean gradient and curvature
+#               of the smoothed evolution on these dates, as plotted by
+#               scatter_all_countries_curvature.py (NaN below 3 dates)
+#
+# The Parquet and Arrow columns share the memory of the NumPy arrays.
+
+import datetime as dt
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from covid_utils import (curvature_statistics, evolution_all,
+                         exponential_trend, load_data)
+from data_cache import CsvCache
+from instrumentation import instrumented
+from smoothing import smooth
+
+data_path = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
+
+cache_path = "../CACHE"
+
+export_formats = (".parquet", ".arrow", ".csv")
+
+
+@instrumented("export")
+def export_metrics(data, path, fields=("Confirmed", "Deaths"),
+                   evolution_types=("cumulative", "daily"), smoothing=(7, 3),
+                   fitting_period=8, export_format=".parquet"):
+    """
+    Write the evolutions and the summary of each field and evolution type.
+
+    :param data: the data from J. Hopkins University
+    :param path: the folder of the files, created if needed
+    :param fields: see `covid_utils.evolution_country`
+    :param evolution_types: see `covid_utils.evolution_country`
+    :param smoothing: see `smoothing.smooth`
+    :param fitting_period: the number of days of the fits of the trends
+    :param export_format: one of `export_formats`, the files are written as
+                          CSV if pyarrow is missing
+    :return: the names of the written files
+    """
+    if export_format not in export_formats:
+        raise ValueError(export_format)
+    if export_format != ".csv" and not _has_pyarrow():
+        print("pyarrow not found, writing CSV files in", path,
+              file=sys.stderr)
+        export_format = ".csv"
+    Path(path).mkdir(parents=True, exist_ok=True)
+
+    file_names = []
+    for field in fields:
+        for evolution_type in evolution_types:
+            areas, evolutions = area_evolutions(data, field, evolution_type,
+                                                smoothing)
+            smoothed = np.ascontiguousarray(smooth(evolutions, smoothing),
+                                            dtype=float)
+            stem = Path(path, "{}_{}".format(field, evolution_type))
+            file_names.append(write_table(
+                evolution_columns(data, areas, smoothed), stem,
+                export_format))
+            file_names.append(write_table(
+                summary_columns(data, areas, evolutions, smoothed,
+                                fitting_period),
+                stem.with_name(stem.name + "_summary"), export_format))
+    return file_names
+
+
+def area_evolutions(data, field, evolution_type, smoothing):
+    """
+    :return: (areas, evolutions): the countries, the regions and "World",
+             and their areas x dates evolutions before the smoothing of the
+             figures, see `covid_utils.evolution_all`
+    """
+    aggregates = [*data['RegionIndex'], "World"]
+    evolutions = np.concatenate([
+        evolution_all(data, field, evolution_type, smoothing),
+        evolution_all(data, field, evolution_type, smoothing,
+                      areas=aggregates)])
+    return np.array([*data['CountryIndex'], *aggregates]), evolutions
+
+
+def evolution_columns(data, areas, smoothed):
+    """
+    :return: {'Date': dates, area: evolution...}, the evolutions are views
+             of the rows of `smoothed`
+    """
+    columns = {'Date': np.array(data['Dates'], dtype='datetime64[D]')}
+    columns.update(zip(areas.tolist(), smoothed))
+    return columns
+
+
+def summary_columns(data, areas, evolutions, smoothed, fitting_period):
+    """
+    :return: {'Area': areas, 'Last': ..., 'Rate': ..., 'Period': ...,
+             'Gradient': ..., 'Curvature': ...}, see the head of the file
+    """
+    last_date = data['Dates'][-1]
+    _, _, rates = exponential_trend(
+        data['Dates'], smoothed,
+        (last_date - dt.timedelta(days=fitting_period + 1), last_date),
+        (last_date, last_date))
+    periods, gradients, curvatures = curvature_statistics(evolutions,
+                                                          smoothed)
+    return {'Area': areas, 'Last': smoothed[:, -1], 'Rate': rates,
+            'Period': periods, 'Gradient': gradients,
+            'Curvature': curvatures}
+
+
+def write_table(columns, stem, export_format):
+    """
+    :param columns: {name: 1D array}, of the same length
+    :param stem: the file name without extension
+    :param export_format: one of `export_formats`
+    :return: the name of the written file
+    """
+    name = str(Path(stem).with_suffix(export_format))
+    if export_format == ".csv":
+        import pandas as pd
+
+        pd.DataFrame(columns).to_csv(name, index=False)
+        return name
+
+    import pyarrow as pa
+
+    # the numeric arrays are wrapped, not copied
+    table = pa.table({key: pa.array(values)
+                      for key, values in columns.items()})
+    if export_format == ".parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, name)
+    else:
+        with pa.OSFile(name, "wb") as sink, \
+                pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return name
+
+
+def _has_pyarrow():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def main(path="../EXPORT", export_format=".parquet"):
+    with CsvCache(cache_path) as cache:
+        data = load_data(data_path, start_date=dt.date(2020, 3, 1),
+                         cache=cache, snapshot=Path(cache_path, "snapshot"),
+                         smoothings=[(7, 3)])
+    for name in export_metrics(data, path, fields=("Confirmed", "Deaths",
+                                                   "Active"),
+                               export_format=export_format):
+        print(name)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,189 @@
+"""
+Opt-in timing and memory spans of the hot paths.
+
+Set the environment variable COVID_INSTRUMENTATION to the path of a JSON
+report to record, for each named span and for each area, the number of
+calls, the wall and CPU times and the peak of the memory allocated by Python
+(tracemalloc). The report is written at exit, with a `.folded` file of the
+stacks of spans for flamegraph.pl or speedscope. Otherwise the spans do
+nothing.
+
+    with span("plot_country", area="France"):
+        ...
+
+    @instrumented("smoothing")
+    def smooth(...):
+        ...
+
+Only the spans of the main process are reported, not the ones of the
+workers of `render.render_all`.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from pathlib import Path
+
+environment_variable = "COVID_INSTRUMENTATION"
+
+# the recorder of the spans, None when the instrumentation is off
+_recorder = None
+
+_disabled = nullcontext()
+
+
+def span(name, area=None):
+    """
+    :param name: the name of the stage
+    :param area: the area the stage works on, or None for the area of the
+                 enclosing span
+    :return: a context manager recording the stage
+    """
+    if _recorder is None:
+        return _disabled
+    return _Span(_recorder, name, area)
+
+
+def instrumented(name):
+    """
+    :return: a decorator recording the calls of a function in a span
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start(path):
+    """
+    Record the spans from now on and write the report to `path` at exit.
+    """
+    global _recorder
+    _recorder = Recorder()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    atexit.register(_recorder.write, path)
+
+
+def stop():
+    """
+    Stop recording.
+
+    :return: the report of the spans recorded so far, see `Recorder.report`
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return None
+    atexit.unregister(recorder.write)
+    tracemalloc.stop()
+    return recorder.report()
+
+
+class Recorder:
+    def __init__(self):
+        # the open spans of each thread:
+        # [name, area, wall, cpu, memory, peak, children wall]
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # name -> statistics, (name, area) -> statistics
+        self.spans = {}
+        self.areas = {}
+        # "outer;inner" -> wall time outside of the inner spans
+        self.folded = {}
+
+    @property
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def enter(self, name, area):
+        stack = self.stack
+        if area is None and stack:
+            area = stack[-1][1]
+        memory, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][5] = max(stack[-1][5], peak)
+        tracemalloc.reset_peak()
+        stack.append([name, area, time.perf_counter(), time.process_time(),
+                      memory, memory, 0.0])
+
+    def exit(self):
+        stack = self.stack
+        name, area, wall, cpu, memory, peak, children = stack[-1]
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        folded = ";".join(frame[0] for frame in stack)
+        stack.pop()
+        if stack:
+            stack[-1][5] = max(stack[-1][5], peak)
+            stack[-1][6] += wall
+
+        with self.lock:
+            self._add(name, area, folded, wall - children, wall, cpu,
+                      peak - memory)
+
+    def _add(self, name, area, folded, self_wall, wall, cpu, peak):
+        self.folded[folded] = self.folded.get(folded, 0.0) + self_wall
+        statistics = [self.spans.setdefault(name, _new_statistics())]
+        if area is not None:
+            statistics.append(self.areas.setdefault((name, area),
+                                                    _new_statistics()))
+        for stats in statistics:
+            stats['calls'] += 1
+            stats['wall'] += wall
+            stats['cpu'] += cpu
+            stats['peak_memory'] = max(stats['peak_memory'], peak)
+
+    def report(self):
+        """
+        :return: {'spans': {name: statistics},
+                  'areas': {name: {area: statistics}}}, the statistics are
+                 the number of calls, the total wall and CPU times in seconds
+                 and the largest peak of memory in bytes
+        """
+        areas = {}
+        for (name, area), stats in self.areas.items():
+            areas.setdefault(name, {})[area] = stats
+        return {'pid': os.getpid(), 'spans': self.spans, 'areas': areas}
+
+    def write(self, path):
+        """
+        Write the report as JSON to `path` and the folded stacks, in
+        microseconds, next to it with the ".folded" suffix.
+        """
+        path = Path(path)
+        path.write_text(json.dumps(self.report(), indent=1))
+        path.with_suffix(".folded").write_text("".join(
+            "{} {}\n".format(stack, round(wall * 1e6))
+            for stack, wall in sorted(self.folded.items())))
+
+
+class _Span:
+    def __init__(self, recorder, name, area):
+        self.recorder = recorder
+        self.name = name
+        self.area = area
+
+    def __enter__(self):
+        self.recorder.enter(self.name, self.area)
+
+    def __exit__(self, *exc_info):
+        self.recorder.exit()
+
+
+def _new_statistics():
+    return {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_memory': 0}
+
+
+if os.environ.get(environment_variable):
+    start(os.environ[environment_variable])
@@ -2,53 +2,57 @@
 # Script to load the data related to the COVID-19 gathered by the Johns Hopkins University and to plot the phase diagram of the confirmed cases or deaths. X-axis is the gradient (=new case/day) and Y-axis is the curvature (=variation of new case/day)
 # Source of the data: https://github.com/CSSEGISandData/COVID-19
 
-from pylab import *
+import datetime as dt
 from pathlib import Path
-from covid_utils import *
+
+import numpy as np
+
+from animate import animate_figure
+from covid_utils import (confinement_start, derivations,
+                         ensure_figures_directory_exists, file_name,
+                         load_data, title_and_y_axis, unit_and_field)
+from data_cache import CsvCache
+from instrumentation import span
+from render import agg_figure, new_figure, save_and_show
+from smoothing import smooth
 
 ############### Basic use #############################
-# example: plot_phase_country("US",dataParam,displayParam,fitParam,'3/22/20',ax)
+# example: plot_phase_country("US",dataParam,ax)
 # Argument 1: name of the country, as it appears in the CSV file
 # Argument 2: data parameters, AUTOMATICALLY generated
-# Argument 3: display parameters, AUTOMATICALLY generated
-# Argument 4: fitting parameters, AUTOMATICALLY generated
-# Argument 5: date of the confinement start. If no confinement, enter a date in the future
-# Argument 6: axis (matplotlib object) where to plot the curves
+# Argument 3: axis (matplotlib object) where to plot the curves
+# The date of the confinement start is taken from confinement.dat
 
 ######################## Definition of Functions (BEGIN) ############################
-from covid_utils import file_name
 
 
-def plot_phase_country(area, data, quar_date, ax, field, smoothing, y_scale):
+def plot_phase_country(area, data, ax, field, smoothing, y_scale):
     print("########## Treating country: %18s ###########" %('{0:^18}'.format(area)))
     filter_date = data['FilterDate']
+    evolutions = derivations(data)
 
-    # Extract evolution for this country
-    curvature = evolution_country(area, data, field,
-                                  "smoothedCurvature", filter_date, smoothing)
-    gradient = evolution_country(area, data, field, "daily", filter_date,
-                                 smoothing)
+    # Extract evolution for this country, the three share the cumulative
+    # evolution of the graph
+    curvature = evolutions.series(area, field, "smoothedCurvature",
+                                  filter_date, smoothing)
+    gradient = evolutions.series(area, field, "daily", filter_date, smoothing)
 
     # Filter data for more than 100 cases
-    cumul = evolution_country(area, data, field, "cumulative",
-                              filter_date, smoothing)
+    cumul = evolutions.series(area, field, "cumulative", filter_date,
+                              smoothing)
     good_data = (cumul > 100)
 
     gradient = gradient[good_data]
     curvature = curvature[good_data]
-    dates = data['Dates'][good_data]
-    
-    # find the quarantine date 
-    quar_date = dateIn(quar_date)
-    quar_indices = dates >= quar_date
+
+    # find the quarantine date, as an index in the filtered data
+    _, iQuar = confinement_start(area, data)
+    if iQuar >= 0:
+        iQuar = np.searchsorted(np.flatnonzero(good_data), iQuar)
 
     # smooth
-    scurv = curvature
-    sgrad = gradient
-    window_length, polyorder = smoothing
-    if window_length != 0:
-        scurv = savgol_filter(curvature, window_length, polyorder)
-        sgrad = savgol_filter(gradient, window_length, polyorder)
+    scurv = smooth(curvature, smoothing)
+    sgrad = smooth(gradient, smoothing)
 
     # draw the diagram
     if y_scale == 'log':
@@ -57,10 +61,9 @@ def plot_phase_country(area, data, quar_date, ax, field, smoothing, y_scale):
     col = p[0].get_color()
     ax.scatter(sgrad[-1], scurv[-1], c=col, s=100, marker="s")
 
-    if sum(quar_indices) > 0:  # Quarantine found
+    if 0 <= iQuar < len(sgrad):  # Quarantine found
         # Plot the quarantine date
-        ax.scatter(sgrad[quar_indices][0], scurv[quar_indices][0], c=col, s=300,
-                   marker="X")
+        ax.scatter(sgrad[iQuar], scurv[iQuar], c=col, s=300, marker="X")
 
 
 def setDisplayParam(field, zone, figures_path):
@@ -87,6 +90,14 @@ def main():
     # Path to the folder containing the time series:
     data_path="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
     figures_path = "../FIGURES"
+    cache_path = "../CACHE"   # Local copy and snapshot of the time series
+    # Outputs: "preview" (low dpi PNG), "publication" (600 dpi PNG) and/or
+    # "vector" (SVG and PDF)
+    profiles = ("publication",)
+    interactive = False   # Show the figure in a window
+    # Animate the trajectories day by day: ".mp4" (PNG frames without
+    # ffmpeg), ".gif" or ".png" (frames), or None for a static figure
+    animation = None
     start_date = dt.date(2020, 1,1)   # Start date of the plot:
 
     yscale = 'linear'   # recommended for phase diagram
@@ -104,19 +115,39 @@ def main():
     # Type of zones (see in the execution section)
     zone = "countries"
     #zone = "continents"
-    main_plot(data_path, figures_path, field, start_date, smoothing, yscale,
-              zone)
+    with CsvCache(cache_path) as cache:
+        main_plot(data_path, figures_path, field, start_date, smoothing,
+                  yscale, zone, cache=cache,
+                  snapshot=Path(cache_path, "snapshot"), profiles=profiles,
+                  interactive=interactive, animation=animation)
 
 
 def main_plot(data_path, figures_path, field, start_date, smoothing, yscale,
-              zone):
+              zone, cache=None, snapshot=None,
+              profiles=('publication',), interactive=False, animation=None):
     # Initialisation
     ensure_figures_directory_exists(figures_path)
-    data = load_data(data_path, start_date=start_date)
+    data = load_data(data_path, start_date=start_date, cache=cache,
+                     snapshot=snapshot, smoothings=[smoothing])
+    if animation is not None:
+        fig = agg_figure()
+        file_name = draw_figure(fig, data, figures_path, field, smoothing,
+                                yscale, zone)
+        animate_figure(fig, file_name, animation, labels=data['DateAxis'])
+        return
+    fig = new_figure(profiles, interactive)
+    file_name = draw_figure(fig, data, figures_path, field, smoothing, yscale,
+                            zone)
+    save_and_show(fig, file_name, profiles)
+
+
+def draw_figure(fig, data, figures_path, field, smoothing, yscale, zone):
+    """
+    Draw the figure on `fig`.
+
+    :return: the name of the file to save the figure to
+    """
     displayParam = setDisplayParam(field, zone, figures_path)
-    # Set graphic objects
-    close(1)
-    fig = figure(num=1, figsize=(10, 6))
     ax = fig.add_subplot(111)
     if zone == "continents":
         areas = ["EU", "China", "US", "Africa"]
@@ -125,9 +156,8 @@ def main_plot(data_path, figures_path, field, start_date, smoothing, yscale,
     else:
         areas = ["World"]
     for area in areas:
-        quar_date = data['Confinement'].get(area, '1/1/99')
-        plot_phase_country(area, data, quar_date, ax,
-                           field, smoothing, yscale)
+        with span("plot_country", area):
+            plot_phase_country(area, data, ax, field, smoothing, yscale)
     # Add graph decorations
     ax.set_title(displayParam['title'])
     ax.set_yscale(yscale)
@@ -137,8 +167,7 @@ def main_plot(data_path, figures_path, field, start_date, smoothing, yscale,
     ax.grid(which='major', color='grey', linestyle='-', linewidth=1)
     ax.grid(which='minor', color='grey', linestyle='-', linewidth=0.5)
     fig.tight_layout()
-    savefig(displayParam['FileName'], dpi=600, bbox='tight')
-    show()
+    return displayParam['FileName']
 
 
 if __name__ == "__main__":
@@ -2,80 +2,54 @@
 # Script to load the data related to the COVID-19 gathered by the Johns Hopkins University and to plot the evolution per country, versus time. Observables are confirmed cases, deaths, active cases or death rate. The observables can be cumulative, or daily (first time derivative), or even the curvature (very noisy curve)
 # Source of the data: https://github.com/CSSEGISandData/COVID-19
 
-from pylab import *
-import matplotlib.ticker as ticker
-from covid_utils import *
+import datetime as dt
+from pathlib import Path
+
+import numpy as np
+
+from animate import animate_figure
+from covid_utils import (confinement_start, dateIn, derivations,
+                         ensure_figures_directory_exists, exponential_trend,
+                         extrapol_period_by_field, file_name, format_rate,
+                         load_data, title_and_y_axis, txt_evol,
+                         unit_and_field)
+from data_cache import CsvCache
+from instrumentation import span
+from render import (add_area_artists, agg_figure, figure_template, new_figure,
+                    save_and_show)
+from smoothing import smooth
 
 ############### Basic use #############################
-# example: plot_country("US",dataParam,displayParam,fitParam,'3/22/20',ax)
+# example: plot_country("US",dataParam,fitParam,template,0)
 # Argument 1: name of the country, as it appears in the CSV file
 # Argument 2: data parameters, AUTOMATICALLY generated
-# Argument 3: display parameters, AUTOMATICALLY generated
-# Argument 4: fitting parameters, AUTOMATICALLY generated
-# Argument 5: date of the confinement start. If no confinement, enter a date in the future
-# Argument 6: axis (matplotlib object) where to plot the curves
+# Argument 3: fitting parameters, AUTOMATICALLY generated
+# Argument 4: figure template (see render.py) holding the curves
+# Argument 5: key of the curves of the country in the template
+# The date of the confinement start is taken from confinement.dat
 
 ######################## Definition of Functions (BEGIN) ############################
-from covid_utils import extrapol_period_by_field, file_name
-
-
-def get_trend(dates,evol1,fitParam,extParam):
-    dtFitBeg = fitParam[0]
-    dtFitEnd = fitParam[1]
-    dtExtBeg = extParam[0]
-    dtExtEnd = extParam[1]
-    print("Time windows for fitting: ", dateOut(dtFitBeg), " - ", dateOut(dtFitEnd))
-    print("Time windows for extrapo: ", dateOut(dtExtBeg), " - ", dateOut(dtExtEnd))
-    bfitDate = (dates>=dtFitBeg) * (dates<=dtFitEnd)
-    fitDate = dates[bfitDate]
-    Ndfit = sum(bfitDate)
-    Ndext = (dtExtEnd - dtExtBeg).days + 1
-    Ndtot = (dtExtEnd - dtFitBeg).days + 1
-    xfit = np.arange(Ndfit)
-    xext = np.arange(Ndtot-Ndext,Ndtot)
-
-    yfit = evol1[bfitDate]
-    nz = (yfit>0)
-    if sum(nz)>0:
-        p1=polyfit(xfit[nz],log(yfit[nz]),1)
-        yext = exp(polyval(p1,xext))
-    else:
-        p1=polyfit(xfit,log(-yfit),1)
-        yext = exp(-polyval(p1,xext))
-    print(p1)
-    correl1 = yext
-
-    xcorrel1 = []
-    for i in range(Ndext):
-        xcorrel1.append(dateOut(dtExtBeg + dt.timedelta(days=i)))
-
-    rate=correl1[-1]/correl1[-2]-1
-    if rate>0: strRate='+%.1f%%' %(rate*100)
-    else:strRate='%.1f%%' %(rate*100)
-
-    return xcorrel1, correl1, strRate
 
 
-
-def plot_country(area, data, fitParam, quar_date, ax, field,
+def plot_country(area, data, fitParam, template, key, field,
                  smoothing, evolution_type, y_scale):
     print("########## Treating country: %18s ###########" %('{0:^18}'.format(area)))
     filter_date = data['FilterDate']
-    quar_date = dateIn(quar_date)
     fittingPeriod, extrapolPeriod, iExtrapol = fitParam
     date_axis = data['DateAxis']
 
     # Extract evolution for this country
-    evol1 = evolution_country(area, data, field, evolution_type,
-                              filter_date, smoothing)
+    evol1 = derivations(data).series(area, field, evolution_type,
+                                     filter_date, smoothing)
 
     # find the quarantine date 
-    iQuar = data['Dates'] >= quar_date
+    quar_date, iQuar = confinement_start(area, data)
+    nQuar = len(date_axis) - iQuar if iQuar >= 0 else 0
 
     fitParam1 = []
     extParam1 = []
     # Define the period for the trend
-    if sum(iQuar) > 3: # Quarantine found
+    if nQuar > 3: # Quarantine found
         dtFitEnd = quar_date
 
         fitParam2 = []
@@ -94,30 +68,30 @@ def plot_country(area, data, fitParam, quar_date, ax, field,
     extParam1.append(dtExtBeg)
     extParam1.append(dtExtEnd)
 
-    window_length, polyorder = smoothing
-    if window_length != 0:
-        evol1 = savgol_filter(evol1, window_length, polyorder)
+    evol1 = smooth(evol1, smoothing)
 
     if y_scale == 'log':
         evol1 = np.ma.masked_where(evol1<=0,evol1)
-    p = ax.semilogy(date_axis, evol1, ls='-', lw=4.0, label=area)
-    col = p[0].get_color()
+    template.line((key, "curve"), np.arange(len(date_axis)), evol1)
 
-    if sum(iQuar) > 0: # Quarantine found
+    if nQuar > 0: # Quarantine found
         # Plot the quarantine date
-        ax.scatter(date_axis[iQuar][0], evol1[iQuar][0], c=col, s=300, marker="X")
+        template.line((key, "confinement"), [iQuar], [evol1[iQuar]])
 
     if (iExtrapol==0): return
 
     # Get the trend
-    xextrapol, yextrapol, strRate = get_trend(data['Dates'], evol1, fitParam1, extParam1)
-    ax.semilogy(xextrapol,yextrapol,ls='--',lw=2.0,c=col)
-    ax.annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
+    plot_trend(template, key, 0, *exponential_trend(data['Dates'], evol1, fitParam1, extParam1))
+
+    if nQuar > 3: # Quarantine found
+        plot_trend(template, key, 1, *exponential_trend(data['Dates'], evol1, fitParam2, extParam2))
 
-    if sum(iQuar) > 3: # Quarantine found
-        xextrapol, yextrapol, strRate = get_trend(data['Dates'], evol1, fitParam2, extParam2)
-        ax.semilogy(xextrapol,yextrapol,ls='-',lw=2.0,c=col)
-        ax.annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
+
+def plot_trend(template, key, i, xextrapol, yextrapol, rate):
+    x = template.positions(xextrapol)
+    template.line((key, "trend", i), x, yextrapol)
+    template.annotation((key, "rate", i), format_rate(rate),
+                        (x[-1], yextrapol[-1]))
 
 
 def setDisplayParam(field, evolutionType, zone, figures_path):
@@ -141,8 +115,16 @@ def main():
     # Path to the folder containing the time series:
     data_path="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
     figures_path = "../FIGURES"
+    cache_path = "../CACHE"   # Local copy and snapshot of the time series
+    # Outputs: "preview" (low dpi PNG), "publication" (600 dpi PNG) and/or
+    # "vector" (SVG and PDF)
+    profiles = ("publication",)
+    interactive = False   # Show the figure in a window
+    # Animate the curves day by day: ".mp4" (PNG frames without ffmpeg),
+    # ".gif" or ".png" (frames), or None for a static figure
+    animation = None
     days_interval = 7   # To set Major x-axis
-    start_date = datetime.date(2020, 3, 1)   # Start date of the plot:
+    start_date = dt.date(2020, 3, 1)   # Start date of the plot:
     fitting_period = 8       # On how long do we fit the data?
 
     yscale = 'linear'
@@ -161,6 +143,8 @@ def main():
     #evolution_type = "curvature"
     #evolution_type = "smoothedCurvature"
     #evolution_type = "R0"  # (Experimental)
+    #evolution_type = "growthRate"
+    #evolution_type = "doublingTime"
 
     # Smoothing: (set window size to 0 to deactivate)
     smoothing = (7, 3)  # [window size,order of fitting polynomial]
@@ -174,31 +158,64 @@ def main():
     ################ Parameters to define manually (END) ######################
 
     # Initialisation
-    main_plot(data_path, figures_path, field, evolution_type, smoothing,
-              days_interval, fitting_period, extrapol, start_date, yscale, zone)
+    with CsvCache(cache_path) as cache:
+        main_plot(data_path, figures_path, field, evolution_type, smoothing,
+                  days_interval, fitting_period, extrapol, start_date, yscale,
+                  zone, cache=cache, snapshot=Path(cache_path, "snapshot"),
+                  profiles=profiles, interactive=interactive,
+                  animation=animation)
 
 
 def main_plot(data_path, figures_path, field, evolution_type, smoothing,
               days_interval, fitting_period, extrapol, start_date, yscale,
-              zone):
+              zone, cache=None, snapshot=None,
+              profiles=('publication',), interactive=False, animation=None):
     ensure_figures_directory_exists(figures_path)
-    data = load_data(data_path, start_date=start_date)
+    data = load_data(data_path, start_date=start_date, cache=cache,
+                     snapshot=snapshot, smoothings=[smoothing])
+    if animation is not None:
+        # the extrapolations are hidden in the animation
+        fig = agg_figure()
+        file_name = draw_figure(fig, data, figures_path, field,
+                                evolution_type, smoothing, days_interval,
+                                fitting_period, 0, yscale, zone)
+        animate_figure(fig, file_name, animation, labels=data['DateAxis'])
+        return
+    fig = new_figure(profiles, interactive)
+    file_name = draw_figure(fig, data, figures_path, field, evolution_type,
+                            smoothing, days_interval, fitting_period,
+                            extrapol, yscale, zone)
+    save_and_show(fig, file_name, profiles)
+
+
+def draw_figure(fig, data, figures_path, field, evolution_type, smoothing,
+                days_interval, fitting_period, extrapol, yscale, zone):
+    """
+    Draw the figure on `fig`, new or drawn by a previous call: the axes and
+    the curves are reused if `zone`, `yscale` and the R0 line are the same.
+
+    :return: the name of the file to save the figure to
+    """
+    import matplotlib.ticker as ticker
+
     displayParam = setDisplayParam(field, evolution_type, zone, figures_path)
     fitParam = (fitting_period, extrapol_period_by_field[field], extrapol)
-    # Set graphic objects
-    close(1)
-    fig = figure(num=1, figsize=(10, 6))
-    ax = fig.add_subplot(111)
     if zone == "continents":
         areas = ["European continent+Russia", "China", "North-America", "South-America", "Africa"]
     elif zone == "countries":
         areas = ["US", "Italy", "Spain", "Germany", "France"]
     else:
         areas = ["World"]
-    for area in areas:
-        quar_date = data['Confinement'].get(area, '1/1/99')
-        plot_country(area, data, fitParam, quar_date, ax, field, smoothing,
-                     evolution_type, yscale)
+    r0_line = evolution_type == "R0"
+    template = figure_template(
+        fig, (zone, yscale, r0_line),
+        lambda template: build_template(template, areas, yscale, r0_line),
+        data['DateAxis'])
+    ax, = template.axes
+    for key, area in enumerate(areas):
+        with span("plot_country", area):
+            plot_country(area, data, fitParam, template, key, field,
+                         smoothing, evolution_type, yscale)
 
     # Display only the first day of the month in x-axis for time span > 2 months
     timespan = (dateIn(data['DateAxis'][-1]) - dateIn(data['DateAxis'][0])).days
@@ -208,23 +225,36 @@ def main_plot(data_path, figures_path, field, evolution_type, smoothing,
             dday = int(locdate.split("/")[1])
             if dday == 1 or dday == 16:
                 pruned_axis.append(locdate)
+        ax.xaxis.set_major_locator(
+            ticker.FixedLocator(template.positions(pruned_axis)))
+    else:
+        ax.xaxis.set_major_locator(ticker.MultipleLocator(days_interval))
 
-    # Add graph decorations
-    if evolution_type == "R0":
-        ax.axhline(1)
     ax.set_title(displayParam['title'])
+    ax.set_ylabel(displayParam['YaxisLabel'])
+    template.finish()
+    return displayParam['FileName']
+
+
+def build_template(template, areas, yscale, r0_line):
+    """
+    Add the axes, the curves of `areas` and the graph decorations.
+    """
+    import matplotlib.ticker as ticker
+
+    ax = template.fig.add_subplot(111)
+    template.axes.append(ax)
     ax.set_yscale(yscale)
+    for key, area in enumerate(areas):
+        add_area_artists(template, ax, key, area)
+    if r0_line:
+        ax.axhline(1)
     ax.set_xlabel("Date")
-    ax.xaxis.set_major_locator(ticker.MultipleLocator(days_interval))
+    ax.xaxis.set_major_formatter(ticker.FuncFormatter(template.category_label))
     ax.xaxis.set_minor_locator(ticker.MultipleLocator(1))
-    if timespan  >61: ax.set_xticks(pruned_axis)
-    ax.set_ylabel(displayParam['YaxisLabel'])
     ax.legend(loc=2)
     ax.grid(which='major', color='grey', linestyle='-', linewidth=1)
     ax.grid(which='minor', color='grey', linestyle='-', linewidth=0.5)
-    fig.tight_layout()
-    savefig(displayParam['FileName'], dpi=600, bbox='tight')
-    show()
 
 
 if __name__ == "__main__":
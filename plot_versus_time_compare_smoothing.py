@@ -1,85 +1,54 @@
 # Author: Geoffroy Chaussonnet
 
-from pylab import *
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
 import datetime as dt
-from scipy.signal import savgol_filter
 from pathlib import Path
-from covid_utils import *
+
+import numpy as np
+
+from covid_utils import (confinement_start, derivations,
+                         ensure_figures_directory_exists, exponential_trend,
+                         extrapol_period_by_field, file_name, format_rate,
+                         load_data, title_and_y_axis, txt_evol,
+                         unit_and_field)
+from data_cache import CsvCache
+from instrumentation import span
+from render import (add_area_artists, figure_template, new_figure,
+                    save_and_show)
+from smoothing import smooth
 
 ############### Basic use #############################
-# example: plot_country("France",dataParam,fitParam,'3/17/20',ax)
+# example: plot_country("France",dataParam,fitParam,template,0)
 # Argument 1: string, as it appears in the CSV file
 # Argument 2: data parameters, AUTOMATICALLY generated
 # Argument 3: fitting parameters, AUTOMATICALLY generated
-# Argument 4: date of the confinement start. If no confinement, enter a date in the future
-# Argument 5: axis (matplotlib object) where to plot the curves
+# Argument 4: figure template (see render.py) holding the curves
+# Argument 5: key of the curves of the country in the template, the curves
+#             of the left and right plots are (0, key) and (1, key)
+# The date of the confinement start is taken from confinement.dat
 
 
 ######################## Definition of Functions ############################
-from covid_utils import extrapol_period_by_field, file_name
-
-
-def get_trend(dates,evol1,fitParam,extParam):
-    dtFitBeg = fitParam[0]
-    dtFitEnd = fitParam[1]
-    dtExtBeg = extParam[0]
-    dtExtEnd = extParam[1]
-    print("Time windows for fitting: ", dateOut(dtFitBeg), " - ", dateOut(dtFitEnd))
-    print("Time windows for extrapo: ", dateOut(dtExtBeg), " - ", dateOut(dtExtEnd))
-    bfitDate = (dates>=dtFitBeg) * (dates<=dtFitEnd)
-    fitDate = dates[bfitDate]
-    Ndfit = sum(bfitDate)
-    Ndext = (dtExtEnd - dtExtBeg).days + 1
-    Ndtot = (dtExtEnd - dtFitBeg).days + 1
-    xfit = np.arange(Ndfit)
-    xext = np.arange(Ndtot-Ndext,Ndtot)
-
-    yfit = evol1[bfitDate]
-    nz = (yfit>0)
-    if sum(nz)>0:
-        p1=polyfit(xfit[nz],log(yfit[nz]),1)
-        yext = exp(polyval(p1,xext))
-    else:
-        p1=polyfit(xfit,log(-yfit),1)
-        yext = exp(-polyval(p1,xext))
-    print(p1)
-    correl1 = yext
-
-    xcorrel1 = []
-    for i in range(Ndext):
-        xcorrel1.append(dateOut(dtExtBeg + dt.timedelta(days=i)))
-
-    rate=correl1[-1]/correl1[-2]-1
-    if rate>0: strRate='+%.1f%%' %(rate*100)
-    else:strRate='%.1f%%' %(rate*100)
-
-    return xcorrel1, correl1, strRate
 
 
-
-def plot_country(area, dataParam, fitParam, quar_date, ax, field,
+def plot_country(area, dataParam, fitParam, template, key, field,
                  evolution_type, smoothing, y_scale):
     print("########## Treating country: %18s ###########" %('{0:^18}'.format(area)))
     filter_date = dataParam['FilterDate']
-    quar_date = dateIn(quar_date)
     fittingPeriod, extrapolPeriod, iExtrapol = fitParam
 
     # Extract evolution for this country
-    evol1 = evolution_country(area, dataParam, field,
-                              evolution_type,
-                              filter_date, smoothing)
+    evol1 = derivations(dataParam).series(area, field, evolution_type,
+                                          filter_date, smoothing)
 
     # find the quarantine date 
     dates = dataParam['Dates']
-    iQuar = dates >= quar_date
+    quar_date, iQuar = confinement_start(area, dataParam)
+    nQuar = len(dates) - iQuar if iQuar >= 0 else 0
 
     fitParam1 = []
     extParam1 = []
     # Define the period for the trend
-    if sum(iQuar) > 3: # Quarantine found
+    if nQuar > 3: # Quarantine found
         dtFitEnd = quar_date
 
         fitParam2 = []
@@ -98,37 +67,35 @@ def plot_country(area, dataParam, fitParam, quar_date, ax, field,
     extParam1.append(dtExtBeg)
     extParam1.append(dtExtEnd)
 
-    window_length, polyorder = smoothing
-    evol1s = savgol_filter(evol1, window_length, polyorder)
+    evol1s = smooth(evol1, smoothing)
 
     if y_scale == 'log':
         evol1 = np.ma.masked_where(evol1<=0,evol1)
         evol1s = np.ma.masked_where(evol1s<=0,evol1s)
-    date_axis = dataParam['DateAxis']
-    p = ax[0].semilogy(date_axis, evol1s, ls='-', lw=4.0, label=area)
-    col = p[0].get_color()
-    ax[1].semilogy(date_axis, evol1, ls='-', lw=4.0, label=area)
+    x = np.arange(len(dataParam['DateAxis']))
+    template.line(((0, key), "curve"), x, evol1s)
+    template.line(((1, key), "curve"), x, evol1)
 
-    if sum(iQuar) > 0: # Quarantine found
+    if nQuar > 0: # Quarantine found
         # Plot the quarantine date
-        ax[0].scatter(date_axis[iQuar][0], evol1[iQuar][0], c=col, s=300, marker="X")
-        ax[1].scatter(date_axis[iQuar][0], evol1[iQuar][0], c=col, s=300, marker="X")
+        for side in (0, 1):
+            template.line(((side, key), "confinement"), [iQuar], [evol1[iQuar]])
 
     if (iExtrapol==0): return
 
     # Get the trend
-    xextrapol, yextrapol, strRate = get_trend(dates, evol1, fitParam1, extParam1)
-    ax[0].semilogy(xextrapol,yextrapol,ls='--',lw=2.0,c=col)
-    ax[1].semilogy(xextrapol,yextrapol,ls='--',lw=2.0,c=col)
-    ax[0].annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
-    ax[1].annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
+    plot_trend(template, key, 0, *exponential_trend(dates, evol1, fitParam1, extParam1))
+
+    if nQuar > 3: # Quarantine found
+        plot_trend(template, key, 1, *exponential_trend(dates, evol1, fitParam2, extParam2))
+
 
-    if sum(iQuar) > 3: # Quarantine found
-        xextrapol, yextrapol, strRate = get_trend(dates, evol1, fitParam2, extParam2)
-        ax[0].semilogy(xextrapol,yextrapol,ls='-',lw=2.0,c=col)
-        ax[0].annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
-        ax[1].semilogy(xextrapol,yextrapol,ls='-',lw=2.0,c=col)
-        ax[1].annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
+def plot_trend(template, key, i, xextrapol, yextrapol, rate):
+    x = template.positions(xextrapol)
+    for side in (0, 1):
+        template.line(((side, key), "trend", i), x, yextrapol)
+        template.annotation(((side, key), "rate", i), format_rate(rate),
+                            (x[-1], yextrapol[-1]))
 
 
 def setDisplayParam(field, evolutionType, figures_path):
@@ -155,8 +122,13 @@ def main():
     # Path to the folder containing the time series:
     data_path="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
     figures_path = "../FIGURES"
+    cache_path = "../CACHE"   # Local copy and snapshot of the time series
+    # Outputs: "preview" (low dpi PNG), "publication" (600 dpi PNG) and/or
+    # "vector" (SVG and PDF)
+    profiles = ("publication",)
+    interactive = False   # Show the figure in a window
     days_interval = 7   # To set Major x-axis
-    start_date = datetime.date(2020, 3,1)   # Start date of the plot:
+    start_date = dt.date(2020, 3,1)   # Start date of the plot:
     fitting_period = 8       # On how long do we fit the data?
 
     #yscale = 'linear'
@@ -172,47 +144,86 @@ def main():
     #evolution_type = "curvature"
     #evolution_type = "smoothedCurvature"
     #evolution_type = "R0"
+    #evolution_type = "growthRate"
+    #evolution_type = "doublingTime"
 
     extrapol = 0
 
     smoothing = (5, 3)  # [window size,order of fitting polynomial]
 
-    main_plot(data_path, figures_path, field, evolution_type, smoothing,
-              days_interval, extrapol, fitting_period, start_date, yscale)
+    with CsvCache(cache_path) as cache:
+        main_plot(data_path, figures_path, field, evolution_type, smoothing,
+                  days_interval, extrapol, fitting_period, start_date, yscale,
+                  cache=cache, snapshot=Path(cache_path, "snapshot"),
+                  profiles=profiles, interactive=interactive)
 
 
 def main_plot(data_path, figures_path, field, evolution_type, smoothing,
-              days_interval, extrapol, fitting_period, start_date, yscale):
+              days_interval, extrapol, fitting_period, start_date, yscale,
+              cache=None, snapshot=None,
+              profiles=('publication',), interactive=False):
     # Initialisation
     ensure_figures_directory_exists(figures_path)
-    data = load_data(data_path, start_date=start_date)
+    data = load_data(data_path, start_date=start_date, cache=cache,
+                     snapshot=snapshot, smoothings=[smoothing])
+    fig = new_figure(profiles, interactive)
+    file_name = draw_figure(fig, data, figures_path, field, evolution_type,
+                            smoothing, days_interval, extrapol,
+                            fitting_period, yscale)
+    save_and_show(fig, file_name, profiles)
+
+
+def draw_figure(fig, data, figures_path, field, evolution_type, smoothing,
+                days_interval, extrapol, fitting_period, yscale):
+    """
+    Draw the figure on `fig`, new or drawn by a previous call: the axes and
+    the curves are reused if `yscale` and the R0 line are the same.
+
+    :return: the name of the file to save the figure to
+    """
+    import matplotlib.ticker as ticker
+
     displayParam = setDisplayParam(field, evolution_type, figures_path)
     fitParam = (fitting_period, extrapol_period_by_field[field], extrapol)
-    close(1)
-    fig = figure(num=1, figsize=(10, 6))
-    ax = []
-    ax.append(fig.add_subplot(121))
-    ax.append(fig.add_subplot(122))
     areas = ["US", "Italy", "Spain", "Germany", "France"]
-    for area in areas:
-        quar_date = data['Confinement'].get(area, '1/1/99')
-        plot_country(area, data, fitParam, quar_date, ax,
-                     field, evolution_type, smoothing, yscale)
-    for lax in ax:
-        if evolution_type == "R0":
-            lax.axhline(1)
+    r0_line = evolution_type == "R0"
+    template = figure_template(
+        fig, (yscale, r0_line),
+        lambda template: build_template(template, areas, yscale, r0_line),
+        data['DateAxis'])
+    for key, area in enumerate(areas):
+        with span("plot_country", area):
+            plot_country(area, data, fitParam, template, key,
+                         field, evolution_type, smoothing, yscale)
+    for lax in template.axes:
+        lax.xaxis.set_major_locator(ticker.MultipleLocator(days_interval))
         lax.set_title(displayParam['title'])
+        lax.set_ylabel(displayParam['YaxisLabel'])
+    template.finish()
+    return displayParam['FileName']
+
+
+def build_template(template, areas, yscale, r0_line):
+    """
+    Add the two axes, the curves of `areas` and the graph decorations.
+    """
+    import matplotlib.ticker as ticker
+
+    for side in (0, 1):
+        lax = template.fig.add_subplot(121 + side)
+        template.axes.append(lax)
         lax.set_yscale(yscale)
+        for key, area in enumerate(areas):
+            add_area_artists(template, lax, (side, key), area)
+        if r0_line:
+            lax.axhline(1)
         lax.set_xlabel("Date")
-        lax.xaxis.set_major_locator(ticker.MultipleLocator(days_interval))
+        lax.xaxis.set_major_formatter(
+            ticker.FuncFormatter(template.category_label))
         lax.xaxis.set_minor_locator(ticker.MultipleLocator(1))
-        lax.set_ylabel(displayParam['YaxisLabel'])
         lax.legend(loc=2)
         lax.grid(which='major', color='grey', linestyle='-', linewidth=1)
         lax.grid(which='minor', color='grey', linestyle='-', linewidth=0.5)
-    fig.tight_layout()
-    savefig(displayParam['FileName'], dpi=600, bbox='tight')
-    show()
 
 
 if __name__ == "__main__":
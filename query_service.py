@@ -0,0 +1,297 @@
+# Serve the evolutions of the areas as JSON over HTTP, from data loaded once.
+#
+# usage: python query_service.py [port]
+#
+#     GET /regions
+#         -> {"countries": [...], "regions": {"EU": ["Austria", ...], ...}}
+#     GET /series?area=France&field=Deaths&evolution_type=daily&smoothing=7,3
+#         -> {"area": "France", ..., "dates": ["3/1/20", ...],
+#             "values": [...]}
+#
+# field, evolution_type and smoothing default to "Confirmed", "cumulative" and
+# no smoothing. smoothing is "window,order" or "method,parameter", see
+# smoothing.py, it is applied to the series as in the figures. Unknown areas,
+# fields... give a 400 error, other failures a 500 error, with a JSON body
+# {"error": ...}.
+#
+# The series are computed from the graph of `covid_utils.Derivations` and the
+# responses are kept in an LRU cache bounded in bytes. The source files are
+# checked every `reload_interval` seconds, and the data is reloaded in the
+# background when they, confinement.dat or regions.dat change: the
+# evolutions of the graph are then extended to the new dates.
+
+import asyncio
+import datetime as dt
+import json
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import data_snapshot
+from covid_utils import (confinement_path, derivations, load_data,
+                         regions_path, time_series_files)
+from data_cache import CsvCache
+from smoothing import smooth
+
+data_path = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
+
+cache_path = "../CACHE"
+
+reasons = {200: "OK", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ResponseCache:
+    """
+    A least recently used cache of response bodies, bounded by the sum of
+    their sizes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.bodies = OrderedDict()
+
+    def get(self, key):
+        """
+        :return: the body of `key`, or None
+        """
+        body = self.bodies.get(key)
+        if body is not None:
+            self.bodies.move_to_end(key)
+        return body
+
+    def put(self, key, body):
+        if key in self.bodies:
+            self.size -= len(self.bodies.pop(key))
+        if len(body) > self.max_bytes:
+            return
+        self.bodies[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self.bodies.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self.bodies.clear()
+        self.size = 0
+
+
+class QueryService:
+    def __init__(self, data_path, start_date=dt.date(2020, 1, 1), cache=None,
+                 snapshot=None, cache_bytes=64 * 2 ** 20,
+                 reload_interval=600):
+        """
+        :param data_path: see `covid_utils.load_data`
+        :param start_date: the first date of the series
+        :param cache: a `data_cache.CsvCache` for remote files, or None
+        :param snapshot: see `covid_utils.load_data`
+        :param cache_bytes: the maximum size of the cached responses
+        :param reload_interval: the time between two checks of the source
+                                files, in seconds
+        """
+        self.data_path = data_path
+        self.start_date = start_date
+        self.cache = cache
+        self.snapshot = snapshot
+        self.reload_interval = reload_interval
+        self.responses = ResponseCache(cache_bytes)
+        self.signature = self.source_signature()
+        self.data = self.load()
+
+    def load(self, previous=None):
+        """
+        :param previous: the data served until now, its evolutions are
+                         extended if only dates were added
+        """
+        return load_data(self.data_path, start_date=self.start_date,
+                         cache=self.cache, snapshot=self.snapshot,
+                         previous=previous)
+
+    def source_signature(self):
+        """
+        :return: the signature of the local copies of the source files and of
+                 the confinement and region files, None if the time series
+                 are remote and not cached
+        """
+        paths = [confinement_path, regions_path]
+        for name in time_series_files.values():
+            source = self.data_path + name
+            if source.startswith(("http://", "https://")):
+                if self.cache is None:
+                    return None
+                source = self.cache.get(source)
+            paths.append(source)
+        return data_snapshot.source_signature(paths)
+
+    async def reload_if_changed(self):
+        """
+        Reload the data in a thread if the source files changed. The current
+        data is served meanwhile.
+
+        :return: True if the data was reloaded
+        """
+        loop = asyncio.get_running_loop()
+        signature = await loop.run_in_executor(None, self.source_signature)
+        if signature is None or signature == self.signature:
+            return False
+        data = await loop.run_in_executor(None, self.load, self.data)
+        self.data, self.signature = data, signature
+        self.responses.clear()
+        return True
+
+    async def reload_forever(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload_if_changed()
+            except Exception as e:
+                print("Reload failed:", e, file=sys.stderr)
+
+    def query(self, target):
+        """
+        :param target: the path and query string of a request
+        :return: (HTTP status, JSON body as bytes)
+        """
+        url = urlsplit(target)
+        params = {key: values[-1]
+                  for key, values in parse_qs(url.query).items()}
+        key = (url.path, tuple(sorted(params.items())))
+        body = self.responses.get(key)
+        if body is not None:
+            return 200, body
+
+        try:
+            if url.path == "/regions":
+                result = self.regions()
+            elif url.path == "/series":
+                result = self.series(**params)
+            else:
+                return 404, _json({'error': "Unknown path: " + url.path})
+        except (TypeError, ValueError) as e:
+            return 400, _json({'error': str(e)})
+        except Exception as e:
+            print("Query failed:", target, repr(e), file=sys.stderr)
+            return 500, _json({'error': "Internal error: {!r}".format(e)})
+
+        body = _json(result)
+        self.responses.put(key, body)
+        return 200, body
+
+    def regions(self):
+        data = self.data
+        countries = np.array(list(data['CountryIndex']))
+        membership = data['Membership']
+        return {'countries': countries.tolist(),
+                'regions': {region: countries[membership[row].indices]
+                            .tolist()
+                            for region, row in data['RegionIndex'].items()}}
+
+    def series(self, area, field="Confirmed", evolution_type="cumulative",
+               smoothing="0,0"):
+        data = self.data
+        smoothing = parse_smoothing(smoothing)
+        try:
+            values = smooth(derivations(data).series(area, field,
+                                                     evolution_type,
+                                                     data['FilterDate'],
+                                                     smoothing),
+                            smoothing)
+        except ValueError as e:
+            raise ValueError("Invalid area, field, evolution_type or "
+                             "smoothing: {}".format(e))
+        values = np.asarray(values, dtype=float)
+        return {'area': area, 'field': field,
+                'evolution_type': evolution_type,
+                'smoothing': list(smoothing),
+                'dates': data['DateAxis'].tolist(),
+                'values': [value if np.isfinite(value) else None
+                           for value in values.tolist()]}
+
+    async def handle(self, reader, writer):
+        """
+        Answer the requests of a connection, kept alive until the client
+        closes it or asks to.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                method, target, _ = request_line.decode("latin-1").split(
+                    " ", 2)
+                if method != "GET":
+                    status, body = 405, _json({'error': "Use GET"})
+                else:
+                    status, body = self.query(target)
+                close = headers.get("connection", "").lower() == "close"
+                writer.write(
+                    "HTTP/1.1 {} {}\r\n"
+                    "Content-Type: application/json\r\n"
+                    "Content-Length: {}\r\n"
+                    "Connection: {}\r\n\r\n".format(
+                        status, reasons[status], len(body),
+                        "close" if close else "keep-alive").encode()
+                    + body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        """
+        :return: the started `asyncio.Server`, the data is reloaded in the
+                 background while it serves
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        self.reloader = asyncio.ensure_future(self.reload_forever())
+        return server
+
+
+def parse_smoothing(smoothing):
+    """
+    >>> parse_smoothing("7,3"), parse_smoothing("ewma,0.3")
+    ((7, 3), ('ewma', 0.3))
+
+    :param smoothing: "window,order" or "method,parameter"
+    :return: a smoothing as expected by `smoothing.smooth`
+    """
+    def number(text):
+        return float(text) if "." in text else int(text)
+
+    first, *parameters = smoothing.split(",")
+    first = int(first) if first.strip().isdigit() else first.strip()
+    return (first, *(number(parameter) for parameter in parameters))
+
+
+def _json(result):
+    return json.dumps(result).encode()
+
+
+async def serve_forever(port):
+    with CsvCache(cache_path) as cache:
+        service = QueryService(data_path, cache=cache,
+                               snapshot=Path(cache_path, "snapshot"))
+        server = await service.serve(port=port)
+        print("Serving on port", port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve_forever(int(sys.argv[1]) if len(sys.argv) > 1
+                              else 8000))
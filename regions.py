@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def parse_regions(file):
+    """
+    Parse the regions.dat file.
+
+    :param file: a file like object, lines are:
+                 region: member; member; ...
+    :return: a mapping region -> list of members
+    """
+    members_by_region = {}
+    for row in file:
+        row = row.strip()
+        if not row or row[0] == '#':
+            continue
+
+        region, members = row.split(":", 1)
+        members_by_region.setdefault(region.strip(), []).extend(
+            member.strip() for member in members.split(";") if member.strip())
+
+    return members_by_region
+
+
+def resolve_regions(members_by_region):
+    """
+    Replace the regions nested in other regions by their countries.
+
+    >>> sorted(resolve_regions({"A": ["x", "B"], "B": ["y", "z"]})["A"])
+    ['x', 'y', 'z']
+
+    :param members_by_region: a mapping region -> list of members
+    :return: a mapping region -> set of countries
+    """
+    countries_by_region = {}
+
+    def resolve(region, path):
+        if region in path:
+            raise ValueError("Cycle in regions: {}".format(
+                " > ".join(path + (region,))))
+        if region not in countries_by_region:
+            countries = set()
+            for member in members_by_region[region]:
+                if member in members_by_region:
+                    countries |= resolve(member, path + (region,))
+                else:
+                    countries.add(member)
+            countries_by_region[region] = countries
+        return countries_by_region[region]
+
+    for region in members_by_region:
+        resolve(region, ())
+    return countries_by_region
+
+
+def membership_matrix(countries_by_region, country_index):
+    """
+    :param countries_by_region: see `resolve_regions`
+    :param country_index: a mapping country -> column
+    :return: (region_index, matrix, unknown) where `matrix` is a sparse
+             regions x countries matrix of 0/1, `region_index` maps a region
+             to its row and `unknown` maps a region to the countries that are
+             not in `country_index`.
+    """
+    from scipy import sparse
+
+    region_index = {}
+    rows = []
+    columns = []
+    unknown = {}
+    for row, (region, countries) in enumerate(countries_by_region.items()):
+        region_index[region] = row
+        for country in sorted(countries):
+            if country in country_index:
+                rows.append(row)
+                columns.append(country_index[country])
+            else:
+                unknown.setdefault(region, []).append(country)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=int), (rows, columns)),
+        shape=(len(region_index), len(country_index)))
+    return region_index, matrix, unknown
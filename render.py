@@ -0,0 +1,342 @@
+"""
+Render many figures from one load of the data, in parallel.
+
+A job is the `draw_figure` function of a script with its keyword arguments,
+for instance:
+
+    FigureJob(plot_versus_time.draw_figure,
+              dict(figures_path="../FIGURES", field="Deaths", ...))
+
+A `draw_figure` can build its figure from a `FigureTemplate`: the axes,
+decorations and lines are created once per layout, the next jobs of the same
+layout only update the data and the texts of the reused figure.
+"""
+import traceback
+import weakref
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from covid_utils import (ensure_figures_directory_exists, load_data,
+                         with_start_date)
+from instrumentation import instrumented, span
+from smoothing import reach
+
+# the figure of a job starts at `start_date`, or at the start date of the
+# data if None
+FigureJob = namedtuple('FigureJob', ['draw', 'kwargs', 'start_date'],
+                       defaults=(None,))
+
+# `file_names` is empty and `error` is the traceback if the job failed
+JobResult = namedtuple('JobResult', ['job', 'file_names', 'error'])
+
+# profile -> list of (suffix of the file name, extension, dpi)
+render_profiles = {
+    'preview': [("_preview", ".png", 72)],
+    'publication': [("", ".png", 600)],
+    'vector': [("", ".svg", None), ("", ".pdf", None)],
+}
+
+# the data of a worker process, see `_init_worker`
+_worker_data = None
+
+# figure -> its `FigureTemplate`
+_templates = weakref.WeakKeyDictionary()
+
+# draw function -> the figure of its last job, if built from a template
+_reused_figures = {}
+
+
+def render_figures(data_path, jobs, start_date, max_workers=None,
+                   profiles=('publication',), cache=None, snapshot=None):
+    """
+    Load the data once and render the jobs.
+
+    :param data_path: see `covid_utils.load_data`
+    :param jobs: a list of `FigureJob`
+    :param start_date: the start date of the jobs without one
+    :param max_workers: the number of processes, None for the number of CPUs
+    :param profiles: the keys of `render_profiles` to save the figures in
+    :return: a list of `JobResult`, in the order of the jobs
+    """
+    data = load_data(data_path, start_date=start_date, cache=cache,
+                     snapshot=snapshot, smoothings=valid_smoothings(jobs))
+    return render_all(data, jobs, max_workers=max_workers, profiles=profiles)
+
+
+def valid_smoothings(jobs):
+    """
+    :param jobs: a list of `FigureJob`
+    :return: the valid smoothings of the jobs, the jobs with an invalid one
+             fail in their own `JobResult`
+    """
+    smoothings = []
+    for job in jobs:
+        if 'smoothing' in job.kwargs:
+            try:
+                reach(job.kwargs['smoothing'])
+            except (TypeError, ValueError):
+                continue
+            smoothings.append(job.kwargs['smoothing'])
+    return smoothings
+
+
+def render_all(data, jobs, max_workers=None, profiles=('publication',)):
+    """
+    :param data: the data from J. Hopkins University
+    :param jobs: a list of `FigureJob`
+    :param max_workers: the number of processes, None for the number of CPUs
+                        and 1 to render in this process
+    :param profiles: the keys of `render_profiles` to save the figures in
+    :return: a list of `JobResult`, in the order of the jobs
+    """
+    for figures_path in {job.kwargs.get('figures_path') for job in jobs}:
+        if figures_path is not None:
+            ensure_figures_directory_exists(figures_path)
+
+    if max_workers == 1:
+        return [render_job(job, data, profiles) for job in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                             initargs=(data,)) as executor:
+        futures = [executor.submit(_render_in_worker, job, profiles)
+                   for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception:
+                # the worker died or the job could not be sent to it
+                results.append(JobResult(job, [], traceback.format_exc()))
+    return results
+
+
+@instrumented("render_job")
+def render_job(job, data, profiles=('publication',)):
+    """
+    Draw a job on an Agg figure, independent of pyplot, and save it in each
+    profile. The figure is new, or the one of the previous job of the same
+    `draw` function if it was built from a `FigureTemplate`.
+
+    :return: a `JobResult`
+    """
+    fig = _reused_figures.pop(job.draw, None) or agg_figure()
+    try:
+        if job.start_date is not None:
+            data = with_start_date(data, job.start_date)
+        with span("draw"):
+            file_name = job.draw(fig, data, **job.kwargs)
+        file_names = save_profiles(fig, file_name, profiles)
+    except Exception:
+        return JobResult(job, [], traceback.format_exc())
+    if fig in _templates:
+        _reused_figures[job.draw] = fig
+    return JobResult(job, file_names, None)
+
+
+def agg_figure():
+    """
+    :return: a figure drawn by Agg, without importing pyplot
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    return fig
+
+
+class FigureTemplate:
+    """
+    The axes, decorations and artists of a figure, built once for a layout.
+
+    Each render hides all the artists, then shows the ones it updates with
+    `line` and `annotation`. The x axes are categorical: the labels of the
+    dates are mapped to positions by `positions`.
+    """
+
+    def __init__(self, fig, layout):
+        self.fig = fig
+        self.layout = layout
+        self.axes = []
+        self.artists = {}
+        # label -> position, and the labels in the order of the positions
+        self.categories = {}
+        self.labels = []
+        self.laid_out = False
+
+    def add(self, key, artist):
+        """
+        :return: `artist`, hidden by the renders that do not use it
+        """
+        self.artists[key] = artist
+        return artist
+
+    def begin(self, categories):
+        """
+        Start a render: hide the artists.
+
+        :param categories: the labels of the first positions of the x axes
+        """
+        for artist in self.artists.values():
+            artist.set_visible(False)
+        self.labels = list(categories)
+        self.categories = {label: i for i, label in enumerate(self.labels)}
+
+    def positions(self, labels):
+        """
+        :return: the positions of `labels` on the x axes, the unknown labels
+                 are appended to the categories as matplotlib does
+        """
+        categories = self.categories
+        for label in labels:
+            if label not in categories:
+                categories[label] = len(self.labels)
+                self.labels.append(label)
+        return np.array([categories[label] for label in labels])
+
+    def category_label(self, x, pos=None):
+        """
+        A tick formatter showing the category at `x`.
+        """
+        if x != int(x) or not 0 <= x < len(self.labels):
+            return ""
+        return self.labels[int(x)]
+
+    def line(self, key, x, y):
+        """
+        :return: the line `key`, shown with the data (x, y)
+        """
+        line = self.artists[key]
+        line.set_data(x, y)
+        line.set_visible(True)
+        return line
+
+    def annotation(self, key, text, xy):
+        """
+        :return: the annotation `key`, shown with `text` at `xy`
+        """
+        annotation = self.artists[key]
+        annotation.set_text(text)
+        annotation.xy = xy
+        annotation.set_visible(True)
+        return annotation
+
+    def finish(self):
+        """
+        End a render: fit the axes to the shown lines. The subplots are laid
+        out by the first render only.
+        """
+        for ax in self.axes:
+            ax.relim(visible_only=True)
+            ax.autoscale_view()
+        if not self.laid_out:
+            self.fig.tight_layout()
+            self.laid_out = True
+
+
+def add_area_artists(template, ax, key, label):
+    """
+    Add the artists of an area to `ax`: its curve, the marker of its
+    confinement start, and two trends with their rates. Their keys are
+    (key, "curve"), (key, "confinement"), (key, "trend", i) and
+    (key, "rate", i), for i in 0, 1.
+
+    :param label: the label of the curve in the legend
+    """
+    curve, = ax.plot([], [], ls='-', lw=4.0, label=label)
+    col = curve.get_color()
+    template.add((key, "curve"), curve)
+    template.add((key, "confinement"),
+                 ax.plot([], [], ls="", marker="X", ms=17, color=col,
+                         zorder=1)[0])
+    for i, ls in enumerate(['--', '-']):
+        template.add((key, "trend", i),
+                     ax.plot([], [], ls=ls, lw=2.0, c=col)[0])
+        template.add((key, "rate", i),
+                     ax.annotate("", xy=(0, 0), xytext=(3, 3),
+                                 textcoords="offset points", ha='center',
+                                 va='bottom', color=col, weight='bold'))
+
+
+def figure_template(fig, layout, build, categories):
+    """
+    Start a render of `fig` from its template.
+
+    :param fig: a figure, new or drawn by a previous render
+    :param layout: a hashable description of what `build` creates
+    :param build: a function filling a `FigureTemplate` of an empty figure
+    :param categories: see `FigureTemplate.begin`
+    :return: the `FigureTemplate`, built again if `fig` was drawn for
+             another layout
+    """
+    template = _templates.get(fig)
+    if template is None or template.layout != layout:
+        fig.clear()
+        template = FigureTemplate(fig, layout)
+        build(template)
+        _templates[fig] = template
+    template.begin(categories)
+    return template
+
+
+@instrumented("savefig")
+def save_profiles(fig, file_name, profiles):
+    """
+    Save a figure once per format of the profiles. Only the artists are
+    built once: each `savefig` renders all of them again, twice with the
+    tight bounding box.
+
+    :param fig: the figure
+    :param file_name: the file name given by `draw_figure`
+    :param profiles: the keys of `render_profiles`
+    :return: the names of the saved files
+    """
+    stem = str(Path(file_name).with_suffix(""))
+    file_names = []
+    for profile in profiles:
+        for suffix, extension, dpi in render_profiles[profile]:
+            name = stem + suffix + extension
+            if dpi is None:
+                fig.savefig(name, bbox_inches='tight')
+            else:
+                fig.savefig(name, dpi=dpi, bbox_inches='tight')
+            file_names.append(name)
+    return file_names
+
+
+def new_figure(profiles, interactive=False):
+    """
+    :param profiles: the keys of `render_profiles`
+    :param interactive: True to show the figure in a window
+    :return: the pyplot figure 1 if `interactive`, unless a "preview" is
+             requested, else an Agg figure
+    """
+    if interactive and 'preview' not in profiles:
+        import matplotlib.pyplot as plt
+        plt.close(1)
+        return plt.figure(num=1, figsize=(10, 6))
+    return agg_figure()
+
+
+def save_and_show(fig, file_name, profiles):
+    """
+    Save a figure of `new_figure` in the profiles, then show it if it is
+    managed by pyplot.
+    """
+    save_profiles(fig, file_name, profiles)
+    if fig.canvas.manager is not None:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _render_in_worker(job, profiles):
+    return render_job(job, _worker_data, profiles)
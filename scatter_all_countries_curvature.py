@@ -1,99 +1,47 @@
 # Author: Geoffroy Chaussonnet
 
-from pylab import *
+import datetime as dt
 from pathlib import Path
-from covid_utils import *
-from covid_utils import unit_and_field, txt_evol, file_name
+
+import numpy as np
+
+from covid_utils import (confinement_start, curvature_statistics,
+                         derivations, ensure_figures_directory_exists,
+                         evolution_all, exponential_trend, file_name,
+                         format_rate, load_data, title_and_y_axis, txt_evol,
+                         unit_and_field)
+from data_cache import CsvCache
+from render import new_figure, save_and_show
+from smoothing import smooth
 
 
 ############### Basic use #############################
-# example: plot_country("France",dataParam,fitParam,'3/17/20',ax)
+# example: plot_country("France",dataParam,fitParam,ax)
 # Argument 1: string, as it appears in the CSV file
 # Argument 2: data parameters, AUTOMATICALLY generated
 # Argument 3: fitting parameters, AUTOMATICALLY generated
-# Argument 4: date of the confinement start. If no confinement, enter a date in the future
-# Argument 5: axis (matplotlib object) where to plot the curves
+# Argument 4: axis (matplotlib object) where to plot the curves
+# The date of the confinement start is taken from confinement.dat
 
 
 ######################## Definition of Functions ############################
 
-def get_trend(dates,evol1,fitParam,extParam):
-    dtFitBeg = fitParam[0]
-    dtFitEnd = fitParam[1]
-    dtExtBeg = extParam[0]
-    dtExtEnd = extParam[1]
-    print("Time windows for fitting: ", dateOut(dtFitBeg), " - ", dateOut(dtFitEnd))
-    print("Time windows for extrapo: ", dateOut(dtExtBeg), " - ", dateOut(dtExtEnd))
-    bfitDate = (dates>=dtFitBeg) * (dates<=dtFitEnd)
-    fitDate = dates[bfitDate]
-    Ndfit = (dtFitEnd - dtFitBeg).days + 1
-    Ndext = (dtExtEnd - dtExtBeg).days + 1
-    Ndtot = (dtExtEnd - dtFitBeg).days + 1
-    xfit = np.arange(Ndfit)
-    xext = np.arange(Ndtot-Ndext,Ndtot)
-
-    yfit = evol1[bfitDate]
-    nz = (yfit>0)
-    if sum(nz)>0:
-        p1=polyfit(xfit[nz],log(yfit[nz]),1)
-        yext = exp(polyval(p1,xext))
-    else:
-        p1=polyfit(xfit,log(-yfit),1)
-        yext = exp(-polyval(p1,xext))
-    print(p1)
-    correl1 = yext
-
-    xcorrel1 = []
-    for i in range(Ndext):
-        xcorrel1.append(dateOut(dtExtBeg + dt.timedelta(days=i)))
-
-    rate=correl1[-1]/correl1[-2]-1
-    if rate>0: strRate='+%.1f%%' %(rate*100)
-    else:strRate='%.1f%%' %(rate*100)
-
-    return xcorrel1, correl1, strRate
-
-
 def scatter_curvature_vs_x_world(data, ax, field, evolution_type, smoothing, xaxis_type):
     print("########## Treating country: %18s ###########" %('{0:^18}'.format("World")))
-    filter_date = data['FilterDate']
-    lstDoneCountry = []
-    matCountry = []
-    for area in data["Confirmed"]["Country/Region"]:
-        if area not in lstDoneCountry:
-            lstDoneCountry.append(area)
-            evol1 = evolution_country(area, data,
-                                      field,
-                                      evolution_type,
-                                      filter_date,
-                                      smoothing)
-            matCountry.append(evol1)
-
-    periodX = []
-    curvY = []
-    gradY = []
-    totPop = []
-    lstFoundCountry = []
-    for area, evol0 in zip(lstDoneCountry, matCountry):
-        check = (evol0 > 100)
-        window_length, polyorder = smoothing
-        evol = savgol_filter(evol0, window_length, polyorder)
-
-        locPeriod = sum(check)
-        if locPeriod > 2:
-            periodX.append(sum(check))
-            curvature = np.diff(evol[check], 2).mean()
-            gradient = np.diff(evol[check], 1).mean()
-            curvY.append(curvature)
-            gradY.append(gradient)
-            lstFoundCountry.append(area)
-            totPop.append(evol0[-1])
-            print(area, locPeriod, curvature)
-
-    periodX = np.array(periodX)
-    curvY = np.array(curvY)
-    totPop = np.array(totPop)
-    gradY = np.array(gradY)
+    areas = np.array(list(data['CountryIndex']))
+    matCountry = evolution_all(data, field, evolution_type, smoothing)
+    matSmoothed = smooth(matCountry, smoothing)
+    periods, gradients, curvatures = curvature_statistics(matCountry,
+                                                          matSmoothed)
+
+    found = periods > 2
+    periodX = periods[found]
+    curvY = curvatures[found]
+    gradY = gradients[found]
+    totPop = matCountry[found, -1]
+    lstFoundCountry = list(areas[found])
+    for area, locPeriod, curvature in zip(lstFoundCountry, periodX, curvY):
+        print(area, locPeriod, curvature)
 
     col1 = 'black'
     col2 = 'green'
@@ -116,25 +64,25 @@ def scatter_curvature_vs_x_world(data, ax, field, evolution_type, smoothing, xax
             ax.annotate(cntry, xy=(x,-y), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col2,weight='bold')
 
 
-def plot_country(strCountry, data, fitParam, quar_date, ax,
+def plot_country(strCountry, data, fitParam, ax,
                  field, evolution_type, smoothing, y_scale):
     print("########## Treating country: %18s ###########" %('{0:^18}'.format(strCountry)))
     filter_date = data['FilterDate']
-    quar_date = dateIn(quar_date)
     fittingPeriod, extrapolPeriod, iExtrapol = fitParam
     
     # Extract evolution for this country
-    evol1 = evolution_country(strCountry, data, field, evolution_type,
-                              filter_date, smoothing)
+    evol1 = derivations(data).series(strCountry, field, evolution_type,
+                                     filter_date, smoothing)
 
     # find the quarantine date 
     dates = data['Dates']
-    iQuar = dates >= quar_date
+    quar_date, iQuar = confinement_start(strCountry, data)
+    nQuar = len(dates) - iQuar if iQuar >= 0 else 0
 
     fitParam1 = []
     extParam1 = []
     # Define the period for the trend
-    if sum(iQuar) > 3: # Quarantine found
+    if nQuar > 3: # Quarantine found
         dtFitEnd = quar_date
 
         fitParam2 = []
@@ -153,9 +101,7 @@ def plot_country(strCountry, data, fitParam, quar_date, ax,
     extParam1.append(dtExtBeg)
     extParam1.append(dtExtEnd)
 
-    window_length, polyorder = smoothing
-    if window_length != 0:
-        evol1 = savgol_filter(evol1, window_length, polyorder)
+    evol1 = smooth(evol1, smoothing)
 
     if y_scale == 'log':
         evol1 = np.ma.masked_where(evol1<=0,evol1)
@@ -163,19 +109,21 @@ def plot_country(strCountry, data, fitParam, quar_date, ax,
     p = ax.semilogy(date_axis, evol1, ls='-', lw=4.0, label=strCountry)
     col = p[0].get_color()
 
-    if sum(iQuar) > 0: # Quarantine found
+    if nQuar > 0: # Quarantine found
         # Plot the quarantine date
-        ax.scatter(date_axis[iQuar][0], evol1[iQuar][0], c=col, s=300, marker="X")
+        ax.scatter(date_axis[iQuar], evol1[iQuar], c=col, s=300, marker="X")
 
     if (iExtrapol==0): return
 
     # Get the trend
-    xextrapol, yextrapol, strRate = get_trend(dates, evol1, fitParam1, extParam1)
+    xextrapol, yextrapol, rate = exponential_trend(dates, evol1, fitParam1, extParam1)
+    strRate = format_rate(rate)
     ax.semilogy(xextrapol,yextrapol,ls='--',lw=2.0,c=col)
     ax.annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
 
-    if sum(iQuar) > 3: # Quarantine found
-        xextrapol, yextrapol, strRate = get_trend(dates, evol1, fitParam2, extParam2)
+    if nQuar > 3: # Quarantine found
+        xextrapol, yextrapol, rate = exponential_trend(dates, evol1, fitParam2, extParam2)
+        strRate = format_rate(rate)
         ax.semilogy(xextrapol,yextrapol,ls='-',lw=2.0,c=col)
         ax.annotate(strRate, xy=(xextrapol[-1],yextrapol[-1]), xytext=(3, 3), textcoords="offset points", ha='center', va='bottom',color=col,weight='bold')
 
@@ -206,7 +154,12 @@ def main():
     # Path to the folder containing the time series:
     data_path="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
     figures_path = "../FIGURES"
-    start_date = datetime.date(2020, 2,22)   # Start date of the plot:
+    cache_path = "../CACHE"   # Local copy and snapshot of the time series
+    # Outputs: "preview" (low dpi PNG), "publication" (600 dpi PNG) and/or
+    # "vector" (SVG and PDF)
+    profiles = ("publication",)
+    interactive = False   # Show the figure in a window
+    start_date = dt.date(2020, 2,22)   # Start date of the plot:
 
     #yscale = 'linear'
     yscale = 'log'
@@ -226,19 +179,35 @@ def main():
     #xaxis_type = "Total confirmed cases [case]"
     ################ Parameters to define manually ######################
 
-    method_name(data_path, figures_path, field, evolution_type, smoothing,
-                xaxis_type, start_date, yscale)
+    with CsvCache(cache_path) as cache:
+        method_name(data_path, figures_path, field, evolution_type, smoothing,
+                    xaxis_type, start_date, yscale, cache=cache,
+                    snapshot=Path(cache_path, "snapshot"), profiles=profiles,
+                    interactive=interactive)
 
 
 def method_name(data_path, figures_path, field, evolution_type, smoothing,
-                xaxis_type, start_date, yscale):
+                xaxis_type, start_date, yscale, cache=None, snapshot=None,
+                profiles=('publication',), interactive=False):
     # Initialisation
     ensure_figures_directory_exists(figures_path)
-    data = load_data(data_path, start_date=start_date)
+    data = load_data(data_path, start_date=start_date, cache=cache,
+                     snapshot=snapshot, smoothings=[smoothing])
+    fig = new_figure(profiles, interactive)
+    file_name = draw_figure(fig, data, figures_path, field, evolution_type,
+                            smoothing, xaxis_type, yscale)
+    save_and_show(fig, file_name, profiles)
+
+
+def draw_figure(fig, data, figures_path, field, evolution_type, smoothing,
+                xaxis_type, yscale):
+    """
+    Draw the figure on `fig`.
+
+    :return: the name of the file to save the figure to
+    """
     displayParam = setDisplayParam(field, evolution_type, figures_path,
                                    xaxis_type)
-    close(1)
-    fig = figure(num=1, figsize=(10, 6))
     ax = fig.add_subplot(111)
     scatter_curvature_vs_x_world(data, ax, field,
                                  evolution_type,
@@ -256,8 +225,7 @@ def method_name(data_path, figures_path, field, evolution_type, smoothing,
     ax.grid(which='minor', color='grey', linestyle='-', linewidth=0.5,
             zorder=-1)
     fig.tight_layout()
-    savefig(displayParam['FileName'], dpi=600, bbox='tight')
-    show()
+    return displayParam['FileName']
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""
+Smoothing of evolutions along their last axis, for one area or an areas x
+dates array at once.
+
+A smoothing is given as (window length, polynomial order) for a
+Savitzky-Golay filter, or as (method, parameter) with method one of
+`smoothers`:
+
+    ("movingAverage", 7), ("ewma", 0.3), ("median", 7)
+
+A window length of 0 leaves the values unchanged.
+"""
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from instrumentation import instrumented
+
+
+@instrumented("smoothing")
+def smooth(values, smoothing):
+    """
+    :param values: an evolution or an areas x dates array of them
+    :param smoothing: see the head of this file
+    :return: the smoothed values
+    """
+    method, parameter = _method(smoothing)
+    if method is None:
+        return np.asarray(values)
+    return smoothers[method](values, *parameter)
+
+
+def update_smoothed(smoothed, values, smoothing):
+    """
+    Extend smoothed values after dates were appended to the values. Only the
+    trailing samples that depend on the new dates are computed again.
+
+    :param smoothed: the result of `smooth` before the new dates
+    :param values: the values with the new dates
+    :param smoothing: see the head of this file
+    :return: the smoothed values for all the dates
+    """
+    method, parameter = _method(smoothing)
+    n_old = np.shape(smoothed)[-1]
+    if method is None:
+        return np.asarray(values)
+    elif method == "ewma":
+        tail = ewma(values[..., n_old:], *parameter,
+                    initial=smoothed[..., -1])
+        return np.concatenate([smoothed, tail], axis=-1)
+
+    half_window = reach(smoothing)
+    first_changed = n_old - half_window
+    first_needed = first_changed - half_window
+    if first_needed <= 0:
+        return smooth(values, smoothing)
+    tail = smooth(values[..., first_needed:], smoothing)
+    return np.concatenate([smoothed[..., :first_changed],
+                           tail[..., first_changed - first_needed:]],
+                          axis=-1)
+
+
+def reach(smoothing):
+    """
+    :param smoothing: see the head of this file
+    :return: the number of dates before and after a date its smoothed value
+             depends on, or None if it depends on all the previous dates
+    """
+    method, parameter = _method(smoothing)
+    if method is None:
+        return 0
+    elif method == "ewma":
+        return None
+    return parameter[0] // 2
+
+
+def savgol(values, window_length, polyorder):
+    """
+    Savitzky-Golay filter, as `scipy.signal.savgol_filter` in "interp" mode:
+    the dates of the first and last half windows take the values of the
+    polynomial fitted on the first and last windows.
+
+    :param values: an evolution or an areas x dates array of them
+    :param window_length: the odd number of dates of the fits
+    :param polyorder: the order of the polynomials
+    :return: the smoothed values
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.shape[-1]
+    if n < window_length:
+        raise ValueError("window_length {} is longer than the {} values"
+                         .format(window_length, n))
+    projection = savgol_projection(window_length, polyorder)
+    half_window = window_length // 2
+
+    smoothed = np.empty(values.shape)
+    smoothed[..., half_window:n - half_window] = (
+        sliding_window_view(values, window_length, axis=-1)
+        @ projection[half_window])
+    smoothed[..., :half_window] = (values[..., :window_length]
+                                   @ projection[:half_window].T)
+    smoothed[..., n - half_window:] = (
+        values[..., n - window_length:]
+        @ projection[window_length - half_window:].T)
+    return smoothed
+
+
+@lru_cache(maxsize=None)
+def savgol_projection(window_length, polyorder):
+    """
+    :return: the window_length x window_length matrix mapping the values of a
+             window to the values of their least-squares polynomial, row i
+             gives the fitted value at the i-th date of the window
+    """
+    if window_length % 2 == 0 or polyorder >= window_length:
+        raise ValueError("window_length must be odd and > polyorder")
+    t = np.arange(window_length) - window_length // 2
+    vandermonde = np.vander(t, polyorder + 1, increasing=True)
+    projection = vandermonde @ np.linalg.pinv(vandermonde)
+    projection.setflags(write=False)
+    return projection
+
+
+def moving_average(values, window):
+    """
+    Centered moving average, the windows are truncated at both ends.
+
+    :param values: an evolution or an areas x dates array of them
+    :param window: the odd number of dates of the windows
+    :return: the smoothed values
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.shape[-1]
+    half_window = window // 2
+    sums = np.zeros(values.shape[:-1] + (n + 1,))
+    np.cumsum(values, axis=-1, out=sums[..., 1:])
+    end = np.minimum(np.arange(n) + half_window + 1, n)
+    start = np.maximum(np.arange(n) - half_window, 0)
+    return (sums[..., end] - sums[..., start]) / (end - start)
+
+
+def ewma(values, alpha, initial=None):
+    """
+    Exponentially weighted moving average:
+    s(t) = alpha * x(t) + (1 - alpha) * s(t - 1).
+
+    :param values: an evolution or an areas x dates array of them
+    :param alpha: the weight of the last date, in (0, 1]
+    :param initial: s(-1), the smoothed values before the first date, the
+                    first values if None
+    :return: the smoothed values
+    """
+    from scipy.signal import lfilter
+
+    values = np.asarray(values, dtype=float)
+    if initial is None:
+        initial = values[..., 0]
+    zi = (1 - alpha) * np.asarray(initial, dtype=float)[..., np.newaxis]
+    smoothed, _ = lfilter([alpha], [1, alpha - 1], values, axis=-1, zi=zi)
+    return smoothed
+
+
+def rolling_median(values, window):
+    """
+    Centered rolling median, the values are repeated beyond both ends.
+
+    :param values: an evolution or an areas x dates array of them
+    :param window: the odd number of dates of the windows
+    :return: the smoothed values
+    """
+    from scipy.ndimage import median_filter
+
+    values = np.asarray(values, dtype=float)
+    size = (1,) * (values.ndim - 1) + (window,)
+    return median_filter(values, size=size, mode='nearest')
+
+
+# method -> function(values, parameter)
+smoothers = {
+    'savgol': savgol,
+    'movingAverage': moving_average,
+    'ewma': ewma,
+    'median': rolling_median,
+}
+
+
+def _method(smoothing):
+    """
+    :return: (method, parameters), method is None for no smoothing
+    :raise ValueError: for an unknown method or invalid parameters
+    """
+    first, *parameter = smoothing
+    if isinstance(first, str):
+        if first not in smoothers:
+            raise ValueError(first)
+        method = first
+    elif first == 0:
+        return None, ()
+    else:
+        method, parameter = 'savgol', [first, *parameter]
+    _check_parameters(method, parameter)
+    return method, parameter
+
+
+def _check_parameters(method, parameter):
+    """
+    :raise ValueError: if `parameter` is not valid for `method`
+    """
+    def odd_window(window):
+        return (isinstance(window, (int, np.integer)) and window >= 1
+                and window % 2 == 1)
+
+    if method == 'savgol':
+        valid = (len(parameter) == 2 and odd_window(parameter[0])
+                 and isinstance(parameter[1], (int, np.integer))
+                 and 0 <= parameter[1] < parameter[0])
+    elif method == 'ewma':
+        valid = (len(parameter) == 1
+                 and isinstance(parameter[0], (int, float, np.number))
+                 and 0 < parameter[0] <= 1)
+    else:
+        valid = len(parameter) == 1 and odd_window(parameter[0])
+    if not valid:
+        raise ValueError("Invalid parameters of {}: {}".format(
+            method, ", ".join(map(str, parameter))))
@@ -0,0 +1,82 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import plot_phase_portrait
+import plot_versus_time
+from animate import animate_figure
+from benchmark import first_date, write_synthetic_csvs
+from covid_utils import load_data
+from render import agg_figure
+
+
+class TestAnimateFigure(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as path, \
+                patch('sys.stderr', new=io.StringIO()):
+            write_synthetic_csvs(path, 200, 12)
+            cls.data = load_data(path + "/", start_date=first_date)
+
+    def draw(self, figures_path, script=plot_versus_time):
+        fig = agg_figure()
+        with patch('sys.stdout', new=io.StringIO()):
+            if script is plot_versus_time:
+                file_name = script.draw_figure(
+                    fig, self.data, figures_path, "Confirmed", "daily",
+                    (0, 0), 7, 8, 1, "linear", "countries")
+            else:
+                file_name = script.draw_figure(
+                    fig, self.data, figures_path, "Confirmed", (0, 0),
+                    "linear", "countries")
+        return fig, file_name
+
+    def test_gif(self):
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as path:
+            fig, file_name = self.draw(path)
+            with patch.object(fig.canvas, 'draw',
+                              wraps=fig.canvas.draw) as draw:
+                file_names = animate_figure(fig, file_name, ".gif", dpi=50,
+                                            labels=self.data['DateAxis'])
+            self.assertEqual([str(Path(file_name).with_suffix(".gif"))],
+                             file_names)
+            with Image.open(file_names[0]) as image:
+                self.assertEqual(len(self.data['DateAxis']), image.n_frames)
+                self.assertEqual((500, 300), image.size)
+        # the figure is drawn once, the frames are blitted
+        self.assertEqual(1, draw.call_count)
+
+    def test_phase_portrait_frames(self):
+        with tempfile.TemporaryDirectory() as path:
+            fig, file_name = self.draw(path, plot_phase_portrait)
+            file_names = animate_figure(fig, file_name, ".png", dpi=50)
+            self.assertTrue(all(Path(name).exists() for name in file_names))
+        self.assertEqual(str(Path(file_name).with_suffix("") /
+                             "frame_0000.png"), file_names[0])
+        # the longest trajectory has one point per frame
+        curves, _ = fig.axes[0].get_legend_handles_labels()
+        self.assertEqual(max(len(line.get_xdata()) for line in curves),
+                         len(file_names))
+
+    def test_frames_without_ffmpeg(self):
+        with tempfile.TemporaryDirectory() as path:
+            fig, file_name = self.draw(path)
+            with patch('shutil.which', return_value=None), \
+                    patch('sys.stderr', new=io.StringIO()) as stderr:
+                file_names = animate_figure(fig, file_name, ".mp4", dpi=50)
+        self.assertEqual(len(self.data['DateAxis']), len(file_names))
+        self.assertIn("ffmpeg not found", stderr.getvalue())
+
+    def test_unknown_format(self):
+        with tempfile.TemporaryDirectory() as path:
+            fig, file_name = self.draw(path)
+            with self.assertRaises(ValueError):
+                animate_figure(fig, file_name, ".avi")
+
+
+if __name__ == '__main__':
+    unittest.main()
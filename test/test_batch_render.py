@@ -0,0 +1,105 @@
+import datetime as dt
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import batch_render
+import plot_phase_portrait
+from test_covid_utils import write_jhu_csvs
+
+
+class TestReadManifest(unittest.TestCase):
+    def test_formats(self):
+        contents = {
+            "m.json": '{"figures": [{"script": "versus-time", '
+                      '"start_date": "2020-03-01"}]}',
+            "m.yaml": "figures:\n"
+                      "  - script: versus-time\n"
+                      "    start_date: 2020-03-01\n",
+            "m.toml": '[[figures]]\n'
+                      'script = "versus-time"\n'
+                      'start_date = 2020-03-01\n'}
+        with tempfile.TemporaryDirectory() as d:
+            for name, content in contents.items():
+                path = Path(d, name)
+                path.write_text(content)
+                jobs = batch_render.jobs_from_manifest(
+                    batch_render.read_manifest(path))
+                self.assertEqual(dt.date(2020, 3, 1), jobs[0].start_date)
+
+
+class TestJobsFromManifest(unittest.TestCase):
+    def test_defaults(self):
+        job, = batch_render.jobs_from_manifest(
+            {"figures_path": "figs",
+             "figures": [{"script": "phase-portrait", "field": "Deaths",
+                          "smoothing": [5, 2]}]})
+        self.assertIs(plot_phase_portrait.draw_figure, job.draw)
+        self.assertEqual(dict(figures_path="figs", field="Deaths",
+                              smoothing=(5, 2), yscale='linear',
+                              zone="countries"),
+                         job.kwargs)
+        self.assertEqual(dt.date(2020, 1, 1), job.start_date)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            batch_render.jobs_from_manifest({"figures": [{"script": "x"}]})
+        with self.assertRaises(ValueError):
+            batch_render.jobs_from_manifest(
+                {"figures": [{"script": "phase-portrait", "evolution": 1}]})
+
+
+class TestMain(unittest.TestCase):
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_jhu_csvs(d)
+            manifest = Path(d, "manifest.json")
+            manifest.write_text(json.dumps({
+                "data_path": d + "/", "figures_path": d,
+                "profiles": ["preview"],
+                "figures": [
+                    {"script": "versus-time", "zone": "World",
+                     "smoothing": [0, 0], "start_date": "2020-01-22"},
+                    {"script": "versus-time", "zone": "World",
+                     "field": "Deaths", "smoothing": [0, 0],
+                     "start_date": "2020-01-23"}]}))
+
+            with patch('sys.stdout', new=io.StringIO()) as out, \
+                    patch('sys.stderr', new=io.StringIO()):
+                self.assertEqual(0, batch_render.main(manifest))
+            self.assertEqual(2, len(list(Path(d).glob("*.png"))))
+            self.assertEqual(2, out.getvalue().count("Saved"))
+
+    def test_invalid_smoothing(self):
+        with tempfile.TemporaryDirectory() as d:
+            write_jhu_csvs(d)
+            manifest = Path(d, "manifest.json")
+            manifest.write_text(json.dumps({
+                "data_path": d + "/", "figures_path": d,
+                "profiles": ["preview"],
+                "figures": [
+                    {"script": "versus-time", "zone": "World",
+                     "smoothing": [4, 3], "start_date": "2020-01-22"},
+                    {"script": "versus-time", "zone": "World",
+                     "field": "Deaths", "smoothing": [0, 0],
+                     "start_date": "2020-01-22"}]}))
+
+            with patch('sys.stdout', new=io.StringIO()) as out, \
+                    patch('sys.stderr', new=io.StringIO()) as err:
+                # only the job with the invalid smoothing fails
+                self.assertEqual(1, batch_render.main(manifest))
+            self.assertEqual(1, len(list(Path(d).glob("*.png"))))
+            self.assertEqual(1, out.getvalue().count("Saved"))
+            self.assertEqual(1, err.getvalue().count("Failed"))
+
+    def test_no_figures(self):
+        with tempfile.TemporaryDirectory() as d:
+            manifest = Path(d, "manifest.json")
+            manifest.write_text(json.dumps({"figures": []}))
+
+            with patch('sys.stderr', new=io.StringIO()) as err:
+                self.assertEqual(0, batch_render.main(manifest))
+            self.assertIn("No figures", err.getvalue())
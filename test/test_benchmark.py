@@ -0,0 +1,40 @@
+import tempfile
+import unittest
+
+import pandas as pd
+
+from benchmark import *
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_synthetic_csvs(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_synthetic_csvs(path, 150, 40)
+            frame = pd.read_csv(Path(path, time_series_files['Deaths']))
+        self.assertEqual((150, 44), frame.shape)
+        self.assertIn("France", set(frame['Country/Region']))
+        self.assertEqual("1/22/20", frame.columns[4])
+
+    def test_same_as_reference(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_synthetic_csvs(path, 120, 60)
+            self.assertEqual([], check_reference(path + "/", n_areas=3))
+
+    def test_run_benchmarks(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_synthetic_csvs(path, 100, 40)
+            timings = run_benchmarks(path + "/", repeat=1)
+        self.assertIn('load_data', timings)
+        self.assertIn('render/versus-time', timings)
+        self.assertIn('phase-portrait/derivations', timings)
+        for evolution_type in evolution_types:
+            self.assertIn('evolution_country/' + evolution_type, timings)
+
+    def test_regressions(self):
+        self.assertEqual(
+            [('b', 3.0, 1.0)],
+            regressions({'a': 1.2, 'b': 3.0, 'c': 5.0}, {'a': 1.0, 'b': 1.0}))
+
+
+if __name__ == '__main__':
+    unittest.main()
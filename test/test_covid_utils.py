@@ -1,9 +1,14 @@
 import unittest
 import io
 import sys
+import tempfile
 from unittest.mock import patch
 
+import pandas as pd
+
+import covid_utils
 from covid_utils import *
+from smoothing import update_smoothed
 
 
 class TestParseConfinement(unittest.TestCase):
@@ -63,3 +68,667 @@ class TestExtractConfinement(unittest.TestCase):
             {'c': '1/1/99'},
             extract_confinement({"c": {}})
         )
+
+
+class TestConfinementIndex(unittest.TestCase):
+    def setUp(self):
+        self.data = {field: np.zeros((3, 10), dtype=int)
+                     for field in time_series_files}
+        self.data.update({'CountryIndex': {"A": 0, "B": 1, "C": 2},
+                     'SubareaIndex': {"P, A": 0, "Q, D": 1},
+                     'SubareaParents': {"P, A": "A", "Q, D": "D"},
+                     'AllDates': np.array([dt.date(2020, 3, 1 + i)
+                                           for i in range(10)])})
+        add_regions(self.data, {"R": ["A", "B"], "S": ["A", "B", "C"]})
+        add_confinement(self.data, {
+            "A": {'P': [dt.date(2020, 3, 3)], 'T': [dt.date(2020, 3, 6)]},
+            "B": {'T': [dt.date(2020, 3, 4)]},
+            "Z": {'T': [dt.date(2020, 3, 1)]}})
+
+    def states(self, area):
+        rows = self.data['ConfinementRows']
+        return self.data['ConfinementStates'][rows[area]].tolist()
+
+    def test_states(self):
+        self.assertEqual(np.int8, self.data['ConfinementStates'].dtype)
+        self.assertEqual([0, 0, 1, 1, 1, 2, 2, 2, 2, 2], self.states("A"))
+        self.assertEqual([0] * 10, self.states("C"))
+        # half of the countries of a region
+        self.assertEqual([0, 0, 1, 2, 2, 2, 2, 2, 2, 2], self.states("R"))
+        self.assertEqual([0, 0, 0, 1, 1, 2, 2, 2, 2, 2], self.states("S"))
+        self.assertEqual(self.states("S"), self.states("World"))
+        self.assertEqual(self.states("A"), self.states("P, A"))
+        self.assertEqual([0] * 10, self.states("Q, D"))
+
+    def test_starts(self):
+        areas = ["A", "B", "C", "R"]
+        np.testing.assert_array_equal(
+            [5, 3, -1, 3], confinement_starts(self.data, areas))
+        np.testing.assert_array_equal(
+            [2, 3, -1, 2],
+            confinement_starts(self.data, areas, confinement_states['P']))
+        with self.assertRaises(ValueError):
+            confinement_starts(self.data, ["Atlantis"])
+
+    def test_start_of_partial_confinement(self):
+        # the last partial confinement, as `extract_confinement`
+        add_confinement(self.data, {
+            "A": {'P': [dt.date(2020, 3, 2), dt.date(2020, 3, 5)]},
+            "C": {'P': [dt.date(2020, 3, 4)], 'T': [dt.date(2020, 3, 8),
+                                                   dt.date(2020, 3, 7)]}})
+        np.testing.assert_array_equal(
+            [4, -1, 6, 4, 1], confinement_starts(
+                self.data, ["A", "B", "C", "P, A", "R"]))
+        np.testing.assert_array_equal(
+            [1, -1, 3],
+            confinement_starts(self.data, ["A", "B", "C"],
+                               confinement_states['P']))
+
+    def test_start_on_date_axis(self):
+        data = dict(self.data, Dates=self.data['AllDates'][4:])
+        self.assertEqual((dt.date(2020, 3, 6), 1),
+                         confinement_start("A", data))
+        self.assertEqual((dt.date(2020, 3, 4), 0),
+                         confinement_start("B", data))
+        self.assertEqual((None, -1), confinement_start("C", data))
+
+
+def jhu_frame(rows, dates=("1/22/20", "1/23/20", "1/24/20")):
+    """
+    :param rows: a list of (province, country, values)
+    :return: a DataFrame shaped like a J. Hopkins University time series
+    """
+    return pd.DataFrame(
+        [[province, country, 0.0, 0.0, *values]
+         for province, country, values in rows],
+        columns=["Province/State", "Country/Region", "Lat", "Long",
+                 *dates])
+
+
+class TestAggregateByCountry(unittest.TestCase):
+    def test_sum_provinces(self):
+        frame = jhu_frame([(np.nan, "France", [1, 2, 3]),
+                           ("Hubei", "China", [10, 20, 30]),
+                           ("Beijing", "China", [1, np.nan, 5])])
+        counts = aggregate_by_country(frame, ["China", "France", "Spain"])
+        np.testing.assert_array_equal(
+            counts, [[11, 20, 35], [1, 2, 3], [0, 0, 0]])
+
+
+class TestCumulativeEvolutionSingle(unittest.TestCase):
+    def setUp(self):
+        self.data = {'Confirmed': np.array([[11, 20, 35], [1, 2, 3],
+                                            [0, 4, 8]]),
+                     'Deaths': np.zeros((3, 3), dtype=int),
+                     'Recovered': np.zeros((3, 3), dtype=int),
+                     'CountryIndex': {"China": 0, "France": 1, "Spain": 2}}
+        with patch('sys.stderr', new=io.StringIO()):
+            add_regions(self.data, {"EU": ["France", "Spain", "Italy"],
+                                    "Eurasia": ["EU", "China"]})
+
+    def test_country(self):
+        np.testing.assert_array_equal(
+            cumulative_evolution_single("France", self.data, 'Confirmed'),
+            [1, 2, 3])
+
+    def test_world(self):
+        np.testing.assert_array_equal(
+            cumulative_evolution_single("World", self.data, 'Confirmed'),
+            [12, 26, 46])
+
+    def test_region(self):
+        np.testing.assert_array_equal(
+            cumulative_evolution_single("EU", self.data, 'Confirmed'),
+            [1, 6, 11])
+        np.testing.assert_array_equal(
+            cumulative_evolution_single("Eurasia", self.data, 'Confirmed'),
+            [12, 26, 46])
+
+    def test_unknown_area(self):
+        with self.assertRaises(ValueError):
+            cumulative_evolution_single("Atlantis", self.data, 'Confirmed')
+
+    def test_unknown_country(self):
+        with patch('sys.stderr', new=io.StringIO()) as fake_out:
+            add_regions(self.data, {"EU": ["France", "Italy"]})
+            self.assertEqual(fake_out.getvalue(),
+                             "Unknown countries in EU: Italy\n")
+
+
+def write_jhu_csvs(path):
+    """
+    Write small confirmed/deaths/recovered time series in `path`.
+    """
+    rows = {"confirmed": [(np.nan, "France", [1, 2, 3]),
+                          ("Hubei", "China", [10, 20, 30]),
+                          ("Beijing", "China", [1, 2, 5])],
+            "deaths": [(np.nan, "France", [0, 1, 1]),
+                       ("Hubei", "China", [1, 2, 3]),
+                       ("Beijing", "China", [0, 0, 1])],
+            "recovered": [(np.nan, "France", [0, 0, 1]),
+                          (np.nan, "China", [0, 5, 10])]}
+    for name, field_rows in rows.items():
+        jhu_frame(field_rows).to_csv(
+            Path(path, "time_series_covid19_{}_global.csv".format(name)),
+            index=False)
+
+
+class TestLoadData(unittest.TestCase):
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_jhu_csvs(path)
+            data = load_data(path + "/", start_date=dt.date(2020, 1, 23))
+
+        self.assertEqual({"China": 0, "France": 1}, data['CountryIndex'])
+        np.testing.assert_array_equal(data['Confirmed'],
+                                      [[11, 22, 35], [1, 2, 3]])
+        np.testing.assert_array_equal(data['DateAxis'], ["1/23/20", "1/24/20"])
+        np.testing.assert_array_equal(
+            evolution_country("China", data, "Active", "daily",
+                              data['FilterDate'], (0, 0)),
+            [5, 6])
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_jhu_csvs(path)
+            snapshot = Path(path, "snapshot")
+            expected = load_data(path + "/")
+            compiled = load_data(path + "/", snapshot=snapshot)
+            mapped = load_data(path + "/", snapshot=snapshot)
+
+            self.assertIsInstance(mapped['Confirmed'], np.memmap)
+            for data in (compiled, mapped):
+                for field in ('Confirmed', 'Deaths', 'Recovered'):
+                    np.testing.assert_array_equal(expected[field], data[field])
+                np.testing.assert_array_equal(expected['Dates'], data['Dates'])
+                self.assertEqual(expected['CountryIndex'],
+                                 data['CountryIndex'])
+                self.assertEqual(expected['Confinement'], data['Confinement'])
+
+            # a new day in the source files rebuilds the snapshot
+            Path(path, "time_series_covid19_deaths_global.csv").write_text(
+                "Province/State,Country/Region,Lat,Long,"
+                "1/22/20,1/23/20,1/24/20\n"
+                ",France,0,0,1,2,7\n")
+            self.assertNotIsInstance(
+                load_data(path + "/", snapshot=snapshot)['Confirmed'],
+                np.memmap)
+
+
+    def append_date(self, path, revised=None):
+        for name in ("confirmed", "deaths", "recovered"):
+            csv = Path(path, "time_series_covid19_{}_global.csv".format(name))
+            frame = pd.read_csv(csv)
+            frame[dateOut(dateIn(frame.columns[-1])
+                          + dt.timedelta(days=1))] = frame.iloc[:, -1] + 1
+            if revised is not None:
+                frame[revised] = 1000
+            frame.to_csv(csv, index=False)
+
+    def test_snapshot_new_dates(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_jhu_csvs(path)
+            snapshot = Path(path, "snapshot")
+            previous = load_data(path + "/", snapshot=snapshot)
+            previous['Derivations'].evolution("China", "Active", "R0")
+            previous['Derivations'].evolution(
+                "China", "Active", "smoothedCurvature", ("ewma", 0.3))
+
+            self.append_date(path)
+            with patch('covid_utils.update_evolution',
+                       wraps=update_evolution) as update, \
+                    patch('covid_utils.update_smoothed',
+                          wraps=update_smoothed) as update_ewma:
+                data = load_data(path + "/", snapshot=snapshot,
+                                 previous=previous)
+                r0 = data['Derivations'].evolution("China", "Active", "R0")
+                curvature = data['Derivations'].evolution(
+                    "China", "Active", "smoothedCurvature", ("ewma", 0.3))
+            self.assertIsInstance(load_data(path + "/", snapshot=snapshot)
+                                  ['Confirmed'], np.memmap)
+
+            # a revised value rebuilds the snapshot
+            self.append_date(path, revised="1/22/20")
+            revised = load_data(path + "/", snapshot=snapshot,
+                                previous=data)
+
+        np.testing.assert_array_equal(data['DateAxis'][-2:],
+                                      ["1/24/20", "1/25/20"])
+        np.testing.assert_array_equal(data['Confirmed'],
+                                      [[11, 22, 35, 37], [1, 2, 3, 4]])
+        # the evolutions of the previous data are extended
+        self.assertEqual(1, update.call_count)
+        self.assertEqual(1, update_ewma.call_count)
+        cumulative = cumulative_evolution_field("China", data, "Active")
+        np.testing.assert_allclose(evolution_of(cumulative, "R0", (0, 0)), r0)
+        np.testing.assert_allclose(
+            evolution_of(cumulative, "smoothedCurvature", ("ewma", 0.3)),
+            curvature)
+        np.testing.assert_array_equal([2000, 1000], revised['Confirmed'][:, 0])
+        self.assertEqual([], list(revised['Derivations'].previous))
+
+    def test_rebuild(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_jhu_csvs(path)
+            snapshot = Path(path, "snapshot")
+            load_data(path + "/", snapshot=snapshot)
+            load_data(path + "/", snapshot=snapshot)
+            with patch('covid_utils._compile_data',
+                       wraps=covid_utils._compile_data) as compile_data:
+                data = load_data(path + "/", snapshot=snapshot, rebuild=True)
+        self.assertIsNone(compile_data.call_args.args[1])
+        self.assertNotIsInstance(data['Confirmed'], np.memmap)
+
+    def test_start_date_prunes_columns(self):
+        dates = [dt.date(2020, 1, 22) + dt.timedelta(days=i)
+                 for i in range(60)]
+        start_date = dates[45]
+        with tempfile.TemporaryDirectory() as path:
+            for name in ("confirmed", "deaths", "recovered"):
+                jhu_frame([(np.nan, "France", np.arange(60) ** 2),
+                           ("Hubei", "China", np.arange(60) * 3)],
+                          dates=[dateOut(date) for date in dates]).to_csv(
+                    Path(path, "time_series_covid19_{}_global.csv".format(
+                        name)), index=False)
+            full = load_data(path + "/", start_date=dates[0])
+            pruned = load_data(path + "/", start_date=start_date)
+
+            snapshot = Path(path, "snapshot")
+            load_data(path + "/", start_date=start_date, snapshot=snapshot)
+            earlier = load_data(path + "/", start_date=dates[20],
+                                snapshot=snapshot)
+
+        self.assertEqual(pruned['AllDates'][0],
+                         start_date - dt.timedelta(days=history_days))
+        self.assertEqual(pruned['Confirmed'].dtype, np.int32)
+        np.testing.assert_array_equal(pruned['DateAxis'],
+                                      full['DateAxis'][45:])
+        for evolution_type in ("cumulative", "daily", "smoothedCurvature"):
+            np.testing.assert_allclose(
+                evolution_country("France", pruned, "Active", evolution_type,
+                                  pruned['FilterDate'], (7, 3)),
+                evolution_country("France", full, "Active", evolution_type,
+                                  full['FilterDate'], (7, 3))[45:])
+        self.assertEqual(earlier['AllDates'][0], dates[0])
+
+    def test_history_of_smoothings(self):
+        self.assertEqual(history_days, history_days_for())
+        self.assertEqual(history_days, history_days_for([(7, 3)]))
+        self.assertEqual(32, history_days_for([(7, 3), ("median", 61)]))
+        self.assertIsNone(history_days_for([(7, 3), ("ewma", 0.1)]))
+
+    def test_ewma_reads_all_dates(self):
+        dates = [dt.date(2020, 1, 22) + dt.timedelta(days=i)
+                 for i in range(60)]
+        with tempfile.TemporaryDirectory() as path:
+            for name in ("confirmed", "deaths", "recovered"):
+                jhu_frame([(np.nan, "France", np.arange(60) ** 2)],
+                          dates=[dateOut(date) for date in dates]).to_csv(
+                    Path(path, "time_series_covid19_{}_global.csv".format(
+                        name)), index=False)
+            snapshot = Path(path, "snapshot")
+            load_data(path + "/", start_date=dates[45], snapshot=snapshot)
+            full = load_data(path + "/", start_date=dates[0])
+            pruned = load_data(path + "/", start_date=dates[45],
+                               snapshot=snapshot,
+                               smoothings=[("ewma", 0.1)])
+
+        self.assertEqual(dates[0], pruned['AllDates'][0])
+        np.testing.assert_allclose(
+            evolution_country("France", pruned, "Active", "smoothedCurvature",
+                              pruned['FilterDate'], ("ewma", 0.1)),
+            evolution_country("France", full, "Active", "smoothedCurvature",
+                              full['FilterDate'], ("ewma", 0.1))[45:])
+
+
+def write_us_csvs(path, dates=("1/23/20", "1/24/20")):
+    """
+    Write small confirmed/deaths time series of US counties in `path`.
+    """
+    columns = ["UID", "iso2", "iso3", "code3", "FIPS", "Admin2",
+               "Province_State", "Country_Region", "Lat", "Long_",
+               "Combined_Key"]
+    rows = [("Autauga", "Alabama", [1, 2]), ("Baldwin", "Alabama", [3, 5]),
+            ("Unassigned", "Alabama", [0, 1]), ("Kent", "Delaware", [4, 4]),
+            (np.nan, "Diamond Princess", [7, 8])]
+    for name in ("confirmed", "deaths"):
+        frame = pd.DataFrame(
+            [[0, "US", "USA", 840, 0.0, county, state, "US", 0.0, 0.0, "",
+              *values] for county, state, values in rows],
+            columns=columns + list(dates))
+        if name == "deaths":
+            frame.insert(len(columns), "Population", 1000)
+        frame.to_csv(Path(path, "time_series_covid19_{}_US.csv".format(name)),
+                     index=False)
+
+
+class TestSubareas(unittest.TestCase):
+    def test_provinces(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_jhu_csvs(path)
+            data = load_data(path + "/", start_date=dt.date(2020, 1, 22))
+
+        self.assertEqual({'China': ["Beijing, China", "Hubei, China"]},
+                         data['Subareas'])
+        np.testing.assert_array_equal(
+            cumulative_evolution_single("Hubei, China", data, "Confirmed"),
+            [10, 20, 30])
+        np.testing.assert_array_equal(
+            evolution_country("Beijing, China", data, "Deaths", "daily",
+                              data['FilterDate'], (0, 0)),
+            [0, 0, 1])
+
+    def test_names_with_commas(self):
+        rows = [("Bonaire, Sint Eustatius and Saba", "Netherlands",
+                 [1, 2, 3]),
+                ("Jeju", "Korea, South", [1, 1, 2]),
+                (np.nan, "Korea, South", [5, 6, 7])]
+        with tempfile.TemporaryDirectory() as path:
+            for name in ("confirmed", "deaths", "recovered"):
+                jhu_frame(rows).to_csv(Path(
+                    path, "time_series_covid19_{}_global.csv".format(name)),
+                    index=False)
+            data = load_data(path + "/", start_date=dt.date(2020, 1, 22),
+                             regions={})
+            add_confinement(data, {"Korea, South": {
+                'T': [dt.date(2020, 1, 23)]}})
+
+        self.assertEqual(
+            {'Netherlands': ["Bonaire, Sint Eustatius and Saba, Netherlands"],
+             'Korea, South': ["Jeju, Korea, South"]}, data['Subareas'])
+        self.assertEqual((dt.date(2020, 1, 23), 1),
+                         confinement_start("Jeju, Korea, South", data))
+
+    def test_counties(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_jhu_csvs(path)
+            write_us_csvs(path)
+            data = load_data(path + "/", start_date=dt.date(2020, 1, 22),
+                             counties=True)
+            snapshot = Path(path, "snapshot")
+            load_data(path + "/", start_date=dt.date(2020, 1, 22),
+                      counties=True, snapshot=snapshot)
+            mapped = load_data(path + "/", start_date=dt.date(2020, 1, 22),
+                               counties=True, snapshot=snapshot)
+
+        self.assertEqual(["Alabama, US", "Delaware, US",
+                          "Diamond Princess, US"], data['Subareas']['US'])
+        self.assertEqual(["Autauga, Alabama, US", "Baldwin, Alabama, US",
+                          "Unassigned, Alabama, US"],
+                         data['Subareas']['Alabama, US'])
+        for area, expected in (("Alabama, US", [0, 4, 8]),
+                               ("Baldwin, Alabama, US", [0, 3, 5]),
+                               ("Diamond Princess, US", [0, 7, 8])):
+            np.testing.assert_array_equal(
+                cumulative_evolution_single(area, data, "Confirmed"),
+                expected)
+        np.testing.assert_array_equal(
+            cumulative_evolution_single("Kent, Delaware, US", data,
+                                        "Recovered"), [0, 0, 0])
+        self.assertIsInstance(mapped['SubareaCounts']['Deaths'], np.memmap)
+        self.assertEqual(data['SubareaIndex'], mapped['SubareaIndex'])
+        np.testing.assert_array_equal(data['SubareaCounts']['Deaths'],
+                                      mapped['SubareaCounts']['Deaths'])
+
+
+def synthetic_data(n_countries=4, n_dates=30, seed=0):
+    """
+    :return: data as returned by `load_data`, with random cumulative counts
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for field in ('Confirmed', 'Deaths', 'Recovered'):
+        daily = rng.integers(0, 50, size=(n_countries, n_dates))
+        data[field] = daily.cumsum(axis=1)
+    data['Confirmed'] += 1
+    data['CountryIndex'] = {"C{}".format(i): i for i in range(n_countries)}
+    add_regions(data, {"R": ["C0", "C2"]})
+    data['FilterDate'] = np.arange(n_dates) >= 3
+    return data
+
+
+class TestEvolutionAll(unittest.TestCase):
+    def test_same_as_evolution_country(self):
+        data = synthetic_data()
+        for field in ("Confirmed", "Deaths", "Active", "DeathRate",
+                      "Recovered"):
+            for evolution_type in ("cumulative", "daily", "curvature",
+                                   "smoothedCurvature", "R0"):
+                with self.subTest(field=field, evolution_type=evolution_type):
+                    expected = [evolution_country(area, data, field,
+                                                  evolution_type,
+                                                  data['FilterDate'], (7, 3))
+                                for area in data['CountryIndex']]
+                    np.testing.assert_allclose(
+                        evolution_all(data, field, evolution_type, (7, 3)),
+                        expected)
+
+    def test_areas(self):
+        data = synthetic_data()
+        np.testing.assert_array_equal(
+            evolution_all(data, "Confirmed", "daily", (7, 3),
+                          areas=["World", "R"]),
+            [evolution_country(area, data, "Confirmed", "daily",
+                               data['FilterDate'], (7, 3))
+             for area in ["World", "R"]])
+
+
+class TestDerivations(unittest.TestCase):
+    def test_same_as_evolution_country(self):
+        data = synthetic_data()
+        graph = derivations(data)
+        for field in ("Confirmed", "Active", "DeathRate"):
+            for evolution_type in ("cumulative", "daily", "curvature",
+                                   "smoothedCurvature", "R0", "growthRate",
+                                   "doublingTime"):
+                for smoothing in ((0, 0), (7, 3), ("ewma", 0.3)):
+                    with self.subTest(field=field,
+                                      evolution_type=evolution_type,
+                                      smoothing=smoothing):
+                        expected = evolution_country(
+                            "R", data, field, evolution_type,
+                            data['FilterDate'], smoothing)
+                        np.testing.assert_array_equal(
+                            expected,
+                            graph.series("R", field, evolution_type,
+                                         data['FilterDate'], smoothing))
+
+    def test_shared_nodes(self):
+        data = synthetic_data()
+        graph = derivations(data)
+        with patch('covid_utils.cumulative_evolution_single',
+                   wraps=cumulative_evolution_single) as single:
+            for evolution_type in ("cumulative", "daily",
+                                   "smoothedCurvature"):
+                for field in ("Active", "DeathRate"):
+                    graph.series("C1", field, evolution_type,
+                                 data['FilterDate'], (7, 3))
+        self.assertEqual(3, single.call_count)
+        self.assertIs(graph, derivations(data))
+        with self.assertRaises(ValueError):
+            graph.evolution("C1", "Active", "square")
+        evolution = graph.evolution("C1", "Active", "daily")
+        with self.assertRaises(ValueError):
+            evolution[0] = 1
+
+
+class TestGrowthRate(unittest.TestCase):
+    def test_same_as_polyfit(self):
+        cumulative = synthetic_data(n_dates=40)['Confirmed']
+        growth_rate = evolution_of(cumulative, "growthRate", (7, 3), 5)
+        daily = np.diff(cumulative, axis=1, prepend=0)
+        daily[:, 0] = 0
+        for area in range(len(cumulative)):
+            for end in (5, 20, 40):
+                t = np.arange(end - 5, end)
+                y = daily[area, t]
+                slope = np.polyfit(t[y > 0], np.log(y[y > 0]), 1)[0]
+                self.assertAlmostEqual(growth_rate[area, end - 1],
+                                       np.exp(slope) - 1)
+        self.assertTrue(np.isnan(growth_rate[:, :4]).all())
+
+    def test_doubling_time(self):
+        cumulative = np.cumsum(2 ** (np.arange(20) / 3))
+        doubling_time = evolution_of(cumulative, "doublingTime", (7, 3))
+        np.testing.assert_allclose(doubling_time[7:], 3)
+        halving_time = evolution_of(np.cumsum(2 ** (-np.arange(20) / 3)),
+                                    "doublingTime", (7, 3))
+        np.testing.assert_allclose(halving_time[7:], -3)
+
+    def test_batched_same_as_single(self):
+        data = synthetic_data()
+        evolutions = evolution_all(data, "Confirmed", "growthRate", (7, 3),
+                                   areas=["C0", "R", "World"])
+        for row, area in zip(evolutions, ["C0", "R", "World"]):
+            np.testing.assert_allclose(
+                row, evolution_country(area, data, "Confirmed", "growthRate",
+                                       data['FilterDate'], (7, 3)))
+
+
+class TestReproductionNumber(unittest.TestCase):
+    def test_serial_interval_distribution(self):
+        w = serial_interval_distribution(4.7, 2.9)
+        self.assertEqual(w[0], 0)
+        self.assertAlmostEqual(w.sum(), 1)
+        self.assertAlmostEqual((w * np.arange(len(w))).sum(), 4.7, delta=0.2)
+
+    def test_exponential_growth(self):
+        # the Euler-Lotka equation: R = 1 / sum_s w(s) exp(-r s)
+        w = serial_interval_distribution()
+        daily = 100 * np.exp(0.1 * np.arange(60))
+        mean, lower, upper = reproduction_number(daily, w)
+        expected = 1 / (w * np.exp(-0.1 * np.arange(len(w)))).sum()
+        np.testing.assert_allclose(mean[40:], expected, rtol=1e-2)
+        self.assertTrue(np.all(lower[40:] < mean[40:]))
+        self.assertTrue(np.all(mean[40:] < upper[40:]))
+        self.assertTrue(np.isnan(mean[:6]).all())
+
+    def test_batched_same_as_loop(self):
+        from scipy.stats import gamma
+
+        daily = np.diff(synthetic_data(n_dates=40)['Confirmed'], axis=1)
+        w = serial_interval_distribution(5, 3, max_days=10)
+        mean, lower, upper = reproduction_number(daily, w, window=5)
+        for area, incidence in enumerate(daily):
+            infectiousness = np.convolve(incidence, w)[:len(incidence)]
+            for t in range(4, len(incidence)):
+                shape = 1 + incidence[t - 4:t + 1].sum()
+                scale = 1 / (1 / 5 + infectiousness[t - 4:t + 1].sum())
+                np.testing.assert_allclose(
+                    [mean[area, t], lower[area, t], upper[area, t]],
+                    [shape * scale, *gamma.interval(0.95, shape,
+                                                    scale=scale)])
+
+    def test_no_cases(self):
+        mean, lower, upper = reproduction_number(np.zeros((2, 20)))
+        self.assertTrue(np.isnan(mean).all())
+
+
+class TestUpdateEvolution(unittest.TestCase):
+    def test_same_as_evolution_of(self):
+        cumulative = synthetic_data(n_dates=40)['Confirmed']
+        for evolution_type in ("cumulative", "daily", "curvature",
+                               "smoothedCurvature", "R0", "growthRate",
+                               "doublingTime"):
+            for n_new in (1, 3):
+                with self.subTest(evolution_type=evolution_type, n_new=n_new):
+                    evolution = evolution_of(cumulative[:, :-n_new],
+                                             evolution_type, (7, 3))
+                    np.testing.assert_allclose(
+                        update_evolution(evolution, cumulative,
+                                         evolution_type, (7, 3)),
+                        evolution_of(cumulative, evolution_type, (7, 3)))
+
+    def test_other_smoothings(self):
+        cumulative = synthetic_data(n_dates=40)['Confirmed']
+        for smoothing in (("movingAverage", 5), ("ewma", 0.3),
+                          ("median", 5)):
+            with self.subTest(smoothing=smoothing):
+                evolution = evolution_of(cumulative[:, :-2],
+                                         "smoothedCurvature", smoothing)
+                np.testing.assert_allclose(
+                    update_evolution(evolution, cumulative,
+                                     "smoothedCurvature", smoothing),
+                    evolution_of(cumulative, "smoothedCurvature", smoothing))
+
+    def test_short(self):
+        cumulative = np.arange(10) ** 2
+        np.testing.assert_allclose(
+            update_evolution(evolution_of(cumulative[:6], "smoothedCurvature",
+                                          (5, 2)),
+                             cumulative, "smoothedCurvature", (5, 2)),
+            evolution_of(cumulative, "smoothedCurvature", (5, 2)))
+
+
+class TestExponentialTrend(unittest.TestCase):
+    def test_fit_log_linear(self):
+        evolutions = synthetic_data(n_dates=40)['Confirmed'].astype(float)
+        evolutions[0, 10:15] = 0
+        start = np.array([[0, 5], [10, 20], [3, 30], [0, 1]])
+        slope, intercept = fit_log_linear(log_linear_sums(evolutions),
+                                          start, start + 8)
+        for area, windows in enumerate(start):
+            for window, first in enumerate(windows):
+                t = np.arange(first, first + 8)
+                y = evolutions[area, t]
+                expected = np.polyfit(t[y > 0], np.log(y[y > 0]), 1)
+                np.testing.assert_allclose(
+                    [slope[area, window], intercept[area, window]], expected)
+
+    def test_not_enough_values(self):
+        slope, intercept = fit_log_linear(
+            log_linear_sums([[0, 0, 3, 0], [1, 2, 4, 8]]), 0, 4)
+        self.assertTrue(np.isnan(slope[0]))
+        self.assertAlmostEqual(np.log(2), slope[1])
+
+    def test_trend(self):
+        dates = np.array([dt.date(2020, 3, 1) + dt.timedelta(days=i)
+                          for i in range(10)])
+        evolutions = np.array([3 * 1.1 ** np.arange(10),
+                               -2 * 0.9 ** np.arange(10)])
+        labels, values, rates = exponential_trend(
+            dates, evolutions,
+            (np.array([dt.date(2020, 3, 2), dt.date(2020, 3, 4)]),
+             dt.date(2020, 3, 9)),
+            (dt.date(2020, 3, 9), dt.date(2020, 3, 12)))
+
+        self.assertEqual(["3/9/20", "3/10/20", "3/11/20", "3/12/20"],
+                         labels[0].tolist())
+        np.testing.assert_allclose(rates, [0.1, -0.1])
+        np.testing.assert_allclose(values,
+                                   [3 * 1.1 ** np.arange(8, 12),
+                                    -2 * 0.9 ** np.arange(8, 12)])
+
+    def test_one_area(self):
+        dates = np.array([dt.date(2020, 3, 1) + dt.timedelta(days=i)
+                          for i in range(5)])
+        labels, values, rate = exponential_trend(
+            dates, 2.0 ** np.arange(5),
+            (dt.date(2020, 2, 20), dt.date(2020, 3, 5)),
+            (dt.date(2020, 3, 5), dt.date(2020, 3, 6)))
+        self.assertEqual(["3/5/20", "3/6/20"], labels.tolist())
+        np.testing.assert_allclose(values, [16, 32])
+        self.assertAlmostEqual(1, rate)
+
+
+class TestCurvatureStatistics(unittest.TestCase):
+    def test_same_as_differences(self):
+        evolutions = synthetic_data(n_countries=6)['Confirmed'].astype(float)
+        evolutions[1, ::3] = 0
+        evolutions[4, :-2] = 0
+        evolutions[5] = 0
+        smoothed = evolutions ** 1.5
+        periods, gradients, curvatures = curvature_statistics(
+            evolutions, smoothed, threshold=100)
+        for area, (evolution, values) in enumerate(zip(evolutions,
+                                                       smoothed)):
+            check = evolution > 100
+            self.assertEqual(np.sum(check), periods[area])
+            if np.sum(check) > 2:
+                self.assertAlmostEqual(np.diff(values[check], 1).mean(),
+                                       gradients[area])
+                self.assertAlmostEqual(np.diff(values[check], 2).mean(),
+                                       curvatures[area])
+            else:
+                self.assertTrue(np.isnan(gradients[area]))
+                self.assertTrue(np.isnan(curvatures[area]))
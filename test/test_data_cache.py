@@ -0,0 +1,212 @@
+import datetime as dt
+import gzip
+import http.server
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from covid_utils import load_data
+from data_cache import CsvCache, HttpSession, urllib_fetch
+from test_covid_utils import write_jhu_csvs
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    files = {"/a.csv": (b"x,y\n1,2\n", '"v1"')}
+    requests = []
+    # the number of requests answered by a 503, and the delay of the answers
+    failures = 0
+    delay = 0
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        self.connections.add(self.client_address)
+        time.sleep(self.delay)
+        if _Handler.failures > 0:
+            _Handler.failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, etag = self.files[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # the clients of the tests may hang up on purpose
+        pass
+
+
+class LocalServer:
+    """
+    A local HTTP stand-in for the J. Hopkins University repository.
+    """
+    def __enter__(self):
+        _Handler.requests = []
+        _Handler.connections = set()
+        _Handler.failures = 0
+        _Handler.delay = 0
+        _Handler.files = {"/a.csv": (b"x,y\n1,2\n", '"v1"')}
+        self.server = _Server(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_port)
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def offline_fetch(url, headers):
+    raise ConnectionError(url)
+
+
+class TestCsvCache(unittest.TestCase):
+    def test_revalidate(self):
+        with tempfile.TemporaryDirectory() as d, LocalServer() as server:
+            cache = CsvCache(d, fetcher=urllib_fetch)
+            path1 = cache.get(server.url + "/a.csv")
+            path2 = cache.get(server.url + "/a.csv")
+
+            self.assertEqual(path1, path2)
+            self.assertEqual(b"x,y\n1,2\n", path2.read_bytes())
+            self.assertEqual([("/a.csv", None), ("/a.csv", '"v1"')],
+                             _Handler.requests)
+
+    def test_partial_meta(self):
+        with tempfile.TemporaryDirectory() as d, LocalServer() as server:
+            cache = CsvCache(d, fetcher=urllib_fetch)
+            path = cache.get(server.url + "/a.csv")
+            # as read while another process writes it
+            Path(str(path) + ".json").write_text('{"etag": ')
+
+            self.assertEqual(path, cache.get(server.url + "/a.csv"))
+            self.assertEqual([("/a.csv", None), ("/a.csv", None)],
+                             _Handler.requests)
+            self.assertEqual(sorted([path.name, path.name + ".json"]),
+                             sorted(os.listdir(d)))
+
+    def test_offline(self):
+        with tempfile.TemporaryDirectory() as d, LocalServer() as server:
+            url = server.url + "/a.csv"
+            CsvCache(d).get(url)
+
+            path = CsvCache(d, fetcher=offline_fetch).get(url)
+            self.assertEqual(b"x,y\n1,2\n", path.read_bytes())
+
+            with self.assertRaises(ConnectionError):
+                CsvCache(d, fetcher=offline_fetch, ttl=0).get(url)
+
+    def test_offline_empty(self):
+        with tempfile.TemporaryDirectory() as d:
+            with self.assertRaises(ConnectionError):
+                CsvCache(d, fetcher=offline_fetch).get("http://x/a.csv")
+
+
+class TestHttpSession(unittest.TestCase):
+    def test_gzip_keep_alive(self):
+        with LocalServer() as server:
+            session = HttpSession()
+            for _ in range(3):
+                status, _, body = session.fetch(server.url + "/a.csv", {})
+                self.assertEqual((200, b"x,y\n1,2\n"), (status, body))
+            session.close()
+        self.assertEqual(1, len(_Handler.connections))
+
+    def test_close(self):
+        with tempfile.TemporaryDirectory() as d, LocalServer() as server:
+            with CsvCache(d) as cache:
+                cache.get(server.url + "/a.csv")
+                self.assertTrue(cache.session.idle)
+            self.assertFalse(cache.session.idle)
+
+    def test_retries(self):
+        with LocalServer() as server:
+            _Handler.failures = 2
+            status, _, _ = HttpSession(backoff=0).fetch(server.url + "/a.csv",
+                                                        {})
+            self.assertEqual(200, status)
+
+            _Handler.failures = 2
+            status, _, _ = HttpSession(retries=1, backoff=0).fetch(
+                server.url + "/a.csv", {})
+            self.assertEqual(503, status)
+
+    def test_budget(self):
+        with LocalServer() as server:
+            _Handler.delay = 0.5
+            with self.assertRaises(OSError):
+                HttpSession(budget=0.2, retries=0).fetch(
+                    server.url + "/a.csv", {})
+
+    def test_concurrent(self):
+        with tempfile.TemporaryDirectory() as d, LocalServer() as server:
+            _Handler.delay = 0.3
+            urls = []
+            for name in ("b", "c", "d"):
+                _Handler.files["/{}.csv".format(name)] = (
+                    name.encode(), '"{}"'.format(name))
+                urls.append("{}/{}.csv".format(server.url, name))
+            start = time.perf_counter()
+            paths = CsvCache(d).get_all(urls)
+            self.assertLess(time.perf_counter() - start, 0.8)
+            self.assertEqual([b"b", b"c", b"d"],
+                             [path.read_bytes() for path in paths])
+
+
+class TestLoadRemoteData(unittest.TestCase):
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as d, LocalServer() as server:
+            write_jhu_csvs(d)
+            for path in Path(d).glob("*.csv"):
+                _Handler.files["/jhu/" + path.name] = (path.read_bytes(),
+                                                       '"1"')
+            expected = load_data(d + "/", start_date=dt.date(2020, 1, 22))
+            from_memory = load_data(server.url + "/jhu/",
+                                    start_date=dt.date(2020, 1, 22))
+            cached = load_data(server.url + "/jhu/",
+                               start_date=dt.date(2020, 1, 22),
+                               cache=CsvCache(Path(d, "cache")),
+                               snapshot=Path(d, "snapshot"))
+
+        for data in (from_memory, cached):
+            np.testing.assert_array_equal(expected['Confirmed'],
+                                          data['Confirmed'])
+            np.testing.assert_array_equal(expected['DateAxis'],
+                                          data['DateAxis'])
+
+    def test_close_after_failure(self):
+        # the server does not have the files
+        with LocalServer() as server, \
+                patch.object(HttpSession, 'close', autospec=True,
+                             side_effect=HttpSession.close) as close:
+            with self.assertRaises(OSError):
+                load_data(server.url + "/missing/",
+                          start_date=dt.date(2020, 1, 22))
+        close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import data_snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as d:
+            source = Path(d, "source.csv")
+            source.write_text("a")
+            signature = data_snapshot.source_signature([source])
+            data_snapshot.save(d, signature, {'x': np.arange(6).reshape(2, 3)},
+                               {'names': ["a", "b"]})
+
+            arrays, meta = data_snapshot.load(d, signature)
+            self.assertIsInstance(arrays['x'], np.memmap)
+            np.testing.assert_array_equal(arrays['x'], [[0, 1, 2], [3, 4, 5]])
+            self.assertEqual({'names': ["a", "b"]}, meta)
+
+    def test_stale(self):
+        with tempfile.TemporaryDirectory() as d:
+            source = Path(d, "source.csv")
+            source.write_text("a")
+            data_snapshot.save(d, data_snapshot.source_signature([source]),
+                               {'x': np.zeros(1)}, {})
+            source.write_text("ab")
+
+            self.assertIsNone(data_snapshot.load(
+                d, data_snapshot.source_signature([source])))
+
+    def test_overwrite(self):
+        with tempfile.TemporaryDirectory() as d:
+            data_snapshot.save(d, [], {'x': np.zeros(2)}, {'n': 0})
+            old_arrays, _ = data_snapshot.load(d)
+            data_snapshot.save(d, [], {'x': np.ones(3)}, {'n': 1})
+
+            arrays, meta = data_snapshot.load(d)
+            np.testing.assert_array_equal(arrays['x'], [1, 1, 1])
+            self.assertEqual({'n': 1}, meta)
+            # the arrays of the replaced snapshot are untouched
+            np.testing.assert_array_equal(old_arrays['x'], [0, 0])
+            self.assertEqual(["meta.json"],
+                             [name for name in os.listdir(d)
+                              if not name.startswith("arrays-")])
+
+    def test_remove_stale(self):
+        with tempfile.TemporaryDirectory() as d:
+            for n in range(3):
+                data_snapshot.save(d, [], {'x': np.full(1, n)}, {})
+            self.assertEqual(3, len(os.listdir(d)) - 1)
+
+            for name in os.listdir(d):
+                os.utime(Path(d, name), (0, 0))
+            data_snapshot.save(d, [], {'x': np.full(1, 3)}, {})
+            # the new generation and the replaced one
+            self.assertEqual(2, len(os.listdir(d)) - 1)
+            np.testing.assert_array_equal(data_snapshot.load(d)[0]['x'], [3])
+
+    def test_missing(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.assertIsNone(data_snapshot.load(d, []))
@@ -0,0 +1,107 @@
+import io
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from benchmark import first_date, write_synthetic_csvs
+from covid_utils import evolution_country, exponential_trend, load_data
+from export import export_formats, export_metrics
+from smoothing import smooth
+
+
+class TestExportMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as path, \
+                patch('sys.stderr', new=io.StringIO()):
+            write_synthetic_csvs(path, 200, 40)
+            cls.data = load_data(path + "/", start_date=first_date)
+
+    def export(self, path, export_format):
+        return export_metrics(self.data, path, fields=("Deaths",),
+                              evolution_types=("daily",),
+                              export_format=export_format)
+
+    def test_csv(self):
+        with tempfile.TemporaryDirectory() as path:
+            file_names = self.export(path, ".csv")
+            self.assertEqual([str(Path(path, "Deaths_daily.csv")),
+                              str(Path(path, "Deaths_daily_summary.csv"))],
+                             file_names)
+            evolutions = pd.read_csv(file_names[0])
+            summary = pd.read_csv(file_names[1], index_col='Area')
+
+        data = self.data
+        self.assertEqual(len(data['Dates']), len(evolutions))
+        self.assertEqual(str(data['Dates'][0]), evolutions['Date'][0])
+        for area in ("France", "EU", "World"):
+            expected = smooth(evolution_country(
+                area, data, "Deaths", "daily", data['FilterDate'], (7, 3)),
+                (7, 3))
+            np.testing.assert_allclose(expected, evolutions[area])
+            self.assertAlmostEqual(expected[-1], summary['Last'][area])
+            _, _, rate = exponential_trend(
+                data['Dates'], expected,
+                (data['Dates'][-10], data['Dates'][-1]),
+                (data['Dates'][-1], data['Dates'][-1]))
+            self.assertAlmostEqual(rate, summary['Rate'][area])
+        self.assertEqual(['Last', 'Rate', 'Period', 'Gradient', 'Curvature'],
+                         list(summary.columns))
+
+    def test_without_pyarrow(self):
+        with tempfile.TemporaryDirectory() as path, \
+                patch('importlib.util.find_spec', return_value=None), \
+                patch('sys.stderr', new=io.StringIO()) as stderr:
+            file_names = self.export(path, ".parquet")
+        self.assertTrue(all(name.endswith(".csv") for name in file_names))
+        self.assertIn("pyarrow not found", stderr.getvalue())
+
+    def test_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as path:
+            csv = pd.read_csv(self.export(path, ".csv")[0])
+            for export_format in export_formats[:2]:
+                name = self.export(path, export_format)[0]
+                if export_format == ".parquet":
+                    table = pq.read_table(name)
+                else:
+                    with pyarrow.OSFile(name) as source:
+                        table = pyarrow.ipc.open_file(source).read_all()
+                np.testing.assert_allclose(csv['World'],
+                                           table.column('World').to_numpy())
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.export("unused", ".xlsx")
+
+    def test_without_matplotlib(self):
+        with tempfile.TemporaryDirectory() as path:
+            subprocess.run(
+                [sys.executable, "-c",
+                 "import sys\n"
+                 "from benchmark import first_date, write_synthetic_csvs\n"
+                 "sys.modules['matplotlib'] = None\n"
+                 "from covid_utils import load_data\n"
+                 "from export import export_metrics\n"
+                 "write_synthetic_csvs(sys.argv[1], 60, 20)\n"
+                 "data = load_data(sys.argv[1] + '/', start_date=first_date)\n"
+                 "export_metrics(data, sys.argv[1], export_format='.csv')\n",
+                 path],
+                cwd=Path(__file__).parent.parent, check=True,
+                stderr=subprocess.DEVNULL)
+            self.assertTrue(Path(path, "Confirmed_daily_summary.csv").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+# import time budget of a module, in microseconds, as measured by
+# `python -X importtime`. numpy alone takes about 100 ms, the modules about
+# 100-150 ms.
+import_time_budget = 300000
+
+# modules that must only be imported by the functions that need them
+lazy_modules = {"matplotlib", "pandas", "scipy", "urllib.request",
+                "concurrent.futures"}
+
+
+def import_times(module):
+    """
+    :return: a mapping imported module -> cumulative import time in us
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=Path(__file__).parent.parent, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_budget(self):
+        for module in ("covid_utils", "render", "plot_versus_time",
+                       "plot_phase_portrait",
+                       "plot_versus_time_compare_smoothing",
+                       "scatter_all_countries_curvature", "batch_render",
+                       "export"):
+            with self.subTest(module=module):
+                times = import_times(module)
+                self.assertFalse(lazy_modules & set(times))
+                self.assertLess(times[module], import_time_budget)
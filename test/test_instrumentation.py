@@ -0,0 +1,85 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import instrumentation
+from instrumentation import instrumented, span
+from test_covid_utils import synthetic_data
+from covid_utils import evolution_country
+
+
+class TestSpans(unittest.TestCase):
+    def tearDown(self):
+        instrumentation.stop()
+
+    def test_disabled(self):
+        self.assertIsNone(instrumentation.stop())
+        with span("nothing"):
+            pass
+        self.assertIsNone(instrumentation.stop())
+
+    def test_report(self):
+        instrumentation.start(os.devnull)
+
+        @instrumented("allocate")
+        def allocate():
+            return np.ones(10 ** 6)
+
+        with span("outer", area="France"):
+            allocate()
+            allocate()
+        with span("outer", area="Spain"):
+            pass
+        report = instrumentation.stop()
+
+        self.assertEqual(2, report['spans']['outer']['calls'])
+        self.assertEqual(2, report['spans']['allocate']['calls'])
+        # the nested spans get the area of the enclosing span
+        self.assertEqual(2, report['areas']['allocate']['France']['calls'])
+        self.assertEqual({"France", "Spain"}, set(report['areas']['outer']))
+        self.assertGreaterEqual(report['spans']['allocate']['peak_memory'],
+                                8 * 10 ** 6)
+        self.assertGreaterEqual(report['spans']['outer']['peak_memory'],
+                                8 * 10 ** 6)
+        self.assertGreaterEqual(report['spans']['outer']['wall'],
+                                report['spans']['allocate']['wall'])
+
+    def test_hot_paths(self):
+        data = synthetic_data()
+        instrumentation.start(os.devnull)
+        evolution_country("R", data, "Active", "smoothedCurvature",
+                          data['FilterDate'], (7, 3))
+        report = instrumentation.stop()
+        self.assertEqual(3, report['areas']['cumulative_evolution_single']
+                         ['R']['calls'])
+        self.assertEqual(1, report['areas']['smoothing']['R']['calls'])
+
+
+class TestEnvironmentVariable(unittest.TestCase):
+    def test_report_at_exit(self):
+        with tempfile.TemporaryDirectory() as path:
+            report_path = Path(path, "report.json")
+            subprocess.run(
+                [sys.executable, "-c",
+                 "from instrumentation import span\n"
+                 "with span('a'):\n"
+                 "    with span('b', area='x'):\n"
+                 "        pass\n"],
+                check=True, env=dict(os.environ, **{
+                    instrumentation.environment_variable: str(report_path)}))
+            report = json.loads(report_path.read_text())
+            folded = report_path.with_suffix(".folded").read_text()
+
+        self.assertEqual(1, report['areas']['b']['x']['calls'])
+        self.assertEqual(["a", "a;b"],
+                         [row.split()[0] for row in folded.splitlines()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
+import covid_utils
+
+from query_service import *
+from test_covid_utils import write_jhu_csvs
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_bounded_by_bytes(self):
+        cache = ResponseCache(10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        cache.get("a")
+        cache.put("c", b"1234")
+        self.assertEqual(b"1234", cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(8, cache.size)
+        cache.put("d", b"12345678901")
+        self.assertIsNone(cache.get("d"))
+
+
+class TestQueryService(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        write_jhu_csvs(self.path)
+        self.service = QueryService(self.path + "/")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_series(self):
+        status, body = self.service.query(
+            "/series?area=China&field=Active&evolution_type=daily")
+        self.assertEqual(200, status)
+        series = json.loads(body)
+        self.assertEqual(["1/22/20", "1/23/20", "1/24/20"], series['dates'])
+        self.assertEqual([0, 5, 6], series['values'])
+        self.assertIs(body, self.service.query(
+            "/series?evolution_type=daily&field=Active&area=China")[1])
+
+    def test_nan_values(self):
+        status, body = self.service.query(
+            "/series?area=China&evolution_type=growthRate")
+        self.assertEqual([None, None, None], json.loads(body)['values'])
+
+    def test_regions(self):
+        status, body = self.service.query("/regions")
+        regions = json.loads(body)
+        self.assertEqual(["China", "France"], regions['countries'])
+        self.assertEqual(["France"], regions['regions']["EU"])
+
+    def test_errors(self):
+        self.assertEqual(400, self.service.query("/series?area=Atlantis")[0])
+        self.assertEqual(400, self.service.query("/series")[0])
+        self.assertEqual(400, self.service.query(
+            "/series?area=France&smoothing=4,2")[0])
+        self.assertEqual(400, self.service.query(
+            "/series?area=France&smoothing=median,0")[0])
+        self.assertEqual(404, self.service.query("/nothing")[0])
+
+    def test_internal_error(self):
+        with patch.object(self.service, 'series',
+                          side_effect=RuntimeError("boom")), \
+                patch('sys.stderr', new=io.StringIO()) as stderr:
+            status, body = self.service.query("/series?area=France")
+        self.assertEqual(500, status)
+        self.assertIn("boom", json.loads(body)['error'])
+        self.assertIn("Query failed", stderr.getvalue())
+        # the errors are not cached
+        self.assertEqual(200, self.service.query("/series?area=France")[0])
+
+    def test_signature_of_definitions(self):
+        paths = [path for path, _, _ in self.service.source_signature()]
+        self.assertIn(confinement_path, paths)
+        self.assertIn(regions_path, paths)
+
+    def test_http(self):
+        async def get_twice():
+            server = await self.service.serve(port=0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            responses = []
+            for connection in ("keep-alive", "close"):
+                writer.write("GET /series?area=France HTTP/1.1\r\n"
+                             "Connection: {}\r\n\r\n".format(connection)
+                             .encode())
+                status = await reader.readline()
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    name, value = line.split(": ", 1)
+                    headers[name] = value
+                body = await reader.readexactly(
+                    int(headers["Content-Length"]))
+                responses.append((status, json.loads(body)))
+            writer.close()
+            self.service.reloader.cancel()
+            server.close()
+            await server.wait_closed()
+            return responses
+
+        for status, series in asyncio.run(get_twice()):
+            self.assertEqual(b"HTTP/1.1 200 OK\r\n", status)
+            self.assertEqual([1, 2, 3], series['values'])
+
+    def test_reload(self):
+        self.service.query("/series?area=France")
+        self.assertFalse(asyncio.run(self.service.reload_if_changed()))
+
+        for name in ("confirmed", "deaths", "recovered"):
+            csv = Path(self.path,
+                       "time_series_covid19_{}_global.csv".format(name))
+            frame = pd.read_csv(csv)
+            frame["1/25/20"] = frame["1/24/20"] + 1
+            frame.to_csv(csv, index=False)
+        self.assertTrue(asyncio.run(self.service.reload_if_changed()))
+        status, body = self.service.query("/series?area=France")
+        self.assertEqual(4, len(json.loads(body)['values']))
+
+    def test_reload_extends_evolutions(self):
+        queries = ["/series?area=France&evolution_type=smoothedCurvature"
+                   "&smoothing=ewma,0.5",
+                   "/series?area=China&evolution_type=R0"]
+        for query in queries:
+            self.assertEqual(200, self.service.query(query)[0])
+        self.assertTrue(self.service.data['Derivations'].evolutions)
+
+        for name in ("confirmed", "deaths", "recovered"):
+            csv = Path(self.path,
+                       "time_series_covid19_{}_global.csv".format(name))
+            frame = pd.read_csv(csv)
+            frame["1/25/20"] = frame["1/24/20"] + 1
+            frame.to_csv(csv, index=False)
+        derived = []
+        derive = covid_utils.Derivations._derive
+
+        def recording_derive(derivations, area, field, evolution_type, *args):
+            derived.append(evolution_type)
+            return derive(derivations, area, field, evolution_type, *args)
+
+        with patch('covid_utils.update_smoothed',
+                   wraps=covid_utils.update_smoothed) as smoothed, \
+                patch('covid_utils.update_evolution',
+                      wraps=covid_utils.update_evolution) as evolution, \
+                patch.object(covid_utils.Derivations, '_derive',
+                             recording_derive):
+            self.assertTrue(asyncio.run(self.service.reload_if_changed()))
+            for query in queries:
+                status, body = self.service.query(query)
+                self.assertEqual(4, len(json.loads(body)['values']))
+
+        smoothed.assert_called_once()
+        evolution.assert_called_once()
+        self.assertFalse({"smoothedDaily", "R0"} & set(derived))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import io
+import unittest
+from pathlib import Path
+
+from regions import parse_regions, resolve_regions, membership_matrix
+
+
+class TestParseRegions(unittest.TestCase):
+    def test_basic_file(self):
+        f = io.StringIO("""### comment
+
+EU: France; Germany
+EU: Spain
+North-America: US; Canada
+Asia: Korea, South; China""")
+
+        self.assertEqual(parse_regions(f),
+                         {'EU': ['France', 'Germany', 'Spain'],
+                          'North-America': ['US', 'Canada'],
+                          'Asia': ['Korea, South', 'China']})
+
+    def test_real_file(self):
+        with Path("regions.dat").open() as f:
+            resolve_regions(parse_regions(f))
+
+
+class TestResolveRegions(unittest.TestCase):
+    def test_nested(self):
+        self.assertEqual(
+            resolve_regions({"EU": ["France"], "Europe": ["EU", "Norway"],
+                             "Europe+Russia": ["Europe", "Russia"]}),
+            {"EU": {"France"}, "Europe": {"France", "Norway"},
+             "Europe+Russia": {"France", "Norway", "Russia"}})
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            resolve_regions({"A": ["B"], "B": ["A"]})
+
+
+class TestMembershipMatrix(unittest.TestCase):
+    def test_matrix(self):
+        region_index, matrix, unknown = membership_matrix(
+            {"EU": {"France", "Italy"}, "Asia": {"China"}},
+            {"China": 0, "France": 1})
+
+        self.assertEqual({"EU": 0, "Asia": 1}, region_index)
+        self.assertEqual([[0, 1], [1, 0]], matrix.toarray().tolist())
+        self.assertEqual({"EU": ["Italy"]}, unknown)
@@ -0,0 +1,130 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+import plot_versus_time
+import render
+from render import (FigureJob, agg_figure, render_all, new_figure,
+                    save_and_show)
+from test_covid_utils import write_jhu_csvs
+from covid_utils import derivations, load_data
+
+
+def draw_line(fig, data, figures_path):
+    fig.add_subplot(111).plot(data['Confirmed'].sum(axis=0))
+    return str(Path(figures_path, "line.png"))
+
+
+class TestRenderAll(unittest.TestCase):
+    def setUp(self):
+        with tempfile.TemporaryDirectory() as path, \
+                patch('sys.stderr', new=io.StringIO()):
+            write_jhu_csvs(path)
+            self.data = load_data(path + "/")
+
+    def render(self, max_workers):
+        with tempfile.TemporaryDirectory() as figures_path, \
+                patch('sys.stdout', new=io.StringIO()):
+            versus_time = dict(
+                figures_path=figures_path, field="Confirmed",
+                evolution_type="cumulative", smoothing=(0, 0),
+                days_interval=7, fitting_period=8, extrapol=0,
+                yscale="linear", zone="World")
+            jobs = [FigureJob(draw_line, dict(figures_path=figures_path)),
+                    FigureJob(plot_versus_time.draw_figure, versus_time),
+                    FigureJob(plot_versus_time.draw_figure,
+                              dict(versus_time, field="Nope"))]
+            results = render_all(self.data, jobs, max_workers=max_workers,
+                                 profiles=('preview', 'vector'))
+
+            self.assertEqual(jobs, [result.job for result in results])
+            self.assertEqual(
+                [str(Path(figures_path, name))
+                 for name in ("line_preview.png", "line.svg", "line.pdf")],
+                results[0].file_names)
+            for result in results[:2]:
+                self.assertIsNone(result.error)
+                for file_name in result.file_names:
+                    self.assertTrue(Path(file_name).exists())
+            self.assertEqual([], results[2].file_names)
+            self.assertIn("Error", results[2].error)
+
+    def test_serial(self):
+        self.render(1)
+
+    def test_parallel(self):
+        self.render(2)
+
+
+class TestFigureTemplate(unittest.TestCase):
+    def setUp(self):
+        with tempfile.TemporaryDirectory() as path, \
+                patch('sys.stderr', new=io.StringIO()):
+            write_jhu_csvs(path)
+            self.data = load_data(path + "/")
+        self.versus_time = dict(
+            figures_path="figures", field="Confirmed",
+            evolution_type="cumulative", smoothing=(0, 0), days_interval=7,
+            fitting_period=8, extrapol=0, yscale="linear", zone="World")
+
+    def draw(self, fig, **kwargs):
+        with patch('sys.stdout', new=io.StringIO()):
+            return plot_versus_time.draw_figure(
+                fig, self.data, **dict(self.versus_time, **kwargs))
+
+    def test_same_layout(self):
+        fig = agg_figure()
+        self.draw(fig)
+        ax, = fig.axes
+        curve, = ax.get_legend_handles_labels()[0]
+        file_name = self.draw(fig, field="Deaths")
+
+        self.assertEqual([ax], fig.axes)
+        self.assertEqual([curve], ax.get_legend_handles_labels()[0])
+        self.assertIn("deaths", file_name)
+        self.assertIn("deaths", ax.get_ylabel())
+        expected = derivations(self.data).series(
+            "World", "Deaths", "cumulative", self.data['FilterDate'], (0, 0))
+        np.testing.assert_array_equal(expected, curve.get_ydata())
+        # the axes are fitted to the new data
+        self.assertEqual(expected.max(), ax.dataLim.ymax)
+
+    def test_other_layout(self):
+        fig = agg_figure()
+        self.draw(fig)
+        ax, = fig.axes
+        self.draw(fig, yscale="log")
+        self.assertNotIn(ax, fig.axes)
+        self.assertEqual("log", fig.axes[0].get_yscale())
+
+    def test_reused_by_jobs(self):
+        jobs = [FigureJob(plot_versus_time.draw_figure,
+                          dict(self.versus_time, field=field))
+                for field in ("Confirmed", "Deaths", "Active")]
+        with tempfile.TemporaryDirectory() as figures_path, \
+                patch('sys.stdout', new=io.StringIO()), \
+                patch('render.agg_figure', wraps=agg_figure) as new:
+            jobs = [job._replace(kwargs=dict(job.kwargs,
+                                             figures_path=figures_path))
+                    for job in jobs]
+            results = render_all(self.data, jobs, max_workers=1,
+                                 profiles=('preview',))
+        render._reused_figures.clear()
+        self.assertEqual([None] * 3, [result.error for result in results])
+        self.assertEqual(1, new.call_count)
+
+
+class TestNewFigure(unittest.TestCase):
+    def test_non_interactive(self):
+        for profiles, interactive in ((('publication',), False),
+                                      (('preview',), True)):
+            fig = new_figure(profiles, interactive)
+            self.assertIsNone(fig.canvas.manager)
+            fig.add_subplot(111).plot([1, 2])
+            with tempfile.TemporaryDirectory() as d:
+                save_and_show(fig, str(Path(d, "a.png")), profiles)
+                self.assertEqual(1, len(list(Path(d).iterdir())))
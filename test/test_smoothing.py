@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+from scipy.signal import savgol_filter
+
+from smoothing import *
+
+
+def random_walks(n_areas=3, n_dates=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n_areas, n_dates)).cumsum(axis=1)
+
+
+class TestSavgol(unittest.TestCase):
+    def test_same_as_scipy(self):
+        values = random_walks()
+        for window_length, polyorder in ((5, 2), (7, 3), (9, 3), (3, 0)):
+            with self.subTest(window_length=window_length,
+                              polyorder=polyorder):
+                expected = savgol_filter(values, window_length, polyorder,
+                                         axis=-1)
+                np.testing.assert_allclose(
+                    savgol(values, window_length, polyorder), expected,
+                    atol=1e-10)
+                np.testing.assert_allclose(
+                    savgol(values[1], window_length, polyorder), expected[1],
+                    atol=1e-10)
+
+    def test_cached_kernel(self):
+        self.assertIs(savgol_projection(7, 3), savgol_projection(7, 3))
+
+    def test_too_short(self):
+        with self.assertRaises(ValueError):
+            savgol(np.arange(4), 5, 2)
+
+
+class TestSmoothers(unittest.TestCase):
+    def test_moving_average(self):
+        values = random_walks()
+        smoothed = moving_average(values, 5)
+        for t in range(values.shape[1]):
+            np.testing.assert_allclose(
+                smoothed[:, t], values[:, max(t - 2, 0):t + 3].mean(axis=1))
+
+    def test_ewma(self):
+        values = random_walks()
+        smoothed = ewma(values, 0.3)
+        expected = values[:, 0]
+        for t in range(values.shape[1]):
+            expected = 0.3 * values[:, t] + 0.7 * expected
+            np.testing.assert_allclose(smoothed[:, t], expected)
+
+    def test_rolling_median(self):
+        values = random_walks()
+        smoothed = rolling_median(values, 5)
+        padded = np.pad(values, ((0, 0), (2, 2)), mode='edge')
+        for t in range(values.shape[1]):
+            np.testing.assert_allclose(
+                smoothed[:, t], np.median(padded[:, t:t + 5], axis=1))
+
+    def test_smooth(self):
+        values = random_walks()
+        np.testing.assert_array_equal(smooth(values, (0, 0)), values)
+        np.testing.assert_allclose(smooth(values, (7, 3)),
+                                   savgol(values, 7, 3))
+        np.testing.assert_allclose(smooth(values, ("movingAverage", 3)),
+                                   moving_average(values, 3))
+        with self.assertRaises(ValueError):
+            smooth(values, ("gaussian", 3))
+
+    def test_invalid_parameters(self):
+        values = random_walks()
+        for smoothing in (("median", 0), ("movingAverage", -3),
+                          ("movingAverage", 4), ("median", 2.5),
+                          ("ewma", 0), ("ewma", 1.5), ("ewma", "a"),
+                          (6, 2), (7, 7), (7, -1), (7,), ("ewma",)):
+            with self.subTest(smoothing=smoothing):
+                with self.assertRaises(ValueError):
+                    smooth(values, smoothing)
+                with self.assertRaises(ValueError):
+                    reach(smoothing)
+
+
+class TestUpdateSmoothed(unittest.TestCase):
+    def test_same_as_smooth(self):
+        values = random_walks()
+        for smoothing in ((7, 3), (0, 0), ("movingAverage", 5),
+                          ("ewma", 0.3), ("median", 5)):
+            for n_new in (1, 4):
+                with self.subTest(smoothing=smoothing, n_new=n_new):
+                    np.testing.assert_allclose(
+                        update_smoothed(smooth(values[:, :-n_new], smoothing),
+                                        values, smoothing),
+                        smooth(values, smoothing))
+
+
+if __name__ == '__main__':
+    unittest.main()